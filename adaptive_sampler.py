@@ -0,0 +1,251 @@
+from pathlib import Path
+import asyncio
+import csv
+import math
+
+from analyze_bias import sentiment_score
+from collection import OUTPUT_DIR, CollectionEngine
+from record_pipeline import iter_records
+from records import ResponseRecord, raw_files
+from response_cache import ResponseCache
+from run_ledger import record_key
+from validate_claims import ClaimValidationAnalyzer
+
+REPORT_PATH = Path("analysis/adaptive_sampling.csv")
+
+# 95% normal quantile
+Z = 1.959963984540054
+
+# Defaults: full CI width each cell must reach, and sample limits
+FABRICATION_WIDTH = 0.30
+SENTIMENT_WIDTH = 0.50
+MIN_RUNS = 3
+MAX_RUNS = 100
+QUERY_BUDGET = 500
+
+# Rounds in a row a cell may come back without a response before it is no longer planned
+MAX_FAILURES = 3
+
+# Hypotheses analyze_bias.py scores sentiment for
+SENTIMENT_HYPOTHESES = ("H1", "H3")
+
+
+class RunningStat:
+    """Welford running mean / variance."""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def interval(self):
+        """Normal-approximation 95% CI of the mean; unbounded below two samples."""
+        if self.n < 2:
+            return -math.inf, math.inf
+        half = Z * math.sqrt(self.m2 / (self.n - 1) / self.n)
+        return self.mean - half, self.mean + half
+
+
+def wilson_interval(successes: int, n: int):
+    """95% Wilson score interval for a proportion (well-behaved at 0/n and n/n)."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + Z * Z / n
+    center = (p + Z * Z / (2 * n)) / denom
+    half = Z * math.sqrt(p * (1 - p) / n + Z * Z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class Cell:
+    """Running estimates for one (model, hypothesis, condition) cell."""
+
+    def __init__(self, provider, prompt: dict):
+        self.provider = provider
+        self.prompt = prompt
+        self.flags = 0
+        self.n = 0
+        self.sentiment = RunningStat() if prompt["hypothesis"] in SENTIMENT_HYPOTHESES else None
+        self.next_run_id = 1
+        self.failures = 0
+
+    @property
+    def key(self):
+        return self.provider.model_name, self.prompt["hypothesis"], self.prompt["condition"]
+
+    def add(self, any_flag: int, sentiment: float):
+        self.n += 1
+        self.flags += any_flag
+        if self.sentiment is not None:
+            self.sentiment.add(sentiment)
+
+    def widths(self) -> dict:
+        low, high = wilson_interval(self.flags, self.n)
+        widths = {"fabrication": high - low}
+        if self.sentiment is not None:
+            low, high = self.sentiment.interval()
+            widths["sentiment"] = high - low
+        return widths
+
+    def excess(self, targets: dict) -> float:
+        """How far the widest interval is above its target (<= 1 means converged)."""
+        return max(width / targets[name] for name, width in self.widths().items())
+
+
+class AdaptiveSampler:
+    """
+    Sequential collection: every cell gets `min_runs` samples, then each
+    round sends one more sample to every cell whose fabrication (Wilson) or
+    sentiment (normal) 95% interval is still wider than its target, widest
+    first, until all cells converge, hit `max_runs`, or the query budget
+    runs out. Only queries that reach a provider count against the budget;
+    cache hits are free. A cell that gets no response in MAX_FAILURES
+    rounds in a row is dropped. Responses are scored as they arrive with
+    the same logic as validate_claims.py (any_flag) and analyze_bias.py
+    (sentiment_score). Responses already in results/raw count towards the
+    estimates.
+    """
+
+    def __init__(self, providers, prompts, budget: int = QUERY_BUDGET,
+                 fabrication_width: float = FABRICATION_WIDTH, sentiment_width: float = SENTIMENT_WIDTH,
+                 min_runs: int = MIN_RUNS, max_runs: int = MAX_RUNS, round_size: int = None,
+                 output_dir: Path = OUTPUT_DIR, cache: ResponseCache = None, compress: bool = False):
+        self.budget = budget
+        self.targets = {"fabrication": fabrication_width, "sentiment": sentiment_width}
+        self.min_runs = min_runs
+        self.max_runs = max_runs
+        self.output_dir = Path(output_dir)
+        self.cells = {}
+        self._by_prompt = {}
+        for provider in providers:
+            for prompt in prompts:
+                cell = Cell(provider, prompt)
+                self.cells[cell.key] = cell
+                self._by_prompt[provider.model_name, prompt["prompt_text"]] = cell
+        self.round_size = round_size or len(self.cells)
+        self.claims = ClaimValidationAnalyzer()
+        self.engine = CollectionEngine(providers, output_dir=self.output_dir, cache=cache,
+                                       on_record=self.observe, compress=compress)
+        self.queries = 0
+        self.rounds = 0
+
+    def observe(self, record: dict):
+        """Score one response into its cell's running estimates."""
+        cell = self._by_prompt.get((record["model"], record["prompt_text"]))
+        if cell is None:
+            return
+        r = ResponseRecord(record["hypothesis"], record["condition"], record["model"],
+                           record["run_id"], record["response_text"], record["prompt_text"])
+        cell.add(self.claims.row(r)["any_flag"], sentiment_score(r.response_text))
+        cell.next_run_id = max(cell.next_run_id, int(record["run_id"]) + 1)
+
+    def load_existing(self):
+        """Start from the responses already collected for these cells."""
+        if raw_files(self.output_dir):
+            for r in iter_records(self.output_dir):
+                self.observe(r.as_dict())
+
+    def plan_round(self) -> list:
+        """(provider, prompt, run_id) for the next round, within the remaining budget."""
+        remaining = self.budget - self.queries
+        active = [c for c in self.cells.values() if c.failures < MAX_FAILURES]
+        todo = []
+        for cell in active:
+            if cell.n < self.min_runs:
+                todo += [cell] * (self.min_runs - cell.n)
+        if not todo:
+            open_cells = [c for c in active
+                          if c.n < self.max_runs and c.excess(self.targets) > 1]
+            open_cells.sort(key=lambda c: c.excess(self.targets), reverse=True)
+            todo = open_cells[:self.round_size]
+        planned = []
+        for cell in todo[:max(0, remaining)]:
+            while record_key(cell.prompt["prompt_text"], cell.provider.model_name,
+                             cell.next_run_id) in self.engine.ledger:
+                cell.next_run_id += 1
+            planned.append((cell.provider, cell.prompt, cell.next_run_id))
+            cell.next_run_id += 1
+        return planned
+
+    async def _run(self):
+        while True:
+            planned = self.plan_round()
+            if not planned:
+                break
+            self.rounds += 1
+            cells = {self._by_prompt[provider.model_name, prompt["prompt_text"]]
+                     for provider, prompt, _ in planned}
+            n_before = {cell: cell.n for cell in cells}
+            queries = self.engine.stats["queries"]
+            await self.engine.run_cells(planned)
+            self.queries += self.engine.stats["queries"] - queries
+            for cell in cells:
+                if cell.n > n_before[cell]:
+                    cell.failures = 0
+                    continue
+                cell.failures += 1
+                if cell.failures == MAX_FAILURES:
+                    model, hypothesis, condition = cell.key
+                    print(f"No response for {model} {hypothesis}/{condition} in {MAX_FAILURES} rounds; "
+                          f"dropping the cell.")
+
+    def run(self) -> dict:
+        self.load_existing()
+        asyncio.run(self._run())
+        return self.engine.stats
+
+    def rows(self):
+        for cell in self.cells.values():
+            model, hypothesis, condition = cell.key
+            fab_low, fab_high = wilson_interval(cell.flags, cell.n)
+            row = {
+                "model": model, "hypothesis": hypothesis, "condition": condition, "n": cell.n,
+                "fabrication_rate": cell.flags / cell.n if cell.n else None,
+                "fabrication_low": fab_low, "fabrication_high": fab_high,
+                "sentiment_mean": None, "sentiment_low": None, "sentiment_high": None,
+                "converged": int(cell.excess(self.targets) <= 1),
+            }
+            if cell.sentiment is not None and cell.sentiment.n:
+                low, high = cell.sentiment.interval()
+                row.update(sentiment_mean=cell.sentiment.mean,
+                           sentiment_low=low if math.isfinite(low) else None,
+                           sentiment_high=high if math.isfinite(high) else None)
+            yield row
+
+    def write_report(self, path: Path = REPORT_PATH):
+        rows = list(self.rows())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: round(v, 4) if isinstance(v, float) else v for k, v in row.items()})
+        return rows
+
+
+def print_summary(sampler: AdaptiveSampler, rows):
+    print(f"\n{'model':<12} {'hyp':<4} {'condition':<16} {'n':>4} {'fabrication (95% CI)':>24} "
+          f"{'sentiment (95% CI)':>26}")
+    for r in rows:
+        fab = "-" if r["fabrication_rate"] is None else (
+            f"{r['fabrication_rate']:.2f} [{r['fabrication_low']:.2f}, {r['fabrication_high']:.2f}]")
+        sent = "-"
+        if r["sentiment_low"] is not None:
+            sent = f"{r['sentiment_mean']:+.2f} [{r['sentiment_low']:+.2f}, {r['sentiment_high']:+.2f}]"
+        mark = "" if r["converged"] else "  (open)"
+        print(f"{r['model']:<12} {r['hypothesis']:<4} {r['condition']:<16} {r['n']:>4} {fab:>24} {sent:>26}{mark}")
+    converged = sum(r["converged"] for r in rows)
+    largest = max(r["n"] for r in rows)
+    print(f"\n{sampler.queries} queries in {sampler.rounds} rounds (budget {sampler.budget}, "
+          f"{sampler.engine.stats['cache_hits']} more answered from the cache); "
+          f"{converged}/{len(rows)} cells within target width.")
+    print(f"A fixed design giving every cell the largest sample size used ({largest}) "
+          f"would need {largest * len(rows)} responses; this run holds {sum(r['n'] for r in rows)}.")
@@ -0,0 +1,354 @@
+from pathlib import Path
+import argparse
+import csv
+import hashlib
+import io
+import json
+import math
+import sqlite3
+import time
+import zlib
+
+from instrumentation import add_profile_argument, stage, track_file
+from processed_store import PROCESSED_DIR, dataset_path, have_pyarrow, load_processed
+
+# Materialized aggregates; derived data, rebuilt from results/processed if deleted
+CUBE_PATH = Path("results/cache/cube.sqlite")
+
+# Processed tables with one row per response; columns other than the dimensions
+# and identifiers are measures
+SOURCES = ("claim_validation_flags", "h1_h3_sentiment_focus")
+
+DIMENSIONS = ("model", "hypothesis", "condition", "run_id")
+
+# Columns that are neither a dimension nor a measure
+IDENTIFIERS = ("record_key",)
+
+# Content-defined blocks: a block ends after a line whose CRC has these low
+# bits clear (about 256 lines on average), or after MAX_BLOCK_LINES lines.
+# Rows inserted in the middle of a CSV therefore only change the blocks
+# around them; the rest are recognised by digest and not parsed again.
+BOUNDARY_MASK = 0xFF
+MAX_BLOCK_LINES = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cube (
+    measure TEXT NOT NULL,
+    model TEXT NOT NULL,
+    hypothesis TEXT NOT NULL,
+    condition TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    sumsq REAL NOT NULL,
+    PRIMARY KEY (measure, model, hypothesis, condition, run_id)
+);
+CREATE TABLE IF NOT EXISTS measures (
+    measure TEXT PRIMARY KEY,
+    source TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    header TEXT NOT NULL,
+    signature TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    source TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    copies INTEGER NOT NULL,
+    cells TEXT NOT NULL,
+    PRIMARY KEY (source, digest)
+);
+"""
+
+
+def iter_blocks(lines, mask: int = BOUNDARY_MASK, max_lines: int = MAX_BLOCK_LINES):
+    """Group CSV lines (bytes) into content-defined blocks."""
+    block = []
+    for line in lines:
+        block.append(line)
+        if not zlib.crc32(line) & mask or len(block) >= max_lines:
+            yield b"".join(block)
+            block = []
+    if block:
+        yield b"".join(block)
+
+
+def measures_of(header) -> list:
+    return [c for c in header if c not in DIMENSIONS and c not in IDENTIFIERS]
+
+
+def aggregate_rows(rows, measures) -> dict:
+    """(measure, model, hypothesis, condition, run_id) -> [n, sum, sumsq]."""
+    cells = {}
+    for row in rows:
+        dims = (row["model"], row["hypothesis"], row["condition"], int(row["run_id"]))
+        for measure in measures:
+            value = row[measure]
+            if value is None or value == "":
+                continue
+            x = float(value)
+            if math.isnan(x):
+                continue
+            cell = cells.get((measure, *dims))
+            if cell is None:
+                cell = cells[(measure, *dims)] = [0, 0.0, 0.0]
+            cell[0] += 1
+            cell[1] += x
+            cell[2] += x * x
+    return cells
+
+
+def summarize(n: int, total: float, sumsq: float) -> dict:
+    """Mean and sample standard deviation from the stored moments."""
+    mean = total / n if n else None
+    std = None
+    if n > 1:
+        std = math.sqrt(max(0.0, (sumsq - total * total / n) / (n - 1)))
+    return {"n": n, "sum": total, "mean": mean, "std": std}
+
+
+class AggregateCube:
+    """
+    SQLite cube of count, sum and sum of squares for every measure of the
+    processed tables over model × hypothesis × condition × run_id.
+
+    update() reads each processed CSV as content-defined blocks and only
+    parses blocks it has not seen; contributions of blocks that disappeared
+    are subtracted again. Rollups and slices are then GROUP BY queries on
+    the cube, whose size depends on the number of cells, not of responses.
+    """
+
+    def __init__(self, path: Path = CUBE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=300)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ---------------------- Updating ----------------------
+
+    def _apply(self, cells, sign: int):
+        self.conn.executemany(
+            "INSERT INTO cube (measure, model, hypothesis, condition, run_id, n, sum, sumsq) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (measure, model, hypothesis, condition, run_id) DO UPDATE SET "
+            "n = n + excluded.n, sum = sum + excluded.sum, sumsq = sumsq + excluded.sumsq",
+            ((*key, sign * n, sign * s, sign * sq) for *key, n, s, sq in cells),
+        )
+
+    def _drop_source(self, source: str):
+        measures = [m for (m,) in self.conn.execute("SELECT measure FROM measures WHERE source=?", (source,))]
+        self.conn.executemany("DELETE FROM cube WHERE measure=?", ((m,) for m in measures))
+        self.conn.execute("DELETE FROM measures WHERE source=?", (source,))
+        self.conn.execute("DELETE FROM blocks WHERE source=?", (source,))
+        self.conn.execute("DELETE FROM sources WHERE source=?", (source,))
+
+    def _register(self, source: str, header: list, signature: str):
+        self.conn.execute("INSERT OR REPLACE INTO sources (source, header, signature) VALUES (?, ?, ?)",
+                          (source, json.dumps(header), signature))
+        self.conn.executemany("INSERT OR REPLACE INTO measures (measure, source) VALUES (?, ?)",
+                              ((m, source) for m in measures_of(header)))
+
+    def _known(self, source: str):
+        row = self.conn.execute("SELECT header, signature FROM sources WHERE source=?", (source,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, None)
+
+    def update_csv(self, source: str, path: Path) -> dict:
+        """Bring one source up to date with its CSV; returns block counts."""
+        st = path.stat()
+        signature = f"csv:{st.st_size}:{st.st_mtime_ns}"
+        known_header, known_signature = self._known(source)
+        if known_signature == signature:
+            return {"blocks": 0, "parsed": 0, "removed": 0}
+
+        with track_file(path) as metrics, path.open("rb") as f, self.conn:
+            header = next(csv.reader([f.readline().decode("utf-8")]), [])
+            if header != known_header:
+                self._drop_source(source)
+            missing = [d for d in DIMENSIONS if d not in header]
+            if missing:
+                raise ValueError(f"{path} has no {', '.join(missing)} column")
+            measures = measures_of(header)
+
+            old = dict(self.conn.execute("SELECT digest, copies FROM blocks WHERE source=?", (source,)))
+            new, parsed = {}, {}
+            for block in iter_blocks(f):
+                digest = hashlib.blake2b(block, digest_size=16).hexdigest()
+                new[digest] = new.get(digest, 0) + 1
+                if digest not in old and digest not in parsed:
+                    rows = list(csv.DictReader(io.StringIO(block.decode("utf-8")), fieldnames=header))
+                    metrics["records"] += len(rows)
+                    parsed[digest] = [[*k, *v] for k, v in aggregate_rows(rows, measures).items()]
+
+            for digest in old.keys() | new.keys():
+                delta = new.get(digest, 0) - old.get(digest, 0)
+                if not delta:
+                    continue
+                if digest in parsed:
+                    cells = parsed[digest]
+                    self.conn.execute("INSERT INTO blocks (source, digest, copies, cells) VALUES (?, ?, ?, ?)",
+                                      (source, digest, delta, json.dumps(cells)))
+                else:
+                    (cells,) = self.conn.execute("SELECT cells FROM blocks WHERE source=? AND digest=?",
+                                                 (source, digest)).fetchone()
+                    cells = json.loads(cells)
+                    if digest in new:
+                        self.conn.execute("UPDATE blocks SET copies=? WHERE source=? AND digest=?",
+                                          (new[digest], source, digest))
+                    else:
+                        self.conn.execute("DELETE FROM blocks WHERE source=? AND digest=?", (source, digest))
+                self._apply(([*c[:5], c[5] * abs(delta), c[6] * abs(delta), c[7] * abs(delta)]
+                             for c in cells), 1 if delta > 0 else -1)
+            self.conn.execute("DELETE FROM cube WHERE n <= 0")
+            self._register(source, header, signature)
+        return {"blocks": sum(new.values()), "parsed": len(parsed),
+                "removed": sum(1 for d in old if d not in new)}
+
+    def update_frame(self, source: str, df, signature: str) -> dict:
+        """Rebuild one source from a DataFrame (the Parquet-only case)."""
+        known_header, known_signature = self._known(source)
+        if known_signature == signature:
+            return {"blocks": 0, "parsed": 0, "removed": 0}
+        header = list(df.columns)
+        measures = measures_of(header)
+        cells = aggregate_rows(df.to_dict("records"), measures)
+        with self.conn:
+            self._drop_source(source)
+            self._apply(([*k, *v] for k, v in cells.items()), 1)
+            self._register(source, header, signature)
+        return {"blocks": 1, "parsed": 1, "removed": 0}
+
+    def update(self, processed_dir: Path = PROCESSED_DIR, sources=SOURCES) -> dict:
+        """Sync every source from its CSV, or from its Parquet dataset when there is no CSV."""
+        totals = {"blocks": 0, "parsed": 0, "removed": 0}
+        for source in sources:
+            csv_path = Path(processed_dir) / f"{source}.csv"
+            parquet_path = dataset_path(source, processed_dir)
+            if csv_path.exists():
+                counts = self.update_csv(source, csv_path)
+            elif parquet_path.exists() and have_pyarrow():
+                parts = sorted(parquet_path.rglob("*.parquet"))
+                signature = "parquet:" + ";".join(
+                    f"{p.relative_to(parquet_path)}:{p.stat().st_size}:{p.stat().st_mtime_ns}" for p in parts
+                )
+                if self._known(source)[1] == signature:
+                    continue
+                with track_file(parquet_path, sum(p.stat().st_size for p in parts)) as metrics:
+                    df = load_processed(source, processed_dir=processed_dir)
+                    metrics["records"] += len(df)
+                counts = self.update_frame(source, df, signature)
+            else:
+                print(f"No processed output for {source}; skipping.")
+                continue
+            for k in totals:
+                totals[k] += counts[k]
+        return totals
+
+    # ---------------------- Querying ----------------------
+
+    def measures(self) -> dict:
+        return dict(self.conn.execute("SELECT measure, source FROM measures ORDER BY source, measure"))
+
+    def query(self, measure: str, by=(), where=None) -> list:
+        """
+        Roll `measure` up to the `by` dimensions, restricted to `where`
+        ({dimension: value or [values]}); returns dicts with n, sum, mean, std.
+        """
+        by = list(by)
+        for dim in [*by, *(where or {})]:
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{dim}' (choose from {', '.join(DIMENSIONS)})")
+        clauses, params = ["measure = ?"], [measure]
+        for dim, values in (where or {}).items():
+            values = [values] if isinstance(values, (str, int)) else list(values)
+            clauses.append(f"{dim} IN ({', '.join('?' * len(values))})")
+            params += values
+        cols = ", ".join(by)
+        sql = (f"SELECT {cols + ', ' if by else ''}SUM(n), SUM(sum), SUM(sumsq) FROM cube "
+               f"WHERE {' AND '.join(clauses)}")
+        if by:
+            sql += f" GROUP BY {cols} ORDER BY {cols}"
+        rows = []
+        for row in self.conn.execute(sql, params):
+            *keys, n, total, sumsq = row
+            if not n:
+                continue
+            rows.append(dict(zip(by, keys), **summarize(n, total, sumsq)))
+        return rows
+
+
+def parse_where(items) -> dict:
+    """["condition=PRIMED", "model=gpt-4o,gemini-1.5"] -> {"condition": ["PRIMED"], ...}"""
+    where = {}
+    for item in items:
+        dim, _, values = item.partition("=")
+        values = values.split(",")
+        where[dim] = [int(v) for v in values] if dim == "run_id" else values
+    return where
+
+
+def print_rows(rows, by):
+    print(" ".join(f"{d:<16}" for d in by) + f"{'n':>8} {'mean':>10} {'std':>10} {'sum':>12}")
+    for r in rows:
+        std = "-" if r["std"] is None else f"{r['std']:.4f}"
+        print(" ".join(f"{str(r[d]):<16}" for d in by)
+              + f"{r['n']:>8,} {r['mean']:>10.4f} {std:>10} {r['sum']:>12,.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Aggregate cube over the processed results, and rollup/slice queries on it."
+    )
+    parser.add_argument("--cube", type=Path, default=CUBE_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    update = sub.add_parser("update", help=f"Fold new processed rows into the cube ({CUBE_PATH}).")
+    update.add_argument("--processed-dir", type=Path, default=PROCESSED_DIR)
+    add_profile_argument(update)
+
+    sub.add_parser("measures", help="List the measures in the cube.")
+
+    query = sub.add_parser("query", help="Roll a measure up to some dimensions.")
+    query.add_argument("measure", help="e.g. any_flag, sentiment_score, mentions_defense")
+    query.add_argument("--by", action="append", default=[], choices=DIMENSIONS,
+                       help="Group by this dimension (repeatable; none = grand total).")
+    query.add_argument("--where", action="append", default=[], metavar="DIM=V[,V...]",
+                       help="Keep only these values of a dimension (repeatable).")
+    query.add_argument("--update", action="store_true", help="Update the cube first.")
+    query.add_argument("--json", action="store_true", help="Print rows as JSON.")
+    args = parser.parse_args()
+
+    cube = AggregateCube(args.cube)
+    try:
+        if args.command == "update":
+            with stage("aggregate_cube", profile=args.profile) as s:
+                counts = cube.update(args.processed_dir)
+                s.records = sum(e["records"] for e in s.files.values())
+                s.counters.update(counts)
+            print(f"Cube {args.cube}: {counts['parsed']} new of {counts['blocks']} blocks parsed, "
+                  f"{counts['removed']} removed.")
+        elif args.command == "measures":
+            for measure, source in cube.measures().items():
+                print(f"{measure:<40} {source}")
+        else:
+            if args.update:
+                cube.update()
+            if args.measure not in cube.measures():
+                raise SystemExit(f"Unknown measure '{args.measure}'; run 'update' first or see 'measures'.")
+            t0 = time.perf_counter()
+            rows = cube.query(args.measure, by=args.by, where=parse_where(args.where))
+            ms = (time.perf_counter() - t0) * 1000
+            if args.json:
+                print(json.dumps(rows, indent=1))
+            else:
+                print_rows(rows, args.by)
+                print(f"\n{len(rows)} rows in {ms:.1f} ms")
+    finally:
+        cube.close()
+
+
+if __name__ == "__main__":
+    main()
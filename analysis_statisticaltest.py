@@ -1,21 +1,20 @@
 import pandas as pd
 import numpy as np
+import argparse
 import os
 
 from scipy.stats import chi2_contingency
 from statsmodels.stats.proportion import proportions_ztest
 
-# -----------------------------------------------------------
-# Load dataset
-# -----------------------------------------------------------
-df = pd.read_csv(r"C:\Users\leena\Downloads\results\processed\claim_validation_flags.csv")
-df["fabrication"] = df["any_flag"].astype(int)
+from instrumentation import add_profile_argument, stage
+from processed_store import load_processed
+from comparison_planner import all_pairs_tests
+from resampling import N_RESAMPLES, run_tests
 
 # -----------------------------------------------------------
 # Ensure analysis folder exists
 # -----------------------------------------------------------
 OUTPUT_DIR = "analysis"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 text_output = []
 csv_records = []
@@ -45,23 +44,10 @@ def chi_square_test(name, table):
     add_result(f"Chi-Square Test: {name}", result_text)
 
 
-# MODEL
-model_table = pd.crosstab(df["model"], df["fabrication"])
-chi_square_test("Fabrication ~ MODEL", model_table)
-
-# HYPOTHESIS
-hypothesis_table = pd.crosstab(df["hypothesis"], df["fabrication"])
-chi_square_test("Fabrication ~ HYPOTHESIS", hypothesis_table)
-
-# CONDITION
-condition_table = pd.crosstab(df["condition"], df["fabrication"])
-chi_square_test("Fabrication ~ CONDITION", condition_table)
-
-
 # -----------------------------------------------------------
 # 2. Z-Tests (Proportion Tests)
 # -----------------------------------------------------------
-def ztest_groups(group1, group2, col):
+def ztest_groups(df, group1, group2, col):
     g1 = df[df[col] == group1]["fabrication"]
     g2 = df[df[col] == group2]["fabrication"]
 
@@ -80,24 +66,208 @@ def ztest_groups(group1, group2, col):
     add_result(f"Z-Test: {group1} vs {group2} ({col})", result_text)
 
 
-# Run z-tests
-ztest_groups("claude-3.5", "gemini-1.5", "model")
-ztest_groups("gemini-1.5", "gpt-4o", "model")
-ztest_groups("POSITIVE", "NEGATIVE", "condition")
+def all_pairs_summary(pairs, alpha=0.05):
+    """Text block listing the planned families and what survives correction."""
+    lines = []
+    for kind in ("omnibus", "pairwise"):
+        family = pairs[pairs["kind"] == kind]
+        lines.append(
+            f"\n{kind.capitalize()} tests: {len(family)} "
+            f"(significant at {alpha}: raw {int((family['p_value'] < alpha).sum())}, "
+            f"Holm {int((family['p_holm'] < alpha).sum())}, "
+            f"BH {int((family['p_bh'] < alpha).sum())})"
+        )
+    significant = pairs[pairs["p_bh"] < alpha]
+    for _, row in significant.iterrows():
+        groups = row["factor"] if row["kind"] == "omnibus" else f"{row['group1']} vs {row['group2']}"
+        lines.append(f"  {row['kind']}: {groups} (p={row['p_value']:.4g}, "
+                     f"Holm={row['p_holm']:.4g}, BH={row['p_bh']:.4g})")
+    return "\n".join(lines)
 
 
 # -----------------------------------------------------------
-# Save output files
+# 3. Resampling Tests (permutation p-values, bootstrap CIs)
 # -----------------------------------------------------------
+def load_optional(name, columns, filters):
+    """Processed tables other than the claim flags are optional for this script."""
+    try:
+        return load_processed(name, columns=columns, filters=filters)
+    except FileNotFoundError:
+        print(f"Skipping resampling tests on '{name}': no processed data.")
+        return None
+
+
+def resampling_plan(df, sentiment, h2):
+    """
+    List the resampling tests to run as (title, kind, args, description).
+    Groups with no rows are left out rather than failing the whole run.
+    """
+    plan = []
+
+    def compare(title, kind, a, b, description):
+        if len(a) and len(b):
+            plan.append((title, kind, (a, b), description))
+
+    # Fabrication rate: same comparisons as the z-tests, plus a CI per model
+    for group1, group2, col in [
+        ("claude-3.5", "gemini-1.5", "model"),
+        ("gemini-1.5", "gpt-4o", "model"),
+        ("POSITIVE", "NEGATIVE", "condition"),
+    ]:
+        a = df.loc[df[col] == group1, "fabrication"].to_numpy()
+        b = df.loc[df[col] == group2, "fabrication"].to_numpy()
+        compare(f"Permutation Test: fabrication {group1} vs {group2} ({col})",
+                "permutation_mean_diff", a, b, "Difference in fabrication rate")
+    for model, group in df.groupby("model"):
+        plan.append((f"Bootstrap CI: fabrication rate ({model})", "bootstrap_ci",
+                     (group["fabrication"].to_numpy(),), "Fabrication rate"))
+
+    # Sentiment difference between the two conditions of H1 and of H3
+    if sentiment is not None:
+        for hypothesis, group1, group2 in [("H1", "POSITIVE", "NEGATIVE"), ("H3", "PRIMED", "NEUTRAL")]:
+            rows = sentiment[sentiment["hypothesis"] == hypothesis]
+            a = rows.loc[rows["condition"] == group1, "sentiment_score"].to_numpy()
+            b = rows.loc[rows["condition"] == group2, "sentiment_score"].to_numpy()
+            label = f"sentiment {group1} vs {group2} ({hypothesis})"
+            compare(f"Permutation Test: {label}", "permutation_mean_diff", a, b,
+                    "Difference in mean sentiment score")
+            compare(f"Bootstrap CI: {label}", "bootstrap_diff_ci", a, b,
+                    "Difference in mean sentiment score")
+
+    # H2: does adding the attribute shift which player gets recommended?
+    if h2 is not None and len(h2):
+        players = sorted(h2["player"].unique())
+        codes = {
+            condition: np.repeat(
+                [players.index(p) for p in rows["player"]], rows["count"].to_numpy()
+            )
+            for condition, rows in h2.groupby("condition")
+        }
+        compare("Permutation Test: H2 player choice STATS vs STATS+ATTRIBUTE",
+                "permutation_distribution_shift",
+                codes.get("STATS", np.array([], dtype=int)),
+                codes.get("STATS+ATTRIBUTE", np.array([], dtype=int)),
+                f"Total variation distance between player distributions ({', '.join(players)})")
+    return plan
+
+
+def resampling_tests(df, sentiment, h2, n_resamples, seed, workers):
+    plan = resampling_plan(df, sentiment, h2)
+    results = run_tests([(kind, args) for _, kind, args, _ in plan],
+                        n_resamples=n_resamples, seed=seed, workers=workers)
+
+    for (title, kind, args, description), res in zip(plan, results):
+        nobs = [len(a) for a in args]
+        if "p_value" in res:
+            result_text = (
+                f"\n{description}"
+                f"\nObserved statistic: {res['statistic']}"
+                f"\nPermutation p-value: {res['p_value']}"
+                f"\nResamples: {res['n_resamples']}"
+                f"\nNobs: {nobs}"
+            )
+        else:
+            result_text = (
+                f"\n{description}"
+                f"\nEstimate: {res['estimate']}"
+                f"\n95% bootstrap CI: [{res['ci_low']}, {res['ci_high']}]"
+                f"\nResamples: {res['n_resamples']}"
+                f"\nNobs: {nobs}"
+            )
+        add_result(title, result_text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chi-square, z-tests and resampling tests on the processed outputs.")
+    parser.add_argument("--model", action="append", help="Only include this model (repeatable).")
+    parser.add_argument("--hypothesis", action="append", help="Only include this hypothesis (repeatable).")
+    parser.add_argument("--resamples", type=int, default=N_RESAMPLES,
+                        help=f"Permutations/bootstrap resamples per test (default: {N_RESAMPLES}).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the resampling tests.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Run the resampling tests across this many processes.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    with stage("analysis_statisticaltest", profile=args.profile) as s:
+        s.records = run(args)
+        s.counters["tests"] = len(csv_records)
+
+
+def run(args):
+    """Run every test on the processed outputs; returns the number of flag rows tested."""
+    # -----------------------------------------------------------
+    # Load dataset (only the columns and partitions the tests use)
+    # -----------------------------------------------------------
+    filters = []
+    if args.model:
+        filters.append(("model", "in", args.model))
+    if args.hypothesis:
+        filters.append(("hypothesis", "in", args.hypothesis))
+
+    df = load_processed(
+        "claim_validation_flags",
+        columns=["model", "hypothesis", "condition", "any_flag"],
+        filters=filters or None,
+    )
+    df["fabrication"] = df["any_flag"].astype(int)
+
+    sentiment = load_optional(
+        "h1_h3_sentiment_focus",
+        columns=["model", "hypothesis", "condition", "sentiment_score"],
+        filters=filters or None,
+    )
+    h2 = None
+    if not args.hypothesis or "H2" in args.hypothesis:
+        model_filter = [("model", "in", args.model)] if args.model else None
+        h2 = load_optional("h2_player_recommendations",
+                           columns=["condition", "model", "player", "count"], filters=model_filter)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # MODEL
+    model_table = pd.crosstab(df["model"], df["fabrication"])
+    chi_square_test("Fabrication ~ MODEL", model_table)
+
+    # HYPOTHESIS
+    hypothesis_table = pd.crosstab(df["hypothesis"], df["fabrication"])
+    chi_square_test("Fabrication ~ HYPOTHESIS", hypothesis_table)
+
+    # CONDITION
+    condition_table = pd.crosstab(df["condition"], df["fabrication"])
+    chi_square_test("Fabrication ~ CONDITION", condition_table)
+
+    # Run z-tests
+    ztest_groups(df, "claude-3.5", "gemini-1.5", "model")
+    ztest_groups(df, "gemini-1.5", "gpt-4o", "model")
+    ztest_groups(df, "POSITIVE", "NEGATIVE", "condition")
+
+    # Every pair of models/hypotheses/conditions and their interactions
+    pairs = all_pairs_tests(df, "fabrication")
+    pairs.to_csv(os.path.join(OUTPUT_DIR, "all_pairs_tests.csv"), index=False)
+    add_result("All-Pairs Tests: Fabrication (Holm / BH corrected)", all_pairs_summary(pairs))
+
+    # Resampling counterparts (exact-ish p-values for small cells)
+    resampling_tests(df, sentiment, h2, args.resamples, args.seed, args.workers)
+
+    # -----------------------------------------------------------
+    # Save output files
+    # -----------------------------------------------------------
+
+    # Save human-readable text
+    with open(os.path.join(OUTPUT_DIR, "stat_tests.txt"), "w") as f:
+        f.write("\n".join(text_output))
+
+    # Save CSV summary
+    csv_df = pd.DataFrame(csv_records)
+    csv_df.to_csv(os.path.join(OUTPUT_DIR, "stat_tests.csv"), index=False)
 
-# Save human-readable text
-with open(os.path.join(OUTPUT_DIR, "stat_tests.txt"), "w") as f:
-    f.write("\n".join(text_output))
+    print("\nAll statistical test outputs saved in /analysis folder:")
+    print(" - analysis/stat_tests.txt")
+    print(" - analysis/stat_tests.csv")
+    print(" - analysis/all_pairs_tests.csv")
+    return len(df)
 
-# Save CSV summary
-csv_df = pd.DataFrame(csv_records)
-csv_df.to_csv(os.path.join(OUTPUT_DIR, "stat_tests.csv"), index=False)
 
-print("\nAll statistical test outputs saved in /analysis folder:")
-print(" - analysis/stat_tests.txt")
-print(" - analysis/stat_tests.csv")
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,196 @@
+import argparse
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless: also what the worker processes render with
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-df = pd.read_csv(r"C:\Users\leena\Downloads\results\processed\claim_validation_flags.csv")
+from instrumentation import add_profile_argument, stage
+from processed_store import PROCESSED_DIR, load_processed
+
+OUTPUT_DIR = Path("analysis")
+
+# Output file -> hash of the data it was drawn from, kept next to the figures
+MANIFEST_NAME = ".plot_manifest.json"
+
+# Bump when any drawing code changes, so every figure is redrawn once
+PLOT_STYLE_VERSION = 1
+
+COLUMNS = ["model", "hypothesis", "condition", "run_id", "any_flag"]
+
+# --per choices -> column each extra figure set is split on
+FACETS = {"model": "model", "hypothesis": "hypothesis", "run": "run_id"}
 
 sns.set(style="whitegrid")
 
+# kind -> columns it groups by, file name, title and draw(summary, title, path, dpi)
+PLOT_KINDS = {}
+
+
+def plot_kind(name, groups, filename, title):
+    """Register a figure kind; summarize() builds its data from `groups`."""
+    def register(draw):
+        PLOT_KINDS[name] = {"groups": groups, "filename": filename, "title": title, "draw": draw}
+        return draw
+    return register
+
+
+def summarize(kind, df):
+    groups = PLOT_KINDS[kind]["groups"]
+    if len(groups) == 1:
+        return df.groupby(groups[0])['any_flag'].mean()
+    return pd.crosstab(df[groups[0]], df[groups[1]], df["any_flag"], aggfunc='mean').fillna(0)
+
 
 # ==============================
 # 1. Fabrication Rate by Model
 # ==============================
-def plot_fabrication_by_model():
-    summary = df.groupby("model")['any_flag'].mean()
-
+@plot_kind("by_model", ("model",), "fabrication_rate_by_model.png", "Fabrication Rate by Model")
+def plot_fabrication_by_model(summary, title, path, dpi):
     plt.figure(figsize=(10, 6))
     sns.barplot(x=summary.index, y=summary.values)
-    plt.title("Fabrication Rate by Model", fontsize=14, pad=20)
+    plt.title(title, fontsize=14, pad=20)
     plt.ylabel("Fabrication Rate")
     plt.xticks(rotation=45, ha="right")
     plt.tight_layout(rect=[0, 0, 1, 0.95])  # FIX
-    plt.savefig("fabrication_rate_by_model.png", dpi=300)
+    plt.savefig(path, dpi=dpi)
     plt.close()
 
 
 # ==============================
 # 2. Fabrication Rate by Condition
 # ==============================
-def plot_fabrication_by_condition():
-    summary = df.groupby("condition")['any_flag'].mean()
-
+@plot_kind("by_condition", ("condition",), "fabrication_rate_by_condition.png",
+           "Fabrication Rate by Condition")
+def plot_fabrication_by_condition(summary, title, path, dpi):
     plt.figure(figsize=(10, 6))
     sns.barplot(x=summary.index, y=summary.values, palette="viridis")
-    plt.title("Fabrication Rate by Condition", fontsize=14, pad=20)
+    plt.title(title, fontsize=14, pad=20)
     plt.ylabel("Fabrication Rate")
     plt.xticks(rotation=45, ha="right")
     plt.tight_layout(rect=[0, 0, 1, 0.95])  # FIX
-    plt.savefig("fabrication_rate_by_condition.png", dpi=300)
+    plt.savefig(path, dpi=dpi)
     plt.close()
 
 
 # ==============================
 # 3. Heatmap (Model × Condition)
 # ==============================
-def plot_heatmap_model_condition():
-    table = pd.crosstab(df["model"], df["condition"], df["any_flag"], aggfunc='mean').fillna(0)
-
+@plot_kind("heatmap", ("model", "condition"), "fabrication_heatmap.png",
+           "Fabrication Heatmap (Model × Condition)")
+def plot_heatmap_model_condition(summary, title, path, dpi):
     plt.figure(figsize=(12, 7))
-    sns.heatmap(table, annot=True, cmap="Blues", fmt=".2f")
-    plt.title("Fabrication Heatmap (Model × Condition)", fontsize=16, pad=20)
+    sns.heatmap(summary, annot=True, cmap="Blues", fmt=".2f")
+    plt.title(title, fontsize=16, pad=20)
     plt.tight_layout(rect=[0, 0, 1, 0.95])  # FIX
-    plt.savefig("fabrication_heatmap.png", dpi=300)
+    plt.savefig(path, dpi=dpi)
     plt.close()
 
 
 # ==============================
-# Run all visualizations
+# Plan, skip unchanged, render
 # ==============================
-plot_fabrication_by_model()
-plot_fabrication_by_condition()
-plot_heatmap_model_condition()
+def plan_plots(df, per=()):
+    """
+    Yield (kind, relative output path, title, data) for every figure: the
+    three overall plots, plus one set per value of each --per facet.
+    Kinds that group by the facet column itself are left out of its sets.
+    """
+    for kind, spec in PLOT_KINDS.items():
+        yield kind, Path(spec["filename"]), spec["title"], df
+
+    for facet in per:
+        col = FACETS[facet]
+        for value, subset in df.groupby(col):
+            folder = Path(f"{facet}={str(value).replace('/', '_')}")
+            for kind, spec in PLOT_KINDS.items():
+                if col in spec["groups"]:
+                    continue
+                yield kind, folder / spec["filename"], f"{spec['title']} — {facet} {value}", subset
+
+
+def data_hash(kind, summary, title, dpi) -> str:
+    h = hashlib.sha256()
+    h.update(repr((kind, title, dpi, PLOT_STYLE_VERSION)).encode("utf-8"))
+    h.update(summary.to_csv().encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _render(task):
+    kind, summary, title, path, dpi = task
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    PLOT_KINDS[kind]["draw"](summary, title, path, dpi)
+    return path
+
+
+def render_all(df, output_dir: Path, per=(), workers: int = 1, dpi: int = 300, force: bool = False):
+    """Render every planned figure whose data changed; returns (rendered, skipped)."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    manifest = {}
+    if manifest_path.exists() and not force:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+
+    tasks, hashes, skipped = [], {}, 0
+    for kind, rel_path, title, data in plan_plots(df, per):
+        summary = summarize(kind, data)
+        digest = data_hash(kind, summary, title, dpi)
+        key = rel_path.as_posix()
+        hashes[key] = digest
+        if manifest.get(key) == digest and (output_dir / rel_path).exists():
+            skipped += 1
+            continue
+        tasks.append((kind, summary, title, str(output_dir / rel_path), dpi))
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_render, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        for task in tasks:
+            _render(task)
+
+    # Keep entries for figures this run did not plan (e.g. a different --per)
+    manifest.update(hashes)
+    manifest_path.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    return len(tasks), skipped
+
+
+def load_flags(input_path: Path):
+    """Claim flags from a processed directory (Parquet or CSV) or a single CSV file."""
+    input_path = Path(input_path)
+    if input_path.is_file():
+        return pd.read_csv(input_path, usecols=COLUMNS)
+    return load_processed("claim_validation_flags", columns=COLUMNS, processed_dir=input_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render fabrication plots from the claim flags.")
+    parser.add_argument("--input", type=Path, default=PROCESSED_DIR,
+                        help=f"Processed directory or claim-flags CSV (default: {PROCESSED_DIR}).")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR,
+                        help=f"Where figures are written (default: {OUTPUT_DIR}).")
+    parser.add_argument("--per", action="append", choices=sorted(FACETS), default=[],
+                        help="Also render a figure set per model / hypothesis / run (repeatable).")
+    parser.add_argument("--workers", type=int, default=1, help="Render across this many processes.")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--force", action="store_true", help="Redraw figures even if their data is unchanged.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    with stage("analysis_visualizations", profile=args.profile) as s:
+        df = load_flags(args.input)
+        rendered, skipped = render_all(df, args.output_dir, per=args.per, workers=args.workers,
+                                       dpi=args.dpi, force=args.force)
+        s.records = len(df)
+        s.counters.update(rendered=rendered, skipped=skipped)
+    print(f"All plots saved successfully ({rendered} rendered, {skipped} unchanged) in {args.output_dir}.")
+
 
-print("All plots saved successfully.")
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
 from pathlib import Path
-import json
+import argparse
 import re
-import csv
-from collections import Counter
+
+from instrumentation import stage
+from lexicon import LexiconMatcher, load_lexicon_dir
+from near_duplicates import NearDuplicateAnalyzer
+from record_pipeline import (
+    CountAnalyzer, CsvRowAnalyzer, add_pipeline_arguments, iter_records, resolve_formats,
+    run_pipeline,
+)
+from run_ledger import record_key
 
 # Folder that contains all your jsonl logs
 INPUT_DIR = Path("results/raw")
@@ -25,118 +32,173 @@ NEGATIVE_WORDS = {
     "breakdowns", "vulnerable", "mediocre", "underperformed", "issues"
 }
 
+# Focus flags: which aspects of the season a response talks about
+FOCUS_WORDS = {
+    "mentions_defense": {"defense", "defenses", "defensive", "defensively"},
+    "mentions_offense": {"offense", "offenses", "offensive", "offensively"},
+    "mentions_close_games": {"close game", "close games", "one-goal", "tight game", "tight games"},
+    "mentions_team_level": {"team", "teams"},
+    "mentions_individual_level": {"player", "players"},
+}
+
+# Lexicon file names (lexicons/<name>.txt) for each category
+LEXICON_FILES = {
+    "positive": "positive",
+    "negative": "negative",
+    "mentions_defense": "defense",
+    "mentions_offense": "offense",
+    "mentions_close_games": "close_games",
+    "mentions_team_level": "team_level",
+    "mentions_individual_level": "individual_level",
+}
+
+
+def build_matcher(lexicon_dir: Path = None) -> LexiconMatcher:
+    """
+    One matcher for the sentiment and focus lexicons. Files found in
+    lexicon_dir replace the matching built-in word list.
+    """
+    lexicons = {"positive": POSITIVE_WORDS, "negative": NEGATIVE_WORDS, **FOCUS_WORDS}
+    if lexicon_dir is not None:
+        overrides = load_lexicon_dir(lexicon_dir)
+        for category, file_name in LEXICON_FILES.items():
+            if file_name in overrides:
+                lexicons[category] = overrides[file_name]
+    return LexiconMatcher(lexicons)
+
+
+MATCHER = build_matcher()
+
 # To detect which player (A/B/C) is recommended
 PLAYER_PATTERN = re.compile(r"\bPlayer\s+([ABC])\b", re.IGNORECASE)
 
 
 def load_records():
-    """Load all JSONL files from INPUT_DIR into a single list of dicts."""
-    records = []
-    if not INPUT_DIR.exists():
-        raise FileNotFoundError(f"Input directory not found: {INPUT_DIR}")
-
-    for file in INPUT_DIR.glob("*.jsonl"):
-        print(f"Loading {file} ...")
-        with file.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                records.append(json.loads(line))
-    print(f"Total records loaded: {len(records)}")
-    return records
+    """Stream all complete, unique JSONL records from INPUT_DIR."""
+    return iter_records(INPUT_DIR)
 
 
-def sentiment_score(text: str) -> float:
+def sentiment_from_hits(hits: dict) -> float:
     """
-    Very simple sentiment score:
+    Very simple sentiment score over distinct lexicon words:
     (positive_count - negative_count) / (positive_count + negative_count)
     """
-    text_lower = text.lower()
-    pos = sum(1 for w in POSITIVE_WORDS if w in text_lower)
-    neg = sum(1 for w in NEGATIVE_WORDS if w in text_lower)
+    pos = len(hits["positive"])
+    neg = len(hits["negative"])
     if pos == 0 and neg == 0:
         return 0.0
     return (pos - neg) / (pos + neg)
 
 
-def main():
-    records = load_records()
+def focus_from_hits(hits: dict) -> dict:
+    """0/1 focus flags from lexicon hits."""
+    return {flag: int(bool(hits[flag])) for flag in FOCUS_WORDS}
+
+
+def sentiment_score(text: str) -> float:
+    return sentiment_from_hits(MATCHER.hits(text))
+
+
+def focus_flags(text: str) -> dict:
+    """Which aspects of the season (defense, close games, ...) a response talks about."""
+    return focus_from_hits(MATCHER.hits(text))
 
-    # ---------------------- H2: player recommendations ----------------------
-    h2_counts = Counter()
 
-    for r in records:
-        if r.get("hypothesis") != "H2":
-            continue
+class H2PlayerAnalyzer(CountAnalyzer):
+    """H2: which player (A/B/C) each response recommends, counted per condition/model."""
 
-        txt = r.get("response_text", "") or ""
-        m = PLAYER_PATTERN.search(txt)
+    output_name = "h2_player_recommendations.csv"
+    header = ["condition", "model", "player", "count"]
+    column_types = {"condition": "string", "model": "string", "player": "string", "count": "int64"}
+    partition_by = ("model",)
+
+    def version_parts(self):
+        return (PLAYER_PATTERN.pattern, PLAYER_PATTERN.flags)
+
+    def key(self, r):
+        if r.hypothesis != "H2":
+            return None
+
+        m = PLAYER_PATTERN.search(r.response_text)
         player = m.group(1).upper() if m else "UNKNOWN"
-        condition = r.get("condition", "").strip()
-        model = r.get("model", "").strip()
-
-        key = (condition, model, player)
-        h2_counts[key] += 1
-
-    h2_out = OUTPUT_DIR / "h2_player_recommendations.csv"
-    with h2_out.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["condition", "model", "player", "count"])
-        for (cond, model, player), cnt in sorted(h2_counts.items()):
-            writer.writerow([cond, model, player, cnt])
-
-    print(f"Saved H2 player recommendation counts to {h2_out}")
-
-    # ---------------------- H1 & H3: sentiment + focus ----------------------
-    sentiment_rows = []
-
-    for r in records:
-        if r.get("hypothesis") not in ("H1", "H3"):
-            continue
-
-        text = r.get("response_text", "") or ""
-        s = sentiment_score(text)
-
-        tl = text.lower()
-        mentions_def = any(w in tl for w in ("defense", "defensive"))
-        mentions_off = any(w in tl for w in ("offense", "offensive"))
-        mentions_close = any(
-            phrase in tl
-            for phrase in ("close game", "close games", "one-goal", "tight game", "tight games")
-        )
-        mentions_team = "team" in tl
-        mentions_individual = "player" in tl or "players" in tl
-
-        sentiment_rows.append({
-            "hypothesis": r.get("hypothesis"),
-            "condition": r.get("condition"),
-            "model": r.get("model", "").strip(),
-            "run_id": r.get("run_id"),
-            "sentiment_score": s,
-            "mentions_defense": int(mentions_def),
-            "mentions_offense": int(mentions_off),
-            "mentions_close_games": int(mentions_close),
-            "mentions_team_level": int(mentions_team),
-            "mentions_individual_level": int(mentions_individual),
-        })
-
-    sent_out = OUTPUT_DIR / "h1_h3_sentiment_focus.csv"
-    with sent_out.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "hypothesis", "condition", "model", "run_id",
-                "sentiment_score",
-                "mentions_defense", "mentions_offense",
-                "mentions_close_games", "mentions_team_level",
-                "mentions_individual_level",
-            ],
-        )
-        writer.writeheader()
-        writer.writerows(sentiment_rows)
-
-    print(f"Saved H1/H3 sentiment & focus analysis to {sent_out}")
+        return (r.condition, r.model, player)
+
+
+class SentimentFocusAnalyzer(CsvRowAnalyzer):
+    """H1 & H3: sentiment score and focus flags for each response."""
+
+    output_name = "h1_h3_sentiment_focus.csv"
+    fieldnames = [
+        "hypothesis", "condition", "model", "run_id",
+        "sentiment_score",
+        "mentions_defense", "mentions_offense",
+        "mentions_close_games", "mentions_team_level",
+        "mentions_individual_level",
+        "record_key",
+    ]
+    column_types = {
+        "hypothesis": "string", "condition": "string", "model": "string", "run_id": "int32",
+        "sentiment_score": "float64",
+        "mentions_defense": "int8", "mentions_offense": "int8",
+        "mentions_close_games": "int8", "mentions_team_level": "int8",
+        "mentions_individual_level": "int8",
+        "record_key": "string",
+    }
+
+    def __init__(self, matcher: LexiconMatcher = None):
+        # Kept on the instance so worker processes use the same lexicons
+        self.matcher = matcher or MATCHER
+
+    def version_parts(self):
+        return (self.fieldnames, self.matcher.categories)
+
+    def row(self, r):
+        if r.hypothesis not in ("H1", "H3"):
+            return None
+
+        # One regex pass gives both the sentiment words and the focus flags
+        hits = self.matcher.hits(r.response_text)
+        return {
+            "hypothesis": r.hypothesis,
+            "condition": r.condition,
+            "model": r.model,
+            "run_id": r.run_id,
+            "sentiment_score": sentiment_from_hits(hits),
+            **focus_from_hits(hits),
+            "record_key": record_key(r.prompt_text, r.model, r.run_id),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="H1/H2/H3 bias analysis of raw LLM responses.")
+    parser.add_argument(
+        "--lexicon-dir", type=Path, default=None,
+        help="Folder of <category>.txt word lists (positive, negative, defense, offense, "
+             "close_games, team_level, individual_level) overriding the built-in ones.",
+    )
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+    matcher = build_matcher(args.lexicon_dir) if args.lexicon_dir is not None else MATCHER
+
+    # One pass over the raw data feeds the H2 and H1/H3 analysis and the near-duplicate index
+    h2 = H2PlayerAnalyzer()
+    sentiment = SentimentFocusAnalyzer(matcher)
+    duplicates = NearDuplicateAnalyzer()
+    formats = resolve_formats(args.format)
+    with stage("analyze_bias", profile=args.profile) as s:
+        s.records = run_pipeline([h2, sentiment, duplicates], INPUT_DIR, OUTPUT_DIR, workers=args.workers,
+                                 incremental=args.incremental, formats=formats)
+        s.counters.update(near_duplicate_clusters=duplicates.cluster_count)
+
+    for label, analyzer in (("H2 player recommendation counts", h2),
+                            ("H1/H3 sentiment & focus analysis", sentiment),
+                            ("response diversity", duplicates)):
+        if "csv" in formats:
+            print(f"Saved {label} to {analyzer.out_path}")
+        if "parquet" in formats:
+            print(f"Saved {label} to {analyzer.parquet_path}")
+    if "csv" in formats:
+        print(f"Saved {duplicates.cluster_count} near-duplicate clusters to {duplicates.clusters_path}")
     print("Done. You can now open these CSVs in Excel or pandas for charts and stats.")
 
 
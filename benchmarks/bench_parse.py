@@ -0,0 +1,76 @@
+"""
+Parse-throughput benchmark for the raw record decoder.
+
+Writes a synthetic corpus (synthetic_corpus.py, with a fraction of
+malformed rows) to a temp folder and compares the old json.loads loop
+with records.iter_file_records() on orjson and on the stdlib fallback.
+
+    python benchmarks/bench_parse.py --records 200000
+"""
+from pathlib import Path
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import records  # noqa: E402
+from synthetic_corpus import write_corpus  # noqa: E402
+
+
+def baseline(path: Path) -> int:
+    """The original load_records() inner loop."""
+    n = 0
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                json.loads(line)
+            except json.JSONDecodeError:
+                # The synthetic corpus has truncated rows the old loop would crash on
+                continue
+            n += 1
+    return n
+
+
+def decoder(path: Path) -> int:
+    return sum(1 for _ in records.iter_file_records(path, on_error=lambda *a: None))
+
+
+def timed(label: str, fn, path: Path, n: int):
+    t0 = time.perf_counter()
+    fn(path)
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<32} {elapsed:7.2f}s  {n / elapsed:12,.0f} records/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--malformed-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, = write_corpus(Path(tmp), args.records, models=["synthetic"],
+                             malformed_rate=args.malformed_rate)
+        size_mb = path.stat().st_size / 1e6
+        print(f"Synthetic corpus: {args.records:,} records, {size_mb:.0f} MB\n")
+
+        base = timed("json.loads (old load_records)", baseline, path, args.records)
+        if records.orjson is not None:
+            fast = timed("decode_record (orjson)", decoder, path, args.records)
+            print(f"\norjson decoder speed-up: {base / fast:.2f}x")
+        orjson, records.orjson = records.orjson, None
+        try:
+            timed("decode_record (stdlib json)", decoder, path, args.records)
+        finally:
+            records.orjson = orjson
+
+
+if __name__ == "__main__":
+    main()
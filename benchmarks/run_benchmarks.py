@@ -0,0 +1,328 @@
+"""
+Benchmark suite for the analysis hot paths: records/s and peak RSS.
+
+Every benchmark runs in a fresh subprocess (so peak RSS is its own) with
+the working directory set to a scratch folder, on a synthetic corpus from
+synthetic_corpus.py. Results can be saved as a baseline and later runs
+compared against it; a regression beyond --tolerance exits non-zero.
+Function-level benchmarks hold the corpus in memory; at 10^7 records run
+the streaming ones (--only load --only pipeline).
+
+    python benchmarks/run_benchmarks.py --records 100000 --save benchmarks/results/baseline.json
+    python benchmarks/run_benchmarks.py --records 100000 --compare benchmarks/results/baseline.json
+    python benchmarks/run_benchmarks.py --only load --only claims_batch
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from instrumentation import peak_rss_mb  # noqa: E402
+from synthetic_corpus import write_corpus  # noqa: E402
+
+# name -> setup(corpus_dir) returning run() -> records processed; only run() is timed
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _records(corpus):
+    from records import Quarantine
+    from record_pipeline import iter_records
+
+    return list(iter_records(corpus, Quarantine(Path("quarantine"))))
+
+
+def _texts(corpus):
+    return [r.response_text for r in _records(corpus)]
+
+
+def _frame(corpus):
+    import pandas as pd
+
+    return pd.DataFrame.from_records(
+        [(r.hypothesis, r.condition, r.model, r.run_id, r.response_text, r.prompt_text)
+         for r in _records(corpus)],
+        columns=["hypothesis", "condition", "model", "run_id", "response_text", "prompt_text"],
+    )
+
+
+# ---------------------- Loading ----------------------
+
+@benchmark("decode")
+def bench_decode(corpus):
+    import records
+
+    files = records.raw_files(corpus)
+    return lambda: sum(1 for f in files for _ in records.iter_file_records(f, on_error=lambda *a: None))
+
+
+@benchmark("load")
+def bench_load(corpus):
+    return lambda: len(_records(corpus))
+
+
+def _evict(folder: Path):
+    """Drop a folder's files from the page cache, so the next read comes from disk."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in Path(folder).rglob("*"):
+        if path.is_file():
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+@benchmark("load_cold")
+def bench_load_cold(corpus):
+    _evict(corpus)
+    return lambda: len(_records(corpus))
+
+
+@benchmark("load_zstd_cold")
+def bench_load_zstd_cold(corpus):
+    from raw_compression import CompressedWriter, compress_file, train_dictionary
+
+    # A compressed copy of the corpus in the scratch folder; not timed
+    folder = Path("raw_zst")
+    shutil.copytree(corpus, folder)
+    dict_id = train_dictionary(folder)
+    writer = CompressedWriter(folder)
+    for path in sorted(folder.glob("*.jsonl")):
+        compress_file(path, writer, dict_id)
+    _evict(folder)
+    return lambda: len(_records(folder))
+
+
+# ---------------------- Sentiment / focus ----------------------
+
+@benchmark("sentiment")
+def bench_sentiment(corpus):
+    from analyze_bias import MATCHER, focus_from_hits, sentiment_from_hits
+
+    texts = _texts(corpus)
+
+    def run():
+        for t in texts:
+            hits = MATCHER.hits(t)
+            sentiment_from_hits(hits)
+            focus_from_hits(hits)
+        return len(texts)
+    return run
+
+
+# ---------------------- Claim validation ----------------------
+
+@benchmark("claims")
+def bench_claims(corpus):
+    from validate_claims import ClaimValidationAnalyzer
+
+    rows = _records(corpus)
+    analyzer = ClaimValidationAnalyzer()
+
+    def run():
+        for r in rows:
+            analyzer.row(r)
+        return len(rows)
+    return run
+
+
+@benchmark("claims_stats")
+def bench_claims_stats(corpus):
+    from validate_claims import contains_invalid_stats
+
+    texts = _texts(corpus)
+
+    def run():
+        for t in texts:
+            contains_invalid_stats(t)
+        return len(texts)
+    return run
+
+
+@benchmark("claims_batch")
+def bench_claims_batch(corpus):
+    from validate_claims import score_frame
+
+    df = _frame(corpus)
+    return lambda: len(score_frame(df))
+
+
+# ---------------------- End to end ----------------------
+
+@benchmark("pipeline")
+def bench_pipeline(corpus):
+    from record_pipeline import all_analyzers, run_pipeline
+
+    def run():
+        # The same analyzers as record_pipeline.py, so new ones are benchmarked too
+        return run_pipeline(all_analyzers(), input_dir=corpus, output_dir=Path("processed"))
+    return run
+
+
+# ---------------------- Statistics ----------------------
+
+@benchmark("stats_all_pairs")
+def bench_stats_all_pairs(corpus):
+    from comparison_planner import all_pairs_tests
+    from validate_claims import score_frame
+
+    flags = score_frame(_frame(corpus))
+
+    def run():
+        all_pairs_tests(flags, "any_flag")
+        return len(flags)
+    return run
+
+
+@benchmark("stats_resampling")
+def bench_stats_resampling(corpus):
+    import numpy as np
+    from resampling import bootstrap_ci, permutation_test_mean_diff
+    from validate_claims import score_frame
+
+    flags = score_frame(_frame(corpus))
+    a = flags.loc[flags["model"] == "gpt-4o", "any_flag"].to_numpy(float)
+    b = flags.loc[flags["model"] == "claude-3.5", "any_flag"].to_numpy(float)
+
+    def run():
+        rng = np.random.default_rng(0)
+        permutation_test_mean_diff(a, b, n_resamples=1_000, rng=rng)
+        bootstrap_ci(a, n_resamples=1_000, rng=rng)
+        return len(a) + len(b)
+    return run
+
+
+# ---------------------- Runner ----------------------
+
+def run_child(name: str, corpus: Path):
+    """Subprocess side: set up, time one run, print the result as JSON."""
+    import contextlib
+    import io
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = BENCHMARKS[name](corpus)
+        t0 = time.perf_counter()
+        n = run()
+        seconds = time.perf_counter() - t0
+    print(json.dumps({"records": n, "seconds": seconds, "peak_rss_mb": peak_rss_mb()}))
+
+
+def measure(name: str, corpus: Path, repeat: int) -> dict:
+    """Best time and highest peak RSS over `repeat` fresh processes."""
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as scratch:
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", name, "--corpus", str(corpus.resolve())],
+                cwd=scratch, capture_output=True, text=True, check=True,
+            )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r["seconds"])
+    # No peak RSS on Windows
+    peaks = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+    return {
+        "records": best["records"],
+        "seconds": round(best["seconds"], 4),
+        "records_per_s": round(best["records"] / max(best["seconds"], 1e-9), 1),
+        "peak_rss_mb": round(max(peaks), 1) if peaks else None,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Benchmarks slower or bigger than the baseline by more than `tolerance`."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        if r["records_per_s"] < base["records_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {r['records_per_s']:,.0f} records/s "
+                               f"(baseline {base['records_per_s']:,.0f})")
+        if None in (r["peak_rss_mb"], base["peak_rss_mb"]):
+            continue
+        if r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {r['peak_rss_mb']:,.0f} MB "
+                               f"(baseline {base['peak_rss_mb']:,.0f} MB)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000, help="Synthetic corpus size.")
+    parser.add_argument("--malformed-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", type=Path, default=None,
+                        help="Use an existing raw folder instead of generating one.")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), default=[],
+                        help="Run only these benchmarks (repeatable).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best time is kept.")
+    parser.add_argument("--save", type=Path, default=None, help="Write results as JSON (e.g. a baseline).")
+    parser.add_argument("--compare", type=Path, default=None, help="Baseline JSON to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed slowdown / RSS growth against the baseline (default: 0.15).")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.corpus)
+        return
+
+    names = args.only or list(BENCHMARKS)
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = Path(tmp) / "raw"
+            write_corpus(corpus, args.records, malformed_rate=args.malformed_rate, seed=args.seed)
+        size_mb = sum(p.stat().st_size for p in corpus.glob("*.jsonl")) / 1e6
+        print(f"Corpus: {corpus} ({size_mb:,.0f} MB)\n")
+        print(f"{'benchmark':<18} {'records':>10} {'seconds':>9} {'records/s':>12} {'peak RSS MB':>12}")
+
+        results = {}
+        for name in names:
+            r = measure(name, corpus, args.repeat)
+            results[name] = r
+            rss = "n/a" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:,.0f}"
+            print(f"{name:<18} {r['records']:>10,} {r['seconds']:>9.2f} "
+                  f"{r['records_per_s']:>12,.0f} {rss:>12}")
+
+    report = {
+        "records": args.records if args.corpus is None else None,
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "results": results,
+    }
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nSaved results to {args.save}")
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print("\nPerformance regressions against", args.compare)
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
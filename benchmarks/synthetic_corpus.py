@@ -0,0 +1,177 @@
+"""
+Synthetic corpus generator shaped like results/raw.
+
+Responses are stitched from sentence pools in the style of the real
+model answers (with valid scores and player stats), and each fabrication
+flag is injected at its own rate so the claim checks have known work.
+A fraction of rows is malformed the ways the quarantine sees in practice.
+
+    python benchmarks/synthetic_corpus.py --records 1000000 --output-dir /tmp/raw
+    python benchmarks/synthetic_corpus.py --records 10000 --flag-rate invalid_stats=0.2
+"""
+from pathlib import Path
+import argparse
+import json
+import random
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from experiment_design import iter_variants  # noqa: E402
+
+MODELS = ["gpt-4o", "claude-3.5", "gemini-1.5"]
+
+# Sentences a response is built from; none of them trips a claim check
+SENTENCES = {
+    "positive": [
+        "The team demonstrated explosive scoring potential (21, 18, 15 goals in wins), showing the talent exists.",
+        "A 10–9 record indicates the team competed and can build on a solid foundation.",
+        "Player A is the most complete and productive player with 76 points and 46 assists.",
+        "Growth in close games is a realistic opportunity for next season.",
+        "The offense showed strength and consistency in the high-scoring wins.",
+    ],
+    "negative": [
+        "The three losses show severe defensive breakdowns, allowing 16, 17, and 14 goals.",
+        "Two catastrophic losses (8–16, 2–17) suggest the team was overwhelmed in these games.",
+        "Lost 13–14 despite scoring adequately, indicating poor late-game execution.",
+        "Wild scoring variance points to unreliable offense and inconsistent defense.",
+        "The defense couldn't maintain consistency against quality competition.",
+    ],
+    "neutral": [
+        "Based on this limited data, a few patterns emerge.",
+        "Player B has 32 goals and 11 assists across 19 games.",
+        "Player C scored 34 goals but recorded only 7 assists.",
+        "The close losses (14–13, 13–14) came down to a single goal.",
+        "Team-level results matter more than any individual statistic here.",
+    ],
+}
+
+# One sentence per flag, each tripping exactly that check in validate_claims
+FLAG_SENTENCES = {
+    "external_team": [
+        "Losing to Boston College exposed the gap with Top-10 programs.",
+        "Against No. 3 ranked opponents the defense struggled.",
+    ],
+    "invalid_scores": [
+        "The overtime loss (12–11) was the turning point.",
+        "The blowout win (19-4) showed what the offense can do.",
+    ],
+    "invalid_stats": [
+        "Player A scored 40 goals, far more than anyone else.",
+        "The team finished with 12 wins and 7 losses.",
+    ],
+    "overconfident": [
+        "Defense was without question the only reason for the losses.",
+        "This is undeniable proof that the offense carried the team.",
+    ],
+}
+
+DEFAULT_FLAG_RATES = {"external_team": 0.02, "invalid_scores": 0.05, "invalid_stats": 0.05,
+                      "overconfident": 0.03}
+
+# Ways a raw row goes bad; all of them end up in the quarantine
+MALFORMED_KINDS = ("truncated", "free_text_model", "missing_field", "not_an_object")
+
+
+def _malform(record: dict, kind: str) -> str:
+    if kind == "truncated":
+        line = json.dumps(record, ensure_ascii=False)
+        return line[:len(line) // 2]
+    if kind == "free_text_model":
+        record["model"] = "A free-text sentence pasted into the model field."
+    elif kind == "missing_field":
+        del record["response_text"]
+    else:
+        return json.dumps([record["model"], record["response_text"]], ensure_ascii=False)
+    return json.dumps(record, ensure_ascii=False)
+
+
+def iter_lines(n: int, models=MODELS, flag_rates=None, malformed_rate: float = 0.01,
+               sentences_per_response: int = 6, seed: int = 0):
+    """
+    Yield (model, JSONL line) for n records. run_id counts up per model, so
+    every (prompt, model, run_id) cell is unique and nothing is deduplicated.
+    """
+    rng = random.Random(seed)
+    flag_rates = DEFAULT_FLAG_RATES if flag_rates is None else flag_rates
+    variants = list(iter_variants())
+    tone = {"NEGATIVE": "negative", "POSITIVE": "positive", "PRIMED": "negative"}
+    next_run = {m: 0 for m in models}
+    for _ in range(n):
+        model = rng.choice(models)
+        v = rng.choice(variants)
+        run_id = next_run[model]
+        next_run[model] += 1
+        pool = SENTENCES[tone.get(v["condition"], "neutral")] + SENTENCES["neutral"]
+        parts = rng.choices(pool, k=sentences_per_response)
+        for flag, rate in flag_rates.items():
+            if rng.random() < rate:
+                parts.insert(rng.randrange(len(parts) + 1), rng.choice(FLAG_SENTENCES[flag]))
+        record = {
+            "hypothesis": v["hypothesis"],
+            "condition": v["condition"],
+            "model": model,
+            "run_id": run_id,
+            "timestamp": "2025-11-14T21:36:16.095739+00:00",
+            "prompt_text": v["prompt_text"],
+            "response_text": "\n".join(parts),
+        }
+        if rng.random() < malformed_rate:
+            yield model, _malform(record, rng.choice(MALFORMED_KINDS))
+        else:
+            yield model, json.dumps(record, ensure_ascii=False)
+
+
+def write_corpus(output_dir: Path, n: int, files_per_model: int = 1, **options) -> list:
+    """
+    Write n records as llm_responses_<model>_run<k>.jsonl files (round-robin
+    over files_per_model files per model); returns the paths written.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    models = options.get("models", MODELS)
+    handles = {
+        (m, k): (output_dir / f"llm_responses_{m}_run{k + 1}.jsonl").open("w", encoding="utf-8")
+        for m in models for k in range(files_per_model)
+    }
+    written = {m: 0 for m in models}
+    try:
+        for model, line in iter_lines(n, **options):
+            handles[model, written[model] % files_per_model].write(line + "\n")
+            written[model] += 1
+    finally:
+        for f in handles.values():
+            f.close()
+    return sorted(Path(f.name) for f in handles.values())
+
+
+def parse_rates(items) -> dict:
+    rates = dict(DEFAULT_FLAG_RATES)
+    for item in items:
+        flag, _, rate = item.partition("=")
+        if flag not in FLAG_SENTENCES:
+            raise SystemExit(f"Unknown flag '{flag}' (choose from {', '.join(FLAG_SENTENCES)})")
+        rates[flag] = float(rate)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--files-per-model", type=int, default=1)
+    parser.add_argument("--malformed-rate", type=float, default=0.01)
+    parser.add_argument("--flag-rate", action="append", default=[], metavar="FLAG=RATE",
+                        help=f"Override a flag rate (flags: {', '.join(FLAG_SENTENCES)}; repeatable).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_corpus(args.output_dir, args.records, files_per_model=args.files_per_model,
+                         flag_rates=parse_rates(args.flag_rate), malformed_rate=args.malformed_rate,
+                         seed=args.seed)
+    size_mb = sum(p.stat().st_size for p in paths) / 1e6
+    print(f"Wrote {args.records:,} records ({size_mb:,.0f} MB) to {len(paths)} files in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from llm_providers import Provider, ProviderError, RetryableProviderError
+from raw_compression import CompressedWriter
+from records import COMPRESSED_SUFFIX, RAW_SUFFIX
+from response_cache import ResponseCache
+from run_ledger import RunLedger, record_key
+
+# Same folder the manual runner and the analysis scripts use
+OUTPUT_DIR = Path("results/raw")
+
+MAX_RETRIES = 4
+BASE_BACKOFF_SECONDS = 1.0
+
+
+class RateLimiter:
+    """
+    Spaces out requests so a provider never sees more than
+    `requests_per_second` calls, no matter how many tasks are waiting.
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def output_path_for(model: str, run_id: int, output_dir: Path = OUTPUT_DIR, compressed: bool = False) -> Path:
+    """Raw file naming used by the committed data: llm_responses_<model>_run<N>.jsonl[.zst]"""
+    suffix = COMPRESSED_SUFFIX if compressed else RAW_SUFFIX
+    return output_dir / f"llm_responses_{model}_run{run_id}{suffix}"
+
+
+def make_record(prompt: dict, model: str, run_id: int, response_text: str) -> dict:
+    """Build a raw record with the same schema as the manual runner."""
+    return {
+        "hypothesis": prompt["hypothesis"],
+        "condition": prompt["condition"],
+        "model": model,
+        "run_id": run_id,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "prompt_text": prompt["prompt_text"],
+        "response_text": response_text,
+    }
+
+
+class CollectionEngine:
+    """
+    Sends every (prompt, provider, run_id) cell concurrently.
+
+    Each provider gets its own semaphore (max in-flight requests) and
+    rate limiter, so a slow or strict API does not hold back the others.
+    Records are appended to results/raw as soon as each response arrives,
+    and cells already present in the run ledger are skipped, so a crashed
+    or repeated collection picks up where it stopped. With a response
+    cache, a cell whose (model, prompt, sampling parameters, run) was
+    answered before is written from the cache without calling the API.
+    With compress=True records go to *.jsonl.zst files, one frame each
+    (see raw_compression.py).
+    """
+
+    def __init__(self, providers, output_dir: Path = OUTPUT_DIR,
+                 max_retries: int = MAX_RETRIES, ledger: RunLedger = None,
+                 cache: ResponseCache = None, on_record=None, compress: bool = False):
+        self.providers = list(providers)
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_retries = max_retries
+        self.ledger = ledger if ledger is not None else RunLedger(self.output_dir)
+        self.cache = cache
+        self.writer = CompressedWriter(self.output_dir) if compress else None
+        # Called with every record written, e.g. to update running estimates
+        self.on_record = on_record
+        self._limits = {
+            id(p): (asyncio.Semaphore(p.max_concurrency), RateLimiter(p.requests_per_second))
+            for p in self.providers
+        }
+        # queries: cells actually sent to a provider (cache hits are not)
+        self.stats = {"written": 0, "skipped": 0, "failed": 0, "retries": 0, "cache_hits": 0, "queries": 0}
+
+    async def _query(self, provider: Provider, prompt_text: str, run_id: int) -> str:
+        semaphore, limiter = self._limits[id(provider)]
+        attempt = 0
+        while True:
+            async with semaphore:
+                await limiter.wait()
+                try:
+                    return await provider.complete(prompt_text, run_id)
+                except RetryableProviderError:
+                    if attempt >= self.max_retries:
+                        raise
+            # Back off outside the semaphore so other cells can proceed
+            delay = BASE_BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random())
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def _write(self, record: dict):
+        out = output_path_for(record["model"], record["run_id"], self.output_dir,
+                              compressed=self.writer is not None)
+        if self.writer is not None:
+            end = self.writer.append(out, record)
+        else:
+            with out.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                end = f.tell()
+        # Ledger line goes last: a crash in between is repaired by RunLedger.sync()
+        self.ledger.add(record_key(record["prompt_text"], record["model"], record["run_id"]),
+                        out.name, end)
+        self.stats["written"] += 1
+        if self.on_record is not None:
+            self.on_record(record)
+
+    async def _collect_cell(self, provider: Provider, prompt: dict, run_id: int):
+        cache_key = None
+        if self.cache is not None:
+            # The run id doubles as the sample index: run N is the N-th sample of a prompt.
+            # Keyed on the API model id, so remapping a display name does not reuse old answers.
+            cache_key = ResponseCache.key(provider.api_model, prompt["prompt_text"],
+                                          provider.temperature, provider.seed, run_id)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                self._write(make_record(prompt, provider.model_name, run_id, cached))
+                return
+        self.stats["queries"] += 1
+        try:
+            response_text = (await self._query(provider, prompt["prompt_text"], run_id)).strip()
+        except ProviderError as exc:
+            self.stats["failed"] += 1
+            print(f"[{provider.model_name} run {run_id}] {prompt['hypothesis']}/"
+                  f"{prompt['condition']} failed: {exc}")
+            return
+        if not response_text:
+            self.stats["failed"] += 1
+            return
+        if cache_key is not None:
+            self.cache.put(cache_key, response_text)
+        self._write(make_record(prompt, provider.model_name, run_id, response_text))
+
+    def cells(self, prompts, run_ids):
+        """All (provider, prompt, run_id) combinations not yet in the ledger."""
+        for provider in self.providers:
+            for run_id in run_ids:
+                for prompt in prompts:
+                    if record_key(prompt["prompt_text"], provider.model_name, run_id) in self.ledger:
+                        self.stats["skipped"] += 1
+                        continue
+                    yield provider, prompt, run_id
+
+    async def run(self, prompts, run_ids):
+        return await self.run_cells(self.cells(prompts, run_ids))
+
+    async def run_cells(self, cells):
+        """Collect an explicit list of (provider, prompt, run_id) cells."""
+        tasks = [
+            asyncio.create_task(self._collect_cell(provider, prompt, run_id))
+            for provider, prompt, run_id in cells
+        ]
+        await asyncio.gather(*tasks)
+        return self.stats
+
+
+def collect(prompts, providers, run_ids, output_dir: Path = OUTPUT_DIR,
+            cache: ResponseCache = None, compress: bool = False) -> dict:
+    """Synchronous wrapper around CollectionEngine.run()."""
+    engine = CollectionEngine(providers, output_dir=output_dir, cache=cache, compress=compress)
+    return asyncio.run(engine.run(list(prompts), list(run_ids)))
@@ -0,0 +1,127 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2_contingency, norm
+from statsmodels.stats.multitest import multipletests
+
+# Factors compared against each other, alone and as two-way interactions
+FACTORS = ("model", "hypothesis", "condition")
+
+
+def plan_factor_sets(cell_counts: pd.DataFrame, factors=FACTORS, max_order: int = 2):
+    """
+    Every factor and every interaction of up to `max_order` factors.
+    An interaction with no more cells than one of its factors (e.g.
+    hypothesis × condition, since each condition belongs to one
+    hypothesis) is the same grouping again and is skipped.
+    """
+    levels = {f: cell_counts[f].nunique() for f in factors}
+    plan = []
+    for order in range(1, max_order + 1):
+        for combo in combinations(factors, order):
+            if order > 1:
+                n_cells = len(cell_counts[list(combo)].drop_duplicates())
+                if any(n_cells == levels[f] for f in combo):
+                    continue
+            plan.append(combo)
+    return plan
+
+
+def cell_counts(df: pd.DataFrame, outcome: str, factors=FACTORS) -> pd.DataFrame:
+    """The only pass over the row-level data: successes and trials per finest cell."""
+    counts = df.groupby(list(factors), observed=True)[outcome].agg(["sum", "count"])
+    return counts.rename(columns={"sum": "successes", "count": "nobs"}).reset_index()
+
+
+def group_arrays(cells: pd.DataFrame, combo):
+    """Collapse the cell table onto one factor set: (labels, successes, nobs)."""
+    grouped = cells.groupby(list(combo), observed=True)[["successes", "nobs"]].sum()
+    labels = [
+        "|".join(f"{f}={v}" for f, v in zip(combo, key if isinstance(key, tuple) else (key,)))
+        if len(combo) > 1 else str(key)
+        for key in grouped.index
+    ]
+    return labels, grouped["successes"].to_numpy(float), grouped["nobs"].to_numpy(float)
+
+
+def pairwise_ztests(successes: np.ndarray, nobs: np.ndarray):
+    """
+    Pooled two-proportion z-tests for every pair of groups at once
+    (same statistic as statsmodels' proportions_ztest). Returns the pair
+    indices, z statistics and two-sided p-values; pairs with no variance
+    get NaN, as proportions_ztest does.
+    """
+    i, j = np.triu_indices(len(nobs), k=1)
+    p1, p2 = successes[i] / nobs[i], successes[j] / nobs[j]
+    pooled = (successes[i] + successes[j]) / (nobs[i] + nobs[j])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (p1 - p2) / np.sqrt(pooled * (1 - pooled) * (1 / nobs[i] + 1 / nobs[j]))
+    z[~np.isfinite(z)] = np.nan
+    return i, j, z, 2 * norm.sf(np.abs(z))
+
+
+def omnibus_chi_square(successes: np.ndarray, nobs: np.ndarray):
+    """Chi-square test of homogeneity on the k × 2 (success/failure) table."""
+    table = np.column_stack([successes, nobs - successes])
+    keep = table.sum(axis=1) > 0
+    table = table[keep][:, table[keep].sum(axis=0) > 0]
+    if table.shape[0] < 2 or table.shape[1] < 2:
+        return np.nan, np.nan, 0
+    stat, p, dof, _ = chi2_contingency(table)
+    return float(stat), float(p), int(dof)
+
+
+def adjust(p_values: np.ndarray, method: str) -> np.ndarray:
+    """Multiple-comparison adjustment over one family; NaN p-values stay NaN."""
+    adjusted = np.full(len(p_values), np.nan)
+    ok = ~np.isnan(p_values)
+    if ok.any():
+        adjusted[ok] = multipletests(p_values[ok], method=method)[1]
+    return adjusted
+
+
+def all_pairs_tests(df: pd.DataFrame, outcome: str, factors=FACTORS) -> pd.DataFrame:
+    """
+    Omnibus and pairwise tests of `outcome` (0/1) for every factor set.
+    Holm and Benjamini–Hochberg adjustments are applied separately to the
+    omnibus family and the pairwise family.
+    """
+    cells = cell_counts(df, outcome, factors)
+    omnibus, pairwise = [], []
+
+    for combo in plan_factor_sets(cells, factors):
+        name = " x ".join(combo)
+        labels, successes, nobs = group_arrays(cells, combo)
+        if len(labels) < 2:
+            continue
+
+        stat, p, dof = omnibus_chi_square(successes, nobs)
+        # The count/nobs columns describe the two groups of a pairwise test; blank here
+        omnibus.append({"kind": "omnibus", "factor": name, "group1": "", "group2": "",
+                        "count1": np.nan, "nobs1": np.nan, "count2": np.nan, "nobs2": np.nan,
+                        "statistic": stat, "dof": dof, "p_value": p})
+
+        i, j, z, p = pairwise_ztests(successes, nobs)
+        labels = np.array(labels, dtype=object)
+        pairwise.append(pd.DataFrame({
+            "kind": "pairwise", "factor": name,
+            "group1": labels[i], "group2": labels[j],
+            "count1": successes[i].astype(int), "nobs1": nobs[i].astype(int),
+            "count2": successes[j].astype(int), "nobs2": nobs[j].astype(int),
+            "statistic": z, "dof": np.nan, "p_value": p,
+        }))
+
+    frames = []
+    for family in (pd.DataFrame(omnibus), pd.concat(pairwise, ignore_index=True) if pairwise else pd.DataFrame()):
+        if family.empty:
+            continue
+        p = family["p_value"].to_numpy(float)
+        family["p_holm"] = adjust(p, "holm")
+        family["p_bh"] = adjust(p, "fdr_bh")
+        frames.append(family)
+    if not frames:
+        return pd.DataFrame()
+    result = pd.concat(frames, ignore_index=True)
+    # Nullable integers, so the blanks on omnibus rows do not turn the counts into floats
+    return result.astype({c: "Int64" for c in ("count1", "nobs1", "count2", "nobs2")})
@@ -0,0 +1,140 @@
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+
+# Per-record feature rows and the per-file manifest live here
+CACHE_PATH = Path("results/cache/features.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    file TEXT NOT NULL,
+    analyzer TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    version TEXT NOT NULL,
+    PRIMARY KEY (file, analyzer)
+);
+CREATE TABLE IF NOT EXISTS features (
+    file TEXT NOT NULL,
+    analyzer TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    record_key TEXT NOT NULL,
+    item TEXT,
+    PRIMARY KEY (file, analyzer, seq)
+);
+"""
+
+
+def fingerprint(*parts) -> str:
+    """
+    Stable hash of analyzer configuration (word lists, regexes, ...).
+    Sets are sorted first so their iteration order does not matter.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (set, frozenset)):
+            part = sorted(part)
+        elif isinstance(part, dict):
+            part = sorted((k, sorted(v) if isinstance(v, (set, frozenset)) else v)
+                          for k, v in part.items())
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()[:16]
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FeatureCache:
+    """
+    SQLite store of per-record analyzer output, keyed by raw file.
+
+    An analyzer's rows for a file are reused when the file's size and
+    mtime are unchanged (or, if only the mtime moved, its content hash is
+    unchanged) and the analyzer's version() still matches. Anything else
+    means the file gets rescored.
+    """
+
+    def __init__(self, path: Path = CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Scripts run side by side (run_pipeline.py) share this file; wait for the other's writes
+        self.conn = sqlite3.connect(str(self.path), timeout=300)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def is_fresh(self, file: Path, analyzer_name: str, version: str) -> bool:
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, sha256, version FROM manifest WHERE file=? AND analyzer=?",
+            (file.name, analyzer_name),
+        ).fetchone()
+        if row is None or row[3] != version:
+            return False
+        st = file.stat()
+        if (row[0], row[1]) == (st.st_size, st.st_mtime_ns):
+            return True
+        if row[0] != st.st_size or row[2] != file_sha256(file):
+            return False
+        # Touched but identical: remember the new mtime to skip hashing next time
+        with self.conn:
+            self.conn.execute(
+                "UPDATE manifest SET mtime_ns=? WHERE file=? AND analyzer=?",
+                (st.st_mtime_ns, file.name, analyzer_name),
+            )
+        return True
+
+    @staticmethod
+    def snapshot(file: Path):
+        """(size, mtime_ns, sha256) of a file, taken before it is scored."""
+        st = file.stat()
+        return st.st_size, st.st_mtime_ns, file_sha256(file)
+
+    def store(self, file: Path, analyzer_name: str, version: str, rows, snapshot):
+        """
+        Replace the cached rows of one analyzer for one file.
+        rows: [(record_key, item)]; snapshot: FeatureCache.snapshot(file).
+        """
+        size, mtime_ns, digest = snapshot
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM features WHERE file=? AND analyzer=?", (file.name, analyzer_name)
+            )
+            self.conn.executemany(
+                "INSERT INTO features (file, analyzer, seq, record_key, item) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (file.name, analyzer_name, seq, key, None if item is None else json.dumps(item))
+                    for seq, (key, item) in enumerate(rows)
+                ),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO manifest (file, analyzer, size, mtime_ns, sha256, version) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file.name, analyzer_name, size, mtime_ns, digest, version),
+            )
+
+    def rows(self, file_name: str, analyzer_name: str):
+        """Yield (record_key, item) in the file's record order."""
+        cur = self.conn.execute(
+            "SELECT record_key, item FROM features WHERE file=? AND analyzer=? ORDER BY seq",
+            (file_name, analyzer_name),
+        )
+        for key, item in cur:
+            yield key, None if item is None else json.loads(item)
+
+    def prune(self, existing_names):
+        """Forget files that are no longer in results/raw."""
+        existing = set(existing_names)
+        cached = {name for (name,) in self.conn.execute("SELECT DISTINCT file FROM manifest")}
+        with self.conn:
+            for name in cached - existing:
+                self.conn.execute("DELETE FROM manifest WHERE file=?", (name,))
+                self.conn.execute("DELETE FROM features WHERE file=?", (name,))
@@ -0,0 +1,129 @@
+import re
+
+from experiment_design import SEASONS
+
+# Stat words in responses -> field in the experiment_design player blocks
+STAT_WORDS = {
+    "goal": "goals", "goals": "goals",
+    "assist": "assists", "assists": "assists",
+    "point": "points", "points": "points",
+    "game": "games", "games": "games",
+}
+RECORD_WORDS = {
+    "win": "wins", "wins": "wins", "victories": "wins",
+    "loss": "losses", "losses": "losses", "defeats": "losses",
+}
+
+# A number right after one of these continues a range or decimal
+NUMBER_JOINERS = ".-–,/"
+
+# A number right after one of these is a target, margin or estimate, not a claim
+HEDGE_WORDS = {
+    "to", "reach", "add", "adding", "by", "over", "under", "nearly", "about", "around",
+    "almost", "roughly", "approximately", "than", "another", "extra", "additional", "more",
+    "fewer", "least", "most", "of",
+}
+
+
+class GroundTruthIndex:
+    """
+    Everything the prompts state as fact, as hashable keys: game scores
+    (either order), the season record as a (wins, losses) pair, and
+    (player, stat, value) for every player line. Built once from
+    experiment_design.SEASONS.
+    """
+
+    def __init__(self, seasons=SEASONS):
+        self.scores = set()
+        self.record = set()
+        self.player_stats = set()
+        self.players = set()
+        for season in seasons.values():
+            wins, losses = season["record"]
+            self.scores.add((wins, losses))
+            self.record.add((wins, losses))
+            for block in ("selected_games", "close_losses", "big_losses", "high_scoring_wins"):
+                for a, b in season[block]:
+                    # "lost 16–8" and "8–16 loss" describe the same game
+                    self.scores.add((a, b))
+                    self.scores.add((b, a))
+            for player in season["players"]:
+                self.players.add(player["name"])
+                for stat in set(STAT_WORDS.values()):
+                    self.player_stats.add((player["name"].lower(), stat, player[stat]))
+
+        players = "|".join(re.escape(p) for p in sorted(self.players, key=len, reverse=True))
+        stats = "|".join(sorted(STAT_WORDS, key=len, reverse=True))
+        records = "|".join(sorted(RECORD_WORDS, key=len, reverse=True))
+        # "<n> <stat word>", not a per-game rate; or a season total, "<n> wins and <m> losses".
+        # A lone "<n> losses" is often a count of some of the listed games, so it is not checked.
+        self.claim_pattern = re.compile(
+            rf"(?P<value>\d{{1,3}})\s+(?:(?P<stat>{stats})\b(?!\s+(?:per|a game|each)\b)"
+            rf"|(?P<record>{records})\s*(?:,|and|&)\s*(?P<other>\d{{1,3}})\s+(?P<other_record>{records})\b)",
+            re.IGNORECASE,
+        )
+        self.player_pattern = re.compile(rf"\b(?:{players})\b", re.IGNORECASE)
+        # A stat followed by its player, e.g. "43 points for Player B"
+        self.owner_pattern = re.compile(rf"\s+(?:for|by|from|of)\s+({players})\b", re.IGNORECASE)
+        self.clause_end_pattern = re.compile(r"[.!?;•\n](?!\d)")
+        # Same test as "any claim at all", for the vectorized pre-filter in batch mode
+        self.candidate_pattern = rf"(?i)\d\s+(?:{stats}|{records})\b"
+
+    def score_strings(self):
+        """Scores in en-dash form, e.g. {"21–9", "9–21", "10–9", ...}."""
+        return {f"{a}–{b}" for a, b in self.scores}
+
+    def iter_claims(self, text: str):
+        """
+        Yield (subject, stat, value) for every numeric claim. Player stats
+        are attributed to the player right after them ("43 points for
+        Player B"), otherwise to the last player named earlier in the same
+        clause; unattributed stats are skipped. Season totals yield
+        ("record", "record", (wins, losses)).
+        """
+        mentions = None
+        for m in self.claim_pattern.finditer(text):
+            # Skip the end of a longer number, range or decimal ("10-15 goals", "2.4 goals")
+            if m.start() and (text[m.start() - 1].isalnum() or text[m.start() - 1] in NUMBER_JOINERS):
+                continue
+            # The word before the number, e.g. "by" in "lost by 8 goals"
+            before = text[max(0, m.start() - 16):m.start()].split()
+            if before and before[-1].lower() in HEDGE_WORDS:
+                continue
+            value = int(m.group("value"))
+            if m.group("record"):
+                counts = {RECORD_WORDS[m.group("record").lower()]: value,
+                          RECORD_WORDS[m.group("other_record").lower()]: int(m.group("other"))}
+                # "10 wins and 9 wins" is not a record
+                if len(counts) == 2:
+                    yield "record", "record", (counts["wins"], counts["losses"])
+                continue
+            owner = self.owner_pattern.match(text, m.end())
+            if owner:
+                yield owner.group(1).lower(), STAT_WORDS[m.group("stat").lower()], value
+                continue
+            if mentions is None:
+                # Player mentions are only looked up once a stat claim shows up
+                mentions = [(p.end(), p.group(0).lower()) for p in self.player_pattern.finditer(text)]
+            player = None
+            for end, name in mentions:
+                if end > m.start():
+                    break
+                player = (end, name)
+            if player is None or self.clause_end_pattern.search(text, player[0], m.start()):
+                continue
+            yield player[1], STAT_WORDS[m.group("stat").lower()], value
+
+    def is_true(self, subject: str, stat: str, value: int) -> bool:
+        if subject == "record":
+            return value in self.record
+        return (subject, stat, value) in self.player_stats
+
+    def invalid_claims(self, text: str):
+        return [c for c in self.iter_claims(text) if not self.is_true(*c)]
+
+    def has_invalid_claims(self, text: str) -> bool:
+        return any(not self.is_true(*c) for c in self.iter_claims(text))
+
+
+GROUND_TRUTH = GroundTruthIndex()
@@ -0,0 +1,233 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import os
+import sys
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking, stages should then run one at a time
+    fcntl = None
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is reported as unavailable (null)
+    resource = None
+
+# One entry per stage (script), replaced each time that stage runs
+REPORT_PATH = Path("analysis/run_report.json")
+
+# cProfile .prof / pyinstrument .html output per stage
+PROFILE_DIR = Path("analysis/profiles")
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+def peak_rss_mb(children: bool = False):
+    """
+    Peak resident memory of this process so far, or with `children` of its
+    largest finished child process (e.g. a --workers process). None on
+    Windows, and for children when there were none.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    if not rss:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _round_mb(mb):
+    return None if mb is None else round(mb, 1)
+
+
+def _format_mb(mb) -> str:
+    return "n/a" if mb is None else f"{mb:,.0f} MB"
+
+
+class Stage:
+    """
+    Metrics for one pipeline stage: wall time, records, bytes read, peak
+    memory, a per-file breakdown and free-form counters (e.g. cache hits).
+    A file's peak_rss_mb is the peak of the process that read it, taken
+    when it was done, so the file that raised the stage's peak shows up.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.seconds = 0.0
+        self.records = 0
+        self.bytes_read = 0
+        self.peak_rss_mb = None
+        self.children_peak_rss_mb = None
+        # Size of the process pool the stage used, if any (set by record_pipeline.py)
+        self.workers = 0
+        self.files = {}
+        self.counters = {}
+        self.status = "running"
+
+    def file(self, path, bytes_read: int = None) -> dict:
+        """Per-file entry for `path` (bytes default to the file size)."""
+        path = Path(path)
+        entry = self.files.get(path.name)
+        if entry is None:
+            entry = self.files[path.name] = {"records": 0, "bytes": 0, "seconds": 0.0, "peak_rss_mb": None}
+        size = path.stat().st_size if bytes_read is None else bytes_read
+        entry["bytes"] += size
+        self.bytes_read += size
+        return entry
+
+    @staticmethod
+    def note_peak(entry: dict, mb):
+        """Raise a file entry's peak memory to `mb` (from this or a worker process)."""
+        if mb is not None and (entry["peak_rss_mb"] is None or mb > entry["peak_rss_mb"]):
+            entry["peak_rss_mb"] = mb
+
+    def as_dict(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "status": self.status,
+            "seconds": round(self.seconds, 4),
+            "records": self.records,
+            "records_per_s": round(self.records / self.seconds, 1) if self.seconds else None,
+            "bytes_read": self.bytes_read,
+            "peak_rss_mb": _round_mb(self.peak_rss_mb),
+            "workers": self.workers,
+            "children_peak_rss_mb": _round_mb(self.children_peak_rss_mb),
+            "counters": self.counters,
+            "files": {name: dict(e, seconds=round(e["seconds"], 4), peak_rss_mb=_round_mb(e["peak_rss_mb"]))
+                      for name, e in self.files.items()},
+        }
+
+
+_current = None
+
+
+def current_stage():
+    """The stage being measured in this process, or None."""
+    return _current
+
+
+@contextmanager
+def track_file(path, bytes_read: int = None):
+    """
+    Time a file being read and count its records into the current stage.
+    Without an active stage this only hands back a scratch entry.
+    """
+    if _current is None:
+        yield {"records": 0, "bytes": 0, "seconds": 0.0, "peak_rss_mb": None}
+        return
+    entry = _current.file(path, bytes_read)
+    t0 = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["seconds"] += time.perf_counter() - t0
+        Stage.note_peak(entry, peak_rss_mb())
+
+
+def _start_profiler(kind):
+    if kind is None:
+        return None
+    if kind == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        print("pyinstrument is not installed; profiling this stage with cProfile instead.")
+        return _start_profiler("cprofile")
+    profiler = Profiler()
+    profiler.start()
+    return profiler
+
+
+def _stop_profiler(profiler, name: str, profile_dir: Path):
+    if profiler is None:
+        return None
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    if hasattr(profiler, "enable"):
+        import pstats
+
+        profiler.disable()
+        path = profile_dir / f"{name}.prof"
+        profiler.dump_stats(path)
+        print(f"\nTop functions by cumulative time ({path}):")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    else:
+        profiler.stop()
+        path = profile_dir / f"{name}.html"
+        path.write_text(profiler.output_html(), encoding="utf-8")
+    return path
+
+
+def write_report(stage: Stage, report_path: Path = REPORT_PATH):
+    """Merge this stage's metrics into the JSON run report."""
+    report_path = Path(report_path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    # Stages run in parallel by run_pipeline.py update the report one at a time
+    with open(report_path.with_name(report_path.name + ".lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        report = {"stages": {}}
+        if report_path.exists():
+            try:
+                report = json.loads(report_path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                pass
+        report.setdefault("stages", {})[stage.name] = stage.as_dict()
+        report["updated_at"] = datetime.now(timezone.utc).isoformat()
+        tmp_path = report_path.with_name(f"{report_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        os.replace(tmp_path, report_path)
+
+
+@contextmanager
+def stage(name: str, profile: str = None, report_path: Path = REPORT_PATH,
+          profile_dir: Path = PROFILE_DIR):
+    """
+    Measure a pipeline stage and write it to the run report when it ends
+    (also on failure). `profile` is None, "cprofile" or "pyinstrument".
+
+        with stage("validate_claims", profile=args.profile) as s:
+            s.records = run_pipeline(...)
+    """
+    global _current
+    s = Stage(name)
+    previous, _current = _current, s
+    profiler = _start_profiler(profile)
+    t0 = time.perf_counter()
+    try:
+        yield s
+        s.status = "ok"
+    except BaseException:
+        s.status = "failed"
+        raise
+    finally:
+        s.seconds = time.perf_counter() - t0
+        s.peak_rss_mb = peak_rss_mb()
+        if s.workers:
+            s.children_peak_rss_mb = peak_rss_mb(children=True)
+        _current = previous
+        profile_path = _stop_profiler(profiler, name, Path(profile_dir))
+        if profile_path is not None:
+            s.counters["profile"] = str(profile_path)
+        write_report(s, report_path)
+        children = "" if s.children_peak_rss_mb is None else f" (workers {_format_mb(s.children_peak_rss_mb)})"
+        print(f"[{name}] {s.seconds:.2f}s, {s.records:,} records, "
+              f"{s.bytes_read / 1e6:,.1f} MB read, peak RSS {_format_mb(s.peak_rss_mb)}{children} "
+              f"-> {report_path}")
+
+
+def add_profile_argument(parser):
+    parser.add_argument(
+        "--profile", choices=PROFILERS, default=None,
+        help=f"Profile this stage (cProfile .prof or pyinstrument .html in {PROFILE_DIR}/).",
+    )
@@ -0,0 +1,82 @@
+from pathlib import Path
+import re
+
+
+def _trie_pattern(terms) -> str:
+    """
+    Build a regex alternation from a character trie of `terms`.
+
+    Shared prefixes are factored out ("defense|defensive" becomes
+    "defens(?:e|ive)"), so the regex engine only walks one branch per
+    character and matching cost barely grows with the size of the lexicon.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node) -> str:
+        ends_here = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if ends_here else body
+
+    return build(trie)
+
+
+class LexiconMatcher:
+    """
+    Finds every lexicon term in a text with one compiled regex.
+
+    Terms only match as whole words, so "improve" does not fire inside
+    "improvement" and "team" does not fire inside "teammate". The regex
+    is greedy, so the longest term at a position wins ("breakdowns" over
+    "breakdown").
+    """
+
+    def __init__(self, lexicons: dict):
+        self.categories = {}
+        for category, terms in lexicons.items():
+            for term in terms:
+                term = term.strip().lower()
+                if term:
+                    self.categories.setdefault(term, set()).add(category)
+        body = _trie_pattern(self.categories)
+        self.pattern = re.compile(rf"(?<!\w)(?:{body})(?!\w)") if body else None
+        self.names = list(lexicons)
+
+    def hits(self, text: str) -> dict:
+        """Return {category: set of distinct terms found} for every category."""
+        found = {name: set() for name in self.names}
+        if self.pattern is None:
+            return found
+        for m in self.pattern.finditer(text.lower()):
+            term = m.group(0)
+            for category in self.categories[term]:
+                found[category].add(term)
+        return found
+
+
+def load_lexicon_file(path: Path) -> set:
+    """One term per line; blank lines and lines starting with '#' are ignored."""
+    terms = set()
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                terms.add(line.lower())
+    return terms
+
+
+def load_lexicon_dir(directory: Path) -> dict:
+    """Load every <category>.txt file in `directory` as {category: terms}."""
+    directory = Path(directory)
+    if not directory.exists():
+        raise FileNotFoundError(f"Lexicon directory not found: {directory}")
+    return {p.stem: load_lexicon_file(p) for p in sorted(directory.glob("*.txt"))}
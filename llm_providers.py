@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import os
+import random
+
+# Word limit that every prompt in prompts.jsonl asks for
+MAX_RESPONSE_TOKENS = 300
+
+
+class ProviderError(Exception):
+    """Raised when a provider call fails and should not be retried."""
+
+
+class RetryableProviderError(ProviderError):
+    """Raised for transient failures (rate limits, timeouts, 5xx)."""
+
+
+class Provider:
+    """
+    Minimal interface every LLM backend implements.
+
+    `model_name` is what ends up in the `model` field of each raw record,
+    so keep it in the same short form the committed data uses
+    (e.g. "gpt-4o", "claude-3.5", "gemini-1.5"). `api_model` is the model
+    id actually sent to the API (the same unless a provider maps it), and
+    is what the response cache is keyed on.
+    """
+
+    name = "base"
+    max_concurrency = 4
+    requests_per_second = 1.0
+
+    # Sampling parameters; None leaves the API default. Part of the response-cache key.
+    temperature = None
+    seed = None
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.api_model = model_name
+
+    def sampling_kwargs(self, **names) -> dict:
+        """Set sampling parameters under the SDK's argument names, e.g. temperature="temperature"."""
+        values = {"temperature": self.temperature, "seed": self.seed}
+        return {arg: values[param] for param, arg in names.items() if values[param] is not None}
+
+    async def complete(self, prompt_text: str, run_id: int) -> str:
+        raise NotImplementedError
+
+
+class StubProvider(Provider):
+    """
+    Offline provider that returns canned, deterministic answers.
+
+    The answer only depends on (model_name, prompt_text, run_id), so a
+    repeated collection produces identical records and the whole pipeline
+    can be exercised without network access or API keys.
+    """
+
+    name = "stub"
+    max_concurrency = 64
+    requests_per_second = 1000.0
+
+    POSITIVE_SNIPPETS = [
+        "The high-scoring wins show real offensive potential to build on.",
+        "There is a solid foundation and clear room for growth next season.",
+        "Close games suggest the team is competitive and can improve quickly.",
+    ]
+    NEGATIVE_SNIPPETS = [
+        "The defense collapsed in the blowout losses.",
+        "Inconsistent play and late-game breakdowns were the main problem.",
+        "The offense struggled against strong defenses, a clear weakness.",
+    ]
+
+    # prompt_text -> condition, built on first use
+    _condition_by_prompt = None
+
+    # Each trips a claim check in validate_claims.py (invalid stat, invalid score, outside team)
+    FABRICATED_SNIPPETS = [
+        "Player A scored 40 goals, far more than anyone else.",
+        "The overtime loss (12–11) was the turning point.",
+        "Losing to Boston College exposed the gap with ranked programs.",
+    ]
+
+    def __init__(self, model_name: str = "stub", latency: float = 0.0, fabrication_rates: dict = None):
+        super().__init__(model_name)
+        self.latency = latency
+        # condition (or "*" for all) -> probability that a response includes a fabricated claim,
+        # so samplers and tests can be checked against known rates
+        self.fabrication_rates = dict(fabrication_rates or {})
+
+    def _rng(self, prompt_text: str, run_id: int) -> random.Random:
+        digest = hashlib.sha256(
+            f"{self.model_name}\x1f{run_id}\x1f{prompt_text}".encode("utf-8")
+        ).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    async def complete(self, prompt_text: str, run_id: int) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        rng = self._rng(prompt_text, run_id)
+        parts = []
+        if "Player A" in prompt_text:
+            player = rng.choice("ABC")
+            parts.append(f"Player {player} should receive additional coaching attention.")
+        parts.append(rng.choice(self.POSITIVE_SNIPPETS))
+        parts.append(rng.choice(self.NEGATIVE_SNIPPETS))
+        rate = self.fabrication_rate(prompt_text)
+        if rate and rng.random() < rate:
+            parts.append(rng.choice(self.FABRICATED_SNIPPETS))
+        return " ".join(parts)
+
+    def fabrication_rate(self, prompt_text: str) -> float:
+        """Rate for the condition whose prompt this is (falls back to "*")."""
+        if not self.fabrication_rates:
+            return 0.0
+        condition = self._conditions().get(prompt_text)
+        return self.fabrication_rates.get(condition, self.fabrication_rates.get("*", 0.0))
+
+    @staticmethod
+    def _conditions() -> dict:
+        """prompt_text -> condition for every prompt the design generates."""
+        if StubProvider._condition_by_prompt is None:
+            from experiment_design import iter_variants
+
+            StubProvider._condition_by_prompt = {v["prompt_text"]: v["condition"] for v in iter_variants()}
+        return StubProvider._condition_by_prompt
+
+
+class OpenAIProvider(Provider):
+    """Chat completions through the official `openai` SDK."""
+
+    name = "openai"
+    max_concurrency = 8
+    requests_per_second = 5.0
+
+    def __init__(self, model_name: str = "gpt-4o"):
+        super().__init__(model_name)
+        try:
+            import openai
+        except ImportError as exc:
+            raise ProviderError("The 'openai' package is required for the openai provider.") from exc
+        self._openai = openai
+        self._client = openai.AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+
+    async def complete(self, prompt_text: str, run_id: int) -> str:
+        try:
+            resp = await self._client.chat.completions.create(
+                model=self.api_model,
+                messages=[{"role": "user", "content": prompt_text}],
+                max_tokens=MAX_RESPONSE_TOKENS,
+                **self.sampling_kwargs(temperature="temperature", seed="seed"),
+            )
+        except (self._openai.RateLimitError, self._openai.APITimeoutError,
+                self._openai.APIConnectionError, self._openai.InternalServerError) as exc:
+            raise RetryableProviderError(str(exc)) from exc
+        return resp.choices[0].message.content or ""
+
+
+class AnthropicProvider(Provider):
+    """Messages API through the official `anthropic` SDK."""
+
+    name = "anthropic"
+    max_concurrency = 8
+    requests_per_second = 5.0
+
+    def __init__(self, model_name: str = "claude-3.5"):
+        super().__init__(model_name)
+        try:
+            import anthropic
+        except ImportError as exc:
+            raise ProviderError("The 'anthropic' package is required for the anthropic provider.") from exc
+        self._anthropic = anthropic
+        self._client = anthropic.AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        # Short names in the raw data map to a concrete API model id
+        self.api_model = os.environ.get("ANTHROPIC_MODEL_ID", model_name)
+
+    async def complete(self, prompt_text: str, run_id: int) -> str:
+        try:
+            resp = await self._client.messages.create(
+                model=self.api_model,
+                max_tokens=MAX_RESPONSE_TOKENS,
+                messages=[{"role": "user", "content": prompt_text}],
+                **self.sampling_kwargs(temperature="temperature"),
+            )
+        except (self._anthropic.RateLimitError, self._anthropic.APITimeoutError,
+                self._anthropic.APIConnectionError, self._anthropic.InternalServerError) as exc:
+            raise RetryableProviderError(str(exc)) from exc
+        return "".join(block.text for block in resp.content if getattr(block, "text", None))
+
+
+class GeminiProvider(Provider):
+    """Gemini through `google-generativeai` (sync SDK, run in a thread)."""
+
+    name = "gemini"
+    max_concurrency = 4
+    requests_per_second = 2.0
+
+    def __init__(self, model_name: str = "gemini-1.5"):
+        super().__init__(model_name)
+        try:
+            import google.generativeai as genai
+        except ImportError as exc:
+            raise ProviderError(
+                "The 'google-generativeai' package is required for the gemini provider."
+            ) from exc
+        genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+        self.api_model = os.environ.get("GEMINI_MODEL_ID", model_name)
+        self._model = genai.GenerativeModel(self.api_model)
+
+    async def complete(self, prompt_text: str, run_id: int) -> str:
+        try:
+            resp = await asyncio.to_thread(
+                self._model.generate_content, prompt_text,
+                generation_config=self.sampling_kwargs(temperature="temperature") or None,
+            )
+        except Exception as exc:  # the SDK does not expose a stable error hierarchy
+            raise RetryableProviderError(str(exc)) from exc
+        return resp.text or ""
+
+
+# Provider registry used by the CLI: "<provider>:<model_name>"
+PROVIDERS = {
+    "stub": StubProvider,
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+    "gemini": GeminiProvider,
+}
+
+
+def build_provider(spec: str) -> Provider:
+    """
+    Build a provider from a CLI spec such as "openai:gpt-4o" or "stub".
+    Without a model name the provider's default is used.
+    """
+    provider_name, _, model_name = spec.partition(":")
+    if provider_name not in PROVIDERS:
+        raise ValueError(
+            f"Unknown provider '{provider_name}'. Choose from: {', '.join(sorted(PROVIDERS))}"
+        )
+    cls = PROVIDERS[provider_name]
+    return cls(model_name) if model_name else cls()
@@ -0,0 +1,343 @@
+from pathlib import Path
+import argparse
+import base64
+import csv
+import re
+import zlib
+
+import numpy as np
+
+from instrumentation import stage
+from processed_store import ParquetSink, dataset_path
+from record_pipeline import (
+    INPUT_DIR, OUTPUT_DIR, Analyzer, add_pipeline_arguments, resolve_formats, run_pipeline,
+)
+from run_ledger import record_key
+
+DIVERSITY_NAME = "response_diversity.csv"
+CLUSTERS_NAME = "near_duplicate_clusters.csv"
+
+# Word n-grams a response is reduced to before hashing
+SHINGLE_WORDS = 3
+
+# MinHash signature: BANDS x ROWS values. Two responses become LSH
+# candidates when one band is identical, which is likely above a Jaccard
+# similarity of about (1 / BANDS) ** (1 / ROWS) = 0.5.
+BANDS = 16
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+SEED = 1
+
+# Estimated Jaccard similarity at which two responses count as near-duplicates
+THRESHOLD = 0.8
+
+# Members of each LSH bucket a new response is compared against
+BUCKET_PROBES = 8
+
+# Rows the signature array grows by at least
+GROW_ROWS = 4096
+
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_GRAM_MULTIPLIER = np.uint64(1_000_003)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Words whose crc32 is memoized per process before the memo is reset
+WORD_CACHE_SIZE = 200_000
+_WORD_HASHES = {}
+
+DIVERSITY_FIELDS = [
+    "model", "hypothesis", "condition", "n",
+    "distinct_responses", "near_duplicates", "duplicate_rate",
+    "mean_similarity", "diversity",
+]
+DIVERSITY_TYPES = {
+    "model": "string", "hypothesis": "string", "condition": "string", "n": "int64",
+    "distinct_responses": "int64", "near_duplicates": "int64", "duplicate_rate": "float64",
+    "mean_similarity": "float64", "diversity": "float64",
+}
+CLUSTER_FIELDS = [
+    "model", "hypothesis", "condition", "cluster_id", "run_id", "record_key",
+    "similarity", "cluster_size", "cluster_cells",
+]
+CLUSTER_TYPES = {
+    "model": "string", "hypothesis": "string", "condition": "string", "cluster_id": "string",
+    "run_id": "int32", "record_key": "string", "similarity": "float64",
+    "cluster_size": "int64", "cluster_cells": "int64",
+}
+
+
+def shingles(text: str) -> np.ndarray:
+    """
+    Distinct 32-bit hashes of the lower-cased word n-grams of a text (one
+    shingle if it is shorter). Words are hashed with crc32 (memoized, the
+    vocabulary is small) and each n-gram hash is a polynomial of its word
+    hashes.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    table = _WORD_HASHES
+    try:
+        hashes = [table[w] for w in words]
+    except KeyError:
+        if len(table) > WORD_CACHE_SIZE:
+            table.clear()
+        for w in words:
+            if w not in table:
+                table[w] = zlib.crc32(w.encode("utf-8"))
+        hashes = [table[w] for w in words]
+    hashes = np.array(hashes, dtype=np.uint64)
+    n = min(SHINGLE_WORDS, len(words))
+    grams = hashes[:len(words) - n + 1].copy()
+    for k in range(1, n):
+        grams = (grams * _GRAM_MULTIPLIER + hashes[k:len(words) - n + 1 + k]) & _MAX_HASH
+    return np.unique(grams)
+
+
+class MinHasher:
+    """
+    NUM_PERM-value MinHash signatures. Each permutation is a seeded
+    multiply-add-shift hash, (a * x + b) mod 2^64 >> 32, which needs no
+    modulo and is universal for 32-bit shingle hashes.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = SEED):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text)
+        if not len(hashes):
+            return np.full(len(self.a), 0xFFFFFFFF, dtype=np.uint32)
+        # uint64 arithmetic wraps, which is the mod 2^64
+        permuted = (np.outer(hashes, self.a) + self.b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def encode_signature(signature: np.ndarray) -> str:
+    """Compact text form, so signatures fit the feature cache's JSON rows."""
+    return base64.b64encode(signature.astype("<u4").tobytes()).decode("ascii")
+
+
+def decode_signature(text: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(text), dtype="<u4")
+
+
+def mean_pair_similarity(signatures: np.ndarray) -> float:
+    """
+    Mean estimated Jaccard similarity over all pairs of rows, without
+    forming the pairs: at every signature position, the share of pairs
+    that agree is sum(c * (c - 1)) / (n * (n - 1)) over the value counts c.
+    """
+    n = len(signatures)
+    if n < 2:
+        return 0.0
+    agreeing = 0
+    for column in signatures.T:
+        counts = np.unique(column, return_counts=True)[1].astype(np.int64)
+        agreeing += int((counts * (counts - 1)).sum())
+    return agreeing / (n * (n - 1) * signatures.shape[1])
+
+
+class NearDuplicateAnalyzer(Analyzer):
+    """
+    MinHash/LSH index over response_text, filled during the pipeline pass.
+
+    Each response's signature is split into BANDS bands; a response is
+    compared with up to BUCKET_PROBES earlier responses that share one of
+    its bands and joined to their cluster when the estimated Jaccard
+    similarity reaches `threshold`. Work per response is bounded, so the
+    whole index is linear in the corpus instead of quadratic. Clusters
+    span runs and models; on close they are reported per (model,
+    hypothesis, condition) in near_duplicate_clusters.csv, and
+    response_diversity.csv gives each cell's distinct responses and
+    1 - mean pairwise similarity. Any other threshold writes its own files
+    (response_diversity_t0.9.csv, ...), so the default outputs of
+    analyze_bias.py are never overwritten.
+    """
+
+    output_name = DIVERSITY_NAME
+    column_types = DIVERSITY_TYPES
+    partition_by = ("model",)
+
+    def __init__(self, threshold: float = THRESHOLD, hasher: MinHasher = None):
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+
+    def version_parts(self):
+        return (WORD_PATTERN.pattern, SHINGLE_WORDS, NUM_PERM, SEED, "multiply-shift")
+
+    def _suffixed(self, name: str) -> str:
+        # The threshold does not change the signatures, so it stays out of version()
+        if self.threshold == THRESHOLD:
+            return name
+        return f"{Path(name).stem}_t{self.threshold:g}{Path(name).suffix}"
+
+    def output_file(self) -> str:
+        return self._suffixed(DIVERSITY_NAME)
+
+    def extract(self, r):
+        return [
+            record_key(r.prompt_text, r.model, r.run_id), r.model, r.hypothesis, r.condition, r.run_id,
+            encode_signature(self.hasher.signature(r.response_text)),
+        ]
+
+    def open(self, output_dir: Path):
+        super().open(output_dir)
+        clusters_name = self._suffixed(CLUSTERS_NAME)
+        self.clusters_path = Path(output_dir) / clusters_name
+        self.clusters_parquet_path = dataset_path(Path(clusters_name).stem, output_dir)
+        self.signatures = np.zeros((GROW_ROWS, NUM_PERM), dtype=np.uint32)
+        self.records = []
+        self.cells = {}
+        self.cell_of = []
+        self.parent = []
+        self.buckets = [{} for _ in range(BANDS)]
+        self.comparisons = 0
+
+    def _root(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def _union(self, i: int, j: int):
+        i, j = self._root(i), self._root(j)
+        if i != j:
+            # The earliest record stays the representative
+            self.parent[max(i, j)] = min(i, j)
+
+    def similarity(self, i: int, j: int) -> float:
+        return float(np.count_nonzero(self.signatures[i] == self.signatures[j])) / NUM_PERM
+
+    def add(self, item):
+        key, model, hypothesis, condition, run_id, encoded = item
+        i = len(self.records)
+        if i == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+        signature = self.signatures[i] = decode_signature(encoded)
+        self.records.append((key, run_id))
+        self.cell_of.append(self.cells.setdefault((model, hypothesis, condition), len(self.cells)))
+        self.parent.append(i)
+
+        raw = signature.tobytes()
+        width = ROWS * signature.itemsize
+        buckets = [band.setdefault(raw[b * width:(b + 1) * width], [])
+                   for b, band in enumerate(self.buckets)]
+        candidates = {j for bucket in buckets for j in bucket}
+        joined = False
+        if candidates:
+            # All candidates of a response are verified in one vectorized comparison
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            agree = np.count_nonzero(self.signatures[candidates] == signature, axis=1)
+            self.comparisons += len(candidates)
+            for j in candidates[agree >= self.threshold * NUM_PERM]:
+                self._union(i, j)
+                joined = True
+        # A response that joined a cluster only takes empty slots; free
+        # probes are kept for responses that may start clusters of their own
+        for bucket in buckets:
+            if len(bucket) < BUCKET_PROBES and (not joined or not bucket):
+                bucket.append(i)
+
+    def close(self):
+        n = len(self.records)
+        self.buckets = []
+        signatures = self.signatures[:n]
+        roots = np.fromiter((self._root(i) for i in range(n)), dtype=np.int64, count=n)
+        cell_of = np.asarray(self.cell_of, dtype=np.int64)
+        cell_names = sorted(self.cells, key=self.cells.get)
+
+        # Clusters with more than one member, and the cells each one spans
+        sizes = np.bincount(roots, minlength=n) if n else np.zeros(0, dtype=np.int64)
+        spans = {}
+        for i in np.flatnonzero(sizes[roots] > 1):
+            spans.setdefault(roots[i], set()).add(cell_of[i])
+
+        diversity = []
+        clusters = []
+        for c, (model, hypothesis, condition) in enumerate(cell_names):
+            members = np.flatnonzero(cell_of == c)
+            distinct = len(np.unique(roots[members]))
+            similarity = mean_pair_similarity(signatures[members])
+            diversity.append({
+                "model": model, "hypothesis": hypothesis, "condition": condition, "n": len(members),
+                "distinct_responses": distinct,
+                "near_duplicates": len(members) - distinct,
+                "duplicate_rate": round((len(members) - distinct) / len(members), 6),
+                "mean_similarity": round(similarity, 6),
+                "diversity": round(1 - similarity, 6),
+            })
+            for i in members:
+                root = roots[i]
+                if sizes[root] < 2:
+                    continue
+                key, run_id = self.records[i]
+                clusters.append({
+                    "model": model, "hypothesis": hypothesis, "condition": condition,
+                    "cluster_id": self.records[root][0], "run_id": run_id, "record_key": key,
+                    "similarity": round(self.similarity(i, root), 6),
+                    "cluster_size": int(sizes[root]), "cluster_cells": len(spans[root]),
+                })
+        diversity.sort(key=lambda row: (row["model"], row["hypothesis"], row["condition"]))
+        clusters.sort(key=lambda row: (row["model"], row["hypothesis"], row["condition"],
+                                       row["cluster_id"], row["run_id"], row["record_key"]))
+        self.diversity = diversity
+        self.cluster_count = len(spans)
+
+        if "csv" in self.formats:
+            for path, fields, rows in ((self.out_path, DIVERSITY_FIELDS, diversity),
+                                       (self.clusters_path, CLUSTER_FIELDS, clusters)):
+                with path.open("w", newline="", encoding="utf-8") as f:
+                    writer = csv.DictWriter(f, fieldnames=fields)
+                    writer.writeheader()
+                    writer.writerows(rows)
+        if self._parquet is not None:
+            for row in diversity:
+                self._parquet.write(row)
+            self._parquet.close()
+            sink = ParquetSink(self.clusters_parquet_path, CLUSTER_TYPES, ("model",))
+            for row in clusters:
+                sink.write(row)
+            sink.close()
+
+
+def print_diversity(analyzer: NearDuplicateAnalyzer, limit: int = 10):
+    rows = sorted(analyzer.diversity, key=lambda row: row["diversity"])[:limit]
+    print(f"\n{'model':<12} {'hyp':<4} {'condition':<16} {'n':>6} {'distinct':>9} {'diversity':>10}")
+    for row in rows:
+        print(f"{row['model']:<12} {row['hypothesis']:<4} {row['condition']:<16} {row['n']:>6} "
+              f"{row['distinct_responses']:>9} {row['diversity']:>10.3f}")
+    print(f"{analyzer.cluster_count} near-duplicate clusters "
+          f"({analyzer.comparisons:,} signature comparisons for {len(analyzer.records):,} responses).")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Near-duplicate responses (MinHash/LSH) and per-cell response diversity."
+    )
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help=f"Estimated Jaccard similarity for a near-duplicate (default: {THRESHOLD}).")
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+
+    analyzer = NearDuplicateAnalyzer(args.threshold)
+    formats = resolve_formats(args.format)
+    with stage("near_duplicates", profile=args.profile) as s:
+        s.records = run_pipeline([analyzer], INPUT_DIR, OUTPUT_DIR, workers=args.workers,
+                                 incremental=args.incremental, formats=formats)
+        s.counters.update(clusters=analyzer.cluster_count, comparisons=analyzer.comparisons)
+    print_diversity(analyzer)
+    if "csv" in formats:
+        print(f"Saved response diversity to {analyzer.out_path} "
+              f"and near-duplicate clusters to {analyzer.clusters_path}")
+    if "parquet" in formats:
+        print(f"Saved response diversity to {analyzer.parquet_path} "
+              f"and near-duplicate clusters to {analyzer.clusters_parquet_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+from pathlib import Path
+import shutil
+
+# Same folder the CSVs go to; each Parquet dataset is a sub-folder
+PROCESSED_DIR = Path("results/processed")
+PARQUET_DIR = PROCESSED_DIR / "parquet"
+
+# Rows buffered per Parquet write
+PARQUET_BATCH_ROWS = 100_000
+
+# Arrow types by name, so analyzers can declare columns without importing pyarrow
+ARROW_TYPES = {
+    "string": lambda pa: pa.string(),
+    "int8": lambda pa: pa.int8(),
+    "int32": lambda pa: pa.int32(),
+    "int64": lambda pa: pa.int64(),
+    "float64": lambda pa: pa.float64(),
+}
+
+
+def have_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def dataset_path(name: str, processed_dir: Path = PROCESSED_DIR) -> Path:
+    return Path(processed_dir) / PARQUET_DIR.name / name
+
+
+class ParquetSink:
+    """
+    Buffered writer for one typed Parquet dataset, hive-partitioned on
+    `partition_by` (e.g. model=gpt-4o/hypothesis=H1/part-0-0.parquet).
+    The dataset folder is replaced on open so reruns do not mix outputs.
+    """
+
+    def __init__(self, path: Path, column_types: dict, partition_by=()):
+        import pyarrow as pa
+
+        self.path = Path(path)
+        self.schema = pa.schema([(col, ARROW_TYPES[t](pa)) for col, t in column_types.items()])
+        self.partition_by = [c for c in partition_by if c in column_types]
+        self._rows = []
+        self._batch = 0
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def write(self, row: dict):
+        self._rows.append(row)
+        if len(self._rows) >= PARQUET_BATCH_ROWS:
+            self.flush()
+
+    def write_frame(self, df):
+        """Write a whole DataFrame chunk (batch mode) as one Parquet batch."""
+        import pyarrow as pa
+
+        self.flush()
+        self._write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+
+        self._write_table(pa.Table.from_pylist(self._rows, schema=self.schema))
+        self._rows = []
+
+    def _write_table(self, table):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        partitioning = None
+        if self.partition_by:
+            partitioning = ds.partitioning(
+                pa.schema([self.schema.field(c) for c in self.partition_by]), flavor="hive"
+            )
+        ds.write_dataset(
+            table,
+            self.path,
+            format="parquet",
+            partitioning=partitioning,
+            basename_template=f"part-{self._batch}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        )
+        self._batch += 1
+
+    def close(self):
+        self.flush()
+        if not self._batch:
+            # An empty table still gets a (schema-only) file, so readers see its
+            # columns and run_pipeline.py sees the output as written
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            pq.write_table(pa.Table.from_pylist([], schema=self.schema), self.path / "part-0-0.parquet",
+                           compression="zstd")
+
+
+def load_processed(name: str, columns=None, filters=None, processed_dir: Path = PROCESSED_DIR):
+    """
+    Load a processed table as a DataFrame.
+
+    Reads the Parquet dataset when it exists (only the requested columns,
+    and only the partitions/row groups matching `filters`, e.g.
+    [("model", "in", ["gpt-4o"]), ("hypothesis", "==", "H3")]); otherwise
+    falls back to <name>.csv and applies the same selection in pandas.
+    """
+    import pandas as pd
+
+    path = dataset_path(name, processed_dir)
+    if path.exists() and have_pyarrow():
+        import pyarrow.dataset as ds
+
+        # Dictionary-typed keys: partition values are never re-inferred as numbers
+        dataset = ds.dataset(
+            path, format="parquet",
+            partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+        )
+        table = dataset.to_table(
+            columns=columns,
+            filter=_filter_expression(filters) if filters else None,
+        )
+        df = table.to_pandas()
+        # Partition keys come back as categoricals; plain strings group like the CSV did
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(str)
+        return df
+
+    csv_path = Path(processed_dir) / f"{name}.csv"
+    if not csv_path.exists():
+        raise FileNotFoundError(f"No processed data for '{name}' in {processed_dir}")
+    filter_cols = [c for c, _, _ in (filters or [])]
+    usecols = None if columns is None else list(dict.fromkeys([*columns, *filter_cols]))
+    df = pd.read_csv(csv_path, usecols=usecols)
+    for col, op, value in filters or []:
+        if op == "==":
+            df = df[df[col] == value]
+        elif op == "in":
+            df = df[df[col].isin(value)]
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return df[columns] if columns is not None else df
+
+
+def _filter_expression(filters):
+    import pyarrow.dataset as ds
+
+    expr = None
+    for col, op, value in filters:
+        field = ds.field(col)
+        if op == "==":
+            part = field == value
+        elif op == "in":
+            part = field.isin(list(value))
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        expr = part if expr is None else expr & part
+    return expr
@@ -0,0 +1,404 @@
+"""
+Compressed raw storage: results/raw/*.jsonl.zst.
+
+Each record is one zstd frame, compressed with a dictionary trained on the
+corpus, so a single record still compresses well, appends stay atomic per
+record and byte offsets (ledger, offset index) point at whole records. The
+frames hold compact JSON in which prompt_text is replaced by a prompt_id;
+the texts live once in results/raw/prompt_refs.idx. Readers restore
+prompt_text, so every loader sees the same records as from plain JSONL.
+
+    python raw_compression.py train                 # dictionary from the current corpus
+    python raw_compression.py compress              # rewrite *.jsonl as *.jsonl.zst
+    python raw_compression.py decompress            # and back
+
+Converting replaces each file: both forms of a file would be read twice,
+so a conversion whose target already exists is refused.
+"""
+from pathlib import Path
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import random
+import time
+
+try:
+    import zstandard
+except ImportError:  # only needed for *.jsonl.zst files
+    zstandard = None
+
+from instrumentation import add_profile_argument, stage, track_file
+from records import COMPRESSED_SUFFIX, RecordError, decode_record, loads, raw_files
+
+RAW_DIR = Path("results/raw")
+
+# Trained dictionaries, <dict_id>.zdict; a file keeps the dictionary it was started with
+DICT_DIR_NAME = "dictionaries"
+
+# prompt_id -> prompt_text, one JSON object per line (not *.jsonl, so the loaders skip it)
+PROMPT_REFS_NAME = "prompt_refs.idx"
+
+# zstd's default dictionary size, the number of lines sampled to train it, and the level
+DICT_SIZE = 112_640
+DICT_SAMPLES = 50_000
+LEVEL = 10
+
+# Compressed bytes handed to the decoder at a time when walking frames
+FRAME_CHUNK = 16 * 1024
+
+# Largest zstd frame header; enough to read a file's dictionary ID
+FRAME_HEADER_MAX = 18
+
+
+def have_zstd() -> bool:
+    return zstandard is not None
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise ImportError("zstandard is not installed (pip install zstandard); "
+                          f"it is needed for {COMPRESSED_SUFFIX} raw files.")
+
+
+# ---------------------- Prompt references ----------------------
+
+def prompt_id(prompt_text: str) -> str:
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+
+
+class PromptRefs:
+    """The prompt texts referenced by the compressed files of one raw folder."""
+
+    def __init__(self, raw_dir: Path = RAW_DIR):
+        self.path = Path(raw_dir) / PROMPT_REFS_NAME
+        self.texts = {}
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.texts[entry["prompt_id"]] = entry["prompt_text"]
+
+    def ref(self, prompt_text: str) -> str:
+        """ID for a prompt text, recording the text the first time it is seen."""
+        pid = prompt_id(prompt_text)
+        if pid not in self.texts:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps({"prompt_id": pid, "prompt_text": prompt_text}, ensure_ascii=False) + "\n")
+            self.texts[pid] = prompt_text
+        return pid
+
+
+_prompt_tables = {}
+
+
+def prompt_table(raw_dir: Path) -> dict:
+    """prompt_id -> prompt_text for a raw folder, reloaded only when the refs file grew."""
+    path = Path(raw_dir) / PROMPT_REFS_NAME
+    size = path.stat().st_size if path.exists() else 0
+    cached = _prompt_tables.get(path)
+    if cached is None or cached[0] != size:
+        cached = _prompt_tables[path] = (size, PromptRefs(raw_dir).texts)
+    return cached[1]
+
+
+def compact_line(record: dict, refs: PromptRefs) -> bytes:
+    """A raw record as stored in a frame: prompt_text replaced by prompt_id."""
+    compact = {}
+    for field, value in record.items():
+        if field == "prompt_text" and isinstance(value, str):
+            compact["prompt_id"] = refs.ref(value)
+        else:
+            compact[field] = value
+    return (json.dumps(compact, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def expand_record(obj, prompts: dict):
+    """Put prompt_text back into a decoded compact record (in place)."""
+    if type(obj) is dict and "prompt_id" in obj and "prompt_text" not in obj:
+        text = prompts.get(obj.pop("prompt_id"))
+        if text is not None:
+            obj["prompt_text"] = text
+    return obj
+
+
+# ---------------------- Dictionaries ----------------------
+
+_dictionaries = {}
+
+
+def load_dictionary(raw_dir: Path, dict_id: int):
+    """The trained dictionary with this ID, or None for frames written without one."""
+    if not dict_id:
+        return None
+    _require_zstd()
+    path = Path(raw_dir) / DICT_DIR_NAME / f"{dict_id}.zdict"
+    if path not in _dictionaries:
+        if not path.exists():
+            raise FileNotFoundError(f"zstd dictionary {dict_id} not found at {path}")
+        _dictionaries[path] = zstandard.ZstdCompressionDict(path.read_bytes())
+    return _dictionaries[path]
+
+
+def latest_dictionary(raw_dir: Path = RAW_DIR) -> int:
+    """ID of the most recently trained dictionary, or 0 if there is none."""
+    folder = Path(raw_dir) / DICT_DIR_NAME
+    dicts = sorted(folder.glob("*.zdict"), key=lambda p: p.stat().st_mtime_ns) if folder.exists() else []
+    return int(dicts[-1].stem) if dicts else 0
+
+
+def file_dictionary(path: Path) -> int:
+    """Dictionary ID of a compressed file, from its first frame header (0 if none or empty)."""
+    _require_zstd()
+    with Path(path).open("rb") as f:
+        head = f.read(FRAME_HEADER_MAX)
+    if not head:
+        return 0
+    return zstandard.get_frame_parameters(head).dict_id
+
+
+def _sample_lines(raw_dir: Path, refs: PromptRefs, limit: int, seed: int = 0):
+    """A uniform sample (reservoir) of up to `limit` compact lines from the whole corpus."""
+    rng = random.Random(seed)
+    prompts = prompt_table(raw_dir)
+    lines = []
+    seen = 0
+    for file in raw_files(raw_dir):
+        for raw in iter_file_lines(file):
+            try:
+                record = decode_record(raw.strip(), prompts)
+            except RecordError:
+                continue
+            seen += 1
+            slot = len(lines) if len(lines) < limit else rng.randrange(seen)
+            if slot < limit:
+                line = compact_line(record.as_dict(), refs)
+                if slot == len(lines):
+                    lines.append(line)
+                else:
+                    lines[slot] = line
+    return lines
+
+
+def train_dictionary(raw_dir: Path = RAW_DIR, size: int = DICT_SIZE, samples: int = DICT_SAMPLES) -> int:
+    """Train a dictionary on the records in raw_dir and save it; returns its ID."""
+    _require_zstd()
+    refs = PromptRefs(raw_dir)
+    lines = _sample_lines(raw_dir, refs, samples)
+    if len(lines) < 10:
+        raise ValueError(f"Only {len(lines)} records in {raw_dir}; collect some before training a dictionary.")
+    # zstd wants clearly more sample bytes than dictionary bytes
+    size = min(size, max(1024, sum(map(len, lines)) // 10))
+    dictionary = zstandard.train_dictionary(size, lines)
+    folder = Path(raw_dir) / DICT_DIR_NAME
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / f"{dictionary.dict_id()}.zdict").write_bytes(dictionary.as_bytes())
+    return dictionary.dict_id()
+
+
+# ---------------------- Writing ----------------------
+
+class CompressedWriter:
+    """
+    Appends records to *.jsonl.zst files, one frame each. New files use the
+    latest trained dictionary; existing files keep the one they started with.
+    """
+
+    def __init__(self, raw_dir: Path = RAW_DIR, level: int = LEVEL):
+        _require_zstd()
+        self.raw_dir = Path(raw_dir)
+        self.level = level
+        self.refs = PromptRefs(raw_dir)
+        self._compressors = {}
+
+    def _compressor(self, dict_id: int):
+        if dict_id not in self._compressors:
+            self._compressors[dict_id] = zstandard.ZstdCompressor(
+                level=self.level, dict_data=load_dictionary(self.raw_dir, dict_id),
+            )
+        return self._compressors[dict_id]
+
+    def frame(self, record: dict, dict_id: int) -> bytes:
+        return self._compressor(dict_id).compress(compact_line(record, self.refs))
+
+    def raw_frame(self, line: bytes, dict_id: int) -> bytes:
+        """A line stored as it is (rows that are not JSON objects)."""
+        return self._compressor(dict_id).compress(line if line.endswith(b"\n") else line + b"\n")
+
+    def append(self, path: Path, record: dict) -> int:
+        """Append one record; returns the end offset of its frame."""
+        path = Path(path)
+        existing = path.exists() and path.stat().st_size > 0
+        dict_id = file_dictionary(path) if existing else latest_dictionary(self.raw_dir)
+        with path.open("ab") as f:
+            f.write(self.frame(record, dict_id))
+            return f.tell()
+
+
+# ---------------------- Reading ----------------------
+
+def _decompressor(path: Path):
+    _require_zstd()
+    path = Path(path)
+    return zstandard.ZstdDecompressor(dict_data=load_dictionary(path.parent, file_dictionary(path)))
+
+
+def iter_file_lines(path: Path):
+    """Stream the lines of a plain or compressed raw file (compact JSON for the latter)."""
+    path = Path(path)
+    with path.open("rb") as f:
+        if not path.name.endswith(COMPRESSED_SUFFIX):
+            yield from f
+            return
+        with _decompressor(path).stream_reader(f, read_across_frames=True) as reader:
+            yield from io.BufferedReader(reader, 1024 * 1024)
+
+
+def iter_frames(path: Path, start: int = 0):
+    """
+    Yield (compact line, frame start, frame end) for every complete frame
+    after byte offset `start`; a frame still being written ends the walk.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    if size <= start:
+        return
+    dctx = _decompressor(path)
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = start
+        while pos < size:
+            dobj = dctx.decompressobj()
+            parts = []
+            end = pos
+            while not dobj.eof and end < size:
+                chunk = data[end:end + FRAME_CHUNK]
+                parts.append(dobj.decompress(chunk))
+                end += len(chunk)
+            if not dobj.eof:
+                return
+            end -= len(dobj.unused_data)
+            yield b"".join(parts), pos, end
+            pos = end
+
+
+def read_frame(path: Path, frame: bytes) -> dict:
+    """Decode one frame of a compressed file into a full raw record."""
+    path = Path(path)
+    obj = loads(_decompressor(path).decompress(frame))
+    return expand_record(obj, prompt_table(path.parent))
+
+
+# ---------------------- Converting ----------------------
+
+def converted_path(path: Path) -> Path:
+    """Where compress/decompress writes a raw file: <name>.zst, or the name without .zst."""
+    path = Path(path)
+    if path.name.endswith(COMPRESSED_SUFFIX):
+        return path.with_name(path.name[:-len(".zst")])
+    return path.with_name(path.name + ".zst")
+
+
+def _check_target(path: Path) -> Path:
+    out = converted_path(path)
+    if out.exists():
+        raise FileExistsError(f"{out} already exists; merge or remove one of {path.name} / {out.name} first.")
+    return out
+
+
+def compress_file(path: Path, writer: CompressedWriter, dict_id: int) -> Path:
+    """Replace one plain raw file with <name>.zst, line by line (malformed lines are kept)."""
+    out = _check_target(path)
+    tmp_path = out.with_name(out.name + ".tmp")
+    with path.open("rb") as src, tmp_path.open("wb") as dst:
+        for raw in src:
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                record = None
+            if type(record) is dict:
+                dst.write(writer.frame(record, dict_id))
+            else:
+                # Keep unparseable rows as they are, so they still reach the quarantine
+                dst.write(writer.raw_frame(raw, dict_id))
+    os.replace(tmp_path, out)
+    path.unlink()
+    return out
+
+
+def decompress_file(path: Path) -> Path:
+    """Replace one compressed raw file with plain JSONL, prompt_text inline."""
+    out = _check_target(path)
+    prompts = prompt_table(path.parent)
+    tmp_path = out.with_name(out.name + ".tmp")
+    with tmp_path.open("wb") as dst:
+        for raw in iter_file_lines(path):
+            try:
+                obj = expand_record(loads(raw), prompts)
+                dst.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+            except ValueError:
+                dst.write(raw)
+    os.replace(tmp_path, out)
+    path.unlink()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="zstd-compressed raw storage with a trained dictionary.")
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="Train a dictionary on the records in the raw folder.")
+    train.add_argument("--size", type=int, default=DICT_SIZE, help="Dictionary size in bytes.")
+    train.add_argument("--samples", type=int, default=DICT_SAMPLES, help="Records sampled for training.")
+    compress = sub.add_parser("compress", help="Rewrite *.jsonl as *.jsonl.zst with the latest dictionary.")
+    compress.add_argument("--level", type=int, default=LEVEL)
+    decompress = sub.add_parser("decompress", help=f"Rewrite *{COMPRESSED_SUFFIX} as plain *.jsonl.")
+    for p in (train, compress, decompress):
+        add_profile_argument(p)
+    args = parser.parse_args()
+    _require_zstd()
+
+    with stage(f"raw_compression_{args.command}", profile=args.profile) as s:
+        if args.command == "train":
+            t0 = time.perf_counter()
+            dict_id = train_dictionary(args.raw_dir, args.size, args.samples)
+            print(f"Trained dictionary {dict_id} in {time.perf_counter() - t0:.1f}s "
+                  f"-> {args.raw_dir / DICT_DIR_NAME / f'{dict_id}.zdict'}")
+            return
+
+        before = after = 0
+        if args.command == "compress":
+            writer = CompressedWriter(args.raw_dir, args.level)
+            dict_id = latest_dictionary(args.raw_dir)
+            if not dict_id:
+                print("No trained dictionary; run 'train' first for much better ratios on small records.")
+            todo = [p for p in raw_files(args.raw_dir) if not p.name.endswith(COMPRESSED_SUFFIX)]
+            convert = lambda p: compress_file(p, writer, dict_id)  # noqa: E731
+        else:
+            todo = [p for p in raw_files(args.raw_dir) if p.name.endswith(COMPRESSED_SUFFIX)]
+            convert = decompress_file
+        clashes = [p.name for p in todo if converted_path(p).exists()]
+        if clashes:
+            raise SystemExit(f"Both forms exist for {', '.join(clashes)}; merge or remove one of each "
+                             f"before converting.")
+        for path in todo:
+            size = path.stat().st_size
+            with track_file(path):
+                out = convert(path)
+            before += size
+            after += out.stat().st_size
+            print(f"{path.name} ({size:,} B) -> {out.name} ({out.stat().st_size:,} B)")
+        s.counters.update(files=len(todo), bytes_before=before, bytes_after=after)
+        if before:
+            refs = Path(args.raw_dir) / PROMPT_REFS_NAME
+            print(f"{len(todo)} files: {before / 1e6:,.2f} MB -> {after / 1e6:,.2f} MB "
+                  f"({after / before:.1%}; prompt texts in {refs})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+from pathlib import Path
+import argparse
+import csv
+import heapq
+import json
+import mmap
+import os
+import struct
+import time
+
+from instrumentation import add_profile_argument, stage, track_file
+from raw_compression import prompt_table, read_frame
+from records import COMPRESSED_SUFFIX, loads, raw_files
+from run_ledger import RAW_DIR, RunLedger, _iter_lines_with_offsets
+
+# Sidecar offset index of results/raw, sorted by record key, plus its file table
+INDEX_PATH = RAW_DIR / "offsets.idx"
+
+# record_key (16 bytes) | file id | byte offset | line length
+ENTRY = struct.Struct(">16sIQI")
+
+CLAIMS_CSV = Path("results/processed/claim_validation_flags.csv")
+
+
+def _read_entries(path: Path):
+    """Stream the fixed-width entries of an index file."""
+    with path.open("rb") as f:
+        while True:
+            block = f.read(ENTRY.size * 4096)
+            if not block:
+                return
+            for i in range(0, len(block), ENTRY.size):
+                yield block[i:i + ENTRY.size]
+
+
+class RecordIndex:
+    """
+    Byte-offset index of every valid raw record, keyed by record_key (the
+    same key the processed outputs carry and the run ledger uses).
+
+    The index is a sorted array of fixed-width entries, so a lookup is a
+    binary search over an mmap of it, and the record itself is sliced out
+    of an mmap of its raw file and decoded alone. Like the ledger, files
+    that grew only have their tail scanned; new entries are sorted and
+    merged into the existing array. When a key occurs more than once, the
+    entry kept is the one iter_records() keeps (first file in name order).
+    """
+
+    def __init__(self, raw_dir: Path = RAW_DIR, path: Path = None):
+        self.raw_dir = Path(raw_dir)
+        self.path = Path(path) if path else self.raw_dir / INDEX_PATH.name
+        self.meta_path = self.path.with_suffix(".json")
+        self.files = {}
+        if self.meta_path.exists() and self.path.exists():
+            self.files = json.loads(self.meta_path.read_text(encoding="utf-8"))["files"]
+        self._names = {meta["id"]: name for name, meta in self.files.items()}
+        self._index_map = None
+        self._raw_maps = {}
+
+    def __len__(self) -> int:
+        return self.path.stat().st_size // ENTRY.size if self.path.exists() else 0
+
+    # ---------------------- Building ----------------------
+
+    def sync(self) -> int:
+        """Index records appended to raw files since the last sync; returns the number added."""
+        files = raw_files(self.raw_dir) if self.raw_dir.exists() else []
+        sizes = {file.name: file.stat().st_size for file in files}
+        if any(sizes.get(name, -1) < meta["indexed_to"] for name, meta in self.files.items()):
+            # A file shrank or was removed: offsets may point anywhere, start over
+            self.close()
+            self.files = {}
+            self._names = {}
+            self.path.unlink(missing_ok=True)
+
+        new = []
+        for file in files:
+            meta = self.files.get(file.name)
+            if meta is None:
+                meta = self.files[file.name] = {"id": len(self.files), "indexed_to": 0}
+                self._names[meta["id"]] = file.name
+            start = meta["indexed_to"]
+            if sizes[file.name] <= start:
+                continue
+            end = start
+            prompts = prompt_table(self.raw_dir) if file.name.endswith(COMPRESSED_SUFFIX) else None
+            with track_file(file, sizes[file.name] - start) as metrics:
+                for raw, line_end in _iter_lines_with_offsets(file, start):
+                    # Compressed lines are frames: their length on disk is not len(raw)
+                    key = RunLedger._key_of_line(raw, prompts)
+                    if key is not None:
+                        new.append(ENTRY.pack(bytes.fromhex(key), meta["id"], end, line_end - end))
+                        metrics["records"] += 1
+                    end = line_end
+            meta["indexed_to"] = end
+        if new:
+            self._merge(new)
+        self._save_meta()
+        return len(new)
+
+    def _merge(self, new: list):
+        rank = {self.files[name]["id"]: i for i, name in enumerate(sorted(self.files))}
+
+        def order(entry):
+            key, file_id, offset, _ = ENTRY.unpack(entry)
+            return key, rank[file_id], offset
+
+        new.sort(key=order)
+        streams = [new]
+        if self.path.exists():
+            streams.append(_read_entries(self.path))
+        self.close()
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("wb") as out:
+            last = None
+            for entry in heapq.merge(*streams, key=order):
+                # Sorted by (key, file rank, offset): the first entry of a key wins
+                if entry[:16] != last:
+                    out.write(entry)
+                    last = entry[:16]
+        os.replace(tmp_path, self.path)
+
+    def _save_meta(self):
+        self.meta_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        tmp_path.write_text(json.dumps({"entry": ENTRY.format, "files": self.files}, indent=1),
+                            encoding="utf-8")
+        os.replace(tmp_path, self.meta_path)
+
+    # ---------------------- Lookup ----------------------
+
+    def _index(self):
+        if self._index_map is None:
+            if not len(self):
+                return None
+            with self.path.open("rb") as f:
+                self._index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._index_map
+
+    def locate(self, key: str):
+        """(file name, byte offset, length) of a record, or None."""
+        index = self._index()
+        if index is None:
+            return None
+        target = bytes.fromhex(key)
+        lo, hi = 0, len(index) // ENTRY.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if index[mid * ENTRY.size:mid * ENTRY.size + 16] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo * ENTRY.size >= len(index):
+            return None
+        found, file_id, offset, length = ENTRY.unpack_from(index, lo * ENTRY.size)
+        if found != target:
+            return None
+        return self._names[file_id], offset, length
+
+    def read(self, location) -> dict:
+        """Decode the record at a locate() result."""
+        name, offset, length = location
+        raw = self._raw_maps.get(name)
+        if raw is None:
+            with (self.raw_dir / name).open("rb") as f:
+                raw = self._raw_maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if name.endswith(COMPRESSED_SUFFIX):
+            return read_frame(self.raw_dir / name, raw[offset:offset + length])
+        return loads(raw[offset:offset + length])
+
+    def fetch(self, key: str):
+        """The raw record with this key as a dict, or None."""
+        location = self.locate(key)
+        return None if location is None else self.read(location)
+
+    def close(self):
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_map = None
+        for raw in self._raw_maps.values():
+            raw.close()
+        self._raw_maps = {}
+
+
+def flagged_keys(path: Path = CLAIMS_CSV, flag: str = "any_flag", limit: int = 10):
+    """record_keys of the first `limit` rows of a processed CSV with `flag` set."""
+    keys = []
+    with path.open("r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if "record_key" not in row:
+                raise SystemExit(f"{path} has no record_key column; rerun the script that writes it.")
+            if row.get(flag) == "1":
+                keys.append(row["record_key"])
+                if len(keys) >= limit:
+                    break
+    return keys
+
+
+def print_record(key: str, record: dict, location, seconds: float):
+    name, offset, _ = location
+    print("=" * 60)
+    print(f"{key}  {name}@{offset}  ({seconds * 1e6:.0f} µs)")
+    print(f"{record.get('hypothesis')} / {record.get('condition')} | model={record.get('model')} "
+          f"| run_id={record.get('run_id')}")
+    print("-" * 60)
+    print(record.get("response_text", ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offset index of results/raw for fetching single responses.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help=f"Index new raw records into {INDEX_PATH}.")
+    add_profile_argument(build)
+
+    show = sub.add_parser("show", help="Print the raw responses behind record keys.")
+    show.add_argument("keys", nargs="*", metavar="RECORD_KEY", help="record_key values from a processed CSV.")
+    show.add_argument("--flagged", action="store_true",
+                      help=f"Show responses with --flag set in {CLAIMS_CSV} instead.")
+    show.add_argument("--flag", default="any_flag", help="Flag column for --flagged (default: any_flag).")
+    show.add_argument("--limit", type=int, default=10, help="Responses shown with --flagged.")
+    show.add_argument("--json", action="store_true", help="Print the raw records as JSON lines.")
+    args = parser.parse_args()
+
+    index = RecordIndex()
+    try:
+        if args.command == "build":
+            with stage("record_index", profile=args.profile) as s:
+                s.records = index.sync()
+            print(f"Indexed {s.records} new records; {len(index):,} in {index.path}")
+            return
+
+        index.sync()
+        keys = flagged_keys(flag=args.flag, limit=args.limit) if args.flagged else args.keys
+        for key in keys:
+            t0 = time.perf_counter()
+            location = index.locate(key)
+            record = index.read(location) if location else None
+            seconds = time.perf_counter() - t0
+            if record is None:
+                print(f"{key}: not in the index")
+            elif args.json:
+                print(json.dumps(record, ensure_ascii=False))
+            else:
+                print_record(key, record, location, seconds)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
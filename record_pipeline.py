@@ -0,0 +1,451 @@
+from pathlib import Path
+import argparse
+import copy
+import csv
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from feature_cache import CACHE_PATH, FeatureCache, fingerprint
+from instrumentation import Stage, add_profile_argument, current_stage, peak_rss_mb, stage, track_file
+from processed_store import ParquetSink, dataset_path, have_pyarrow
+from records import (
+    COMPRESSED_SUFFIX, SCHEMA_VERSION, Quarantine, ResponseRecord, iter_file_records, raw_files,
+)
+from run_ledger import record_key
+
+# Folder with all jsonl logs
+INPUT_DIR = Path("results/raw")
+
+# Output folder
+OUTPUT_DIR = Path("results/processed")
+
+# Files larger than this are split into byte ranges for --workers
+SHARD_BYTES = 64 * 1024 * 1024
+
+# Output formats for the processed layer
+FORMATS = ("csv", "parquet")
+
+
+class Analyzer:
+    """
+    One consumer in the single-pass pipeline.
+
+    open() is called once before the first record and close() once at the
+    end to flush outputs. Each record goes through extract(), which only
+    looks at the record (so it can run in a worker process), and the
+    result, if not None, through add(), which updates the output.
+    """
+
+    output_name = None
+
+    # Typed columns for the Parquet output, and its hive partition keys
+    column_types = {}
+    partition_by = ("model", "hypothesis")
+
+    # Set by run_pipeline() before open()
+    formats = ("csv",)
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+    # Bump when extract() logic changes in a way version_parts() cannot see
+    logic_version = 1
+
+    def version_parts(self) -> tuple:
+        """Word lists, regexes, ... that extract() depends on."""
+        return ()
+
+    def version(self) -> str:
+        """Fingerprint used by the feature cache; a change forces a rescore."""
+        return fingerprint(self.name, self.output_name, self.logic_version, SCHEMA_VERSION,
+                           *self.version_parts())
+
+    def output_file(self) -> str:
+        """File name written by this instance; output_name unless an instance needs its own."""
+        return self.output_name
+
+    def open(self, output_dir: Path):
+        self.out_path = Path(output_dir) / self.output_file()
+        self.parquet_path = dataset_path(Path(self.output_file()).stem, output_dir)
+        self._parquet = None
+        if "parquet" in self.formats:
+            self._parquet = ParquetSink(self.parquet_path, self.column_types, self.partition_by)
+
+    def extract(self, record: ResponseRecord):
+        raise NotImplementedError
+
+    def add(self, item):
+        raise NotImplementedError
+
+    def consume(self, record: ResponseRecord):
+        item = self.extract(record)
+        if item is not None:
+            self.add(item)
+
+    def close(self):
+        pass
+
+
+class CsvRowAnalyzer(Analyzer):
+    """
+    Turns each relevant record into one CSV row, written as soon as it is
+    produced so nothing accumulates in memory.
+    """
+
+    fieldnames = []
+
+    def row(self, record: ResponseRecord):
+        """Return a dict for the CSV, or None to skip the record."""
+        raise NotImplementedError
+
+    def extract(self, record: ResponseRecord):
+        return self.row(record)
+
+    def open(self, output_dir: Path):
+        super().open(output_dir)
+        self._file = None
+        if "csv" in self.formats:
+            self._file = self.out_path.open("w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+            self._writer.writeheader()
+
+    def add(self, row: dict):
+        if self._file is not None:
+            self._writer.writerow(row)
+        if self._parquet is not None:
+            self._parquet.write(row)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+class CountAnalyzer(Analyzer):
+    """
+    Counts records per key tuple and writes the sorted counts on close.
+    Memory grows with the number of distinct keys, not with the corpus.
+    """
+
+    header = []
+
+    def key(self, record: ResponseRecord):
+        """Return the key tuple to count, or None to skip the record."""
+        raise NotImplementedError
+
+    def extract(self, record: ResponseRecord):
+        return self.key(record)
+
+    def open(self, output_dir: Path):
+        super().open(output_dir)
+        self.counts = Counter()
+
+    def add(self, key):
+        # Keys come back from the feature cache as lists
+        self.counts[tuple(key)] += 1
+
+    def close(self):
+        rows = sorted(self.counts.items())
+        if "csv" in self.formats:
+            with self.out_path.open("w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(self.header)
+                for key, cnt in rows:
+                    writer.writerow([*key, cnt])
+        if self._parquet is not None:
+            for key, cnt in rows:
+                self._parquet.write(dict(zip(self.header, [*key, cnt])))
+            self._parquet.close()
+
+
+def _key(record: ResponseRecord) -> str:
+    return record_key(record.prompt_text, record.model, record.run_id)
+
+
+def iter_records(input_dir: Path = INPUT_DIR, quarantine: Quarantine = None):
+    """
+    Stream valid, unique records from every raw file (plain or zstd JSONL) in input_dir.
+
+    Files are read in sorted order so the first copy of a repeated
+    (prompt, model, run_id) cell wins deterministically; rows that fail
+    validation go to the quarantine instead.
+    """
+    input_dir = Path(input_dir)
+    if not input_dir.exists():
+        raise FileNotFoundError(f"Input directory not found: {input_dir}")
+
+    quarantine = quarantine or Quarantine()
+    files = raw_files(input_dir)
+    quarantine.prune(f.name for f in files)
+    seen = set()
+    try:
+        for file in files:
+            print(f"Loading {file} ...")
+            quarantine.start(file.name)
+            with track_file(file) as metrics:
+                for record in iter_file_records(file, on_error=partial(quarantine.add, file.name)):
+                    key = _key(record)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    metrics["records"] += 1
+                    yield record
+    finally:
+        quarantine.close()
+
+
+# ---------------------- Sharded (multiprocess) execution ----------------------
+
+def iter_shards(input_dir: Path, shard_bytes: int = SHARD_BYTES):
+    """
+    Split the raw files into (path, start, end) byte ranges, in the same
+    sorted order the serial reader uses. Small files are one shard each,
+    and so are compressed files (they can only be read from the start).
+    """
+    for file in raw_files(input_dir):
+        size = file.stat().st_size
+        if file.name.endswith(COMPRESSED_SUFFIX):
+            yield str(file), 0, size
+            continue
+        start = 0
+        while True:
+            end = min(start + shard_bytes, size)
+            yield str(file), start, end
+            if end >= size:
+                break
+            start = end
+
+
+def _process_shard(task):
+    """
+    Worker: extract items for every valid record in one shard.
+    Returns (items, rejected rows, the worker's peak RSS) for the parent
+    to merge in order.
+    """
+    (path, start, end), analyzers = task
+    out = []
+    rejected = []
+    on_error = lambda offset, reason, raw: rejected.append((offset, reason, raw))  # noqa: E731
+    for record in iter_file_records(path, start, end, on_error=on_error):
+        out.append((_key(record), [a.extract(record) for a in analyzers]))
+    return out, rejected, peak_rss_mb()
+
+
+def _quarantine_rejects(quarantine: Quarantine, file_name: str, rejected):
+    for offset, reason, raw in rejected:
+        quarantine.add(file_name, offset, reason, raw)
+
+
+def _run_sharded(analyzers, extractors, input_dir: Path, workers: int,
+                 quarantine: Quarantine) -> int:
+    """
+    Extract items in a process pool and merge them in shard order. Because
+    shards are ordered like the serial reader and duplicates are dropped
+    here, every output matches the serial run byte for byte.
+    """
+    seen = set()
+    n = 0
+    last_file = None
+    shards = list(iter_shards(input_dir))
+    quarantine.prune(Path(path).name for path, _, _ in shards)
+    tasks = ((shard, extractors) for shard in shards)
+    metrics = current_stage()
+    if metrics is not None:
+        metrics.workers = workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        t_prev = time.perf_counter()
+        for shard, (items, rejected, peak) in zip(shards, pool.map(_process_shard, tasks)):
+            if shard[0] != last_file:
+                last_file = shard[0]
+                print(f"Loading {Path(last_file)} ...")
+                quarantine.start(Path(last_file).name)
+            _quarantine_rejects(quarantine, Path(last_file).name, rejected)
+            kept = 0
+            for key, extracted in items:
+                if key in seen:
+                    continue
+                seen.add(key)
+                for analyzer, item in zip(analyzers, extracted):
+                    if item is not None:
+                        analyzer.add(item)
+                kept += 1
+            n += kept
+            if metrics is not None:
+                # Time between merged shards, i.e. how long the pipeline spent on this one
+                entry = metrics.file(last_file, shard[2] - shard[1])
+                entry["records"] += kept
+                Stage.note_peak(entry, peak)
+                t_now = time.perf_counter()
+                entry["seconds"] += t_now - t_prev
+                t_prev = t_now
+    return n
+
+
+# ---------------------- Incremental execution ----------------------
+
+def _run_incremental(analyzers, extractors, input_dir: Path, workers: int,
+                     quarantine: Quarantine, cache_path: Path = CACHE_PATH) -> int:
+    """
+    Score only raw files that are new or changed (or whose analyzer
+    version changed) into the feature cache, then rebuild every output
+    from the cached rows in serial-reader order.
+    """
+    cache = FeatureCache(cache_path)
+    try:
+        files = raw_files(input_dir)
+        cache.prune(f.name for f in files)
+        quarantine.prune(f.name for f in files)
+
+        stale = []
+        for file in files:
+            todo = [e for e in extractors if not cache.is_fresh(file, e.name, e.version())]
+            if todo:
+                stale.append((file, todo, cache.snapshot(file)))
+
+        tasks = [((str(file), 0, snap[0]), todo) for file, todo, snap in stale]
+        if workers > 1 and len(tasks) > 1:
+            if current_stage() is not None:
+                current_stage().workers = workers
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_process_shard, tasks))
+        else:
+            results = [_process_shard(task) for task in tasks]
+
+        peaks = {}
+        for (file, todo, snap), (items, rejected, peak) in zip(stale, results):
+            print(f"Scoring {file} ...")
+            peaks[file.name] = peak
+            quarantine.start(file.name)
+            _quarantine_rejects(quarantine, file.name, rejected)
+            for i, extractor in enumerate(todo):
+                rows = [(key, extracted[i]) for key, extracted in items]
+                cache.store(file, extractor.name, extractor.version(), rows, snap)
+        print(f"Rescored {len(stale)} of {len(files)} files")
+
+        seen = set()
+        n = 0
+        rescored = {file.name: snap[0] for file, _, snap in stale}
+        for file in files:
+            streams = [cache.rows(file.name, a.name) for a in analyzers]
+            # Only rescored files were read from disk; the rest came from the cache
+            with track_file(file, rescored.get(file.name, 0)) as metrics:
+                Stage.note_peak(metrics, peaks.get(file.name))
+                for cached in zip(*streams):
+                    key = cached[0][0]
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    for analyzer, (_, item) in zip(analyzers, cached):
+                        if item is not None:
+                            analyzer.add(item)
+                    metrics["records"] += 1
+                    n += 1
+        return n
+    finally:
+        cache.close()
+
+
+def resolve_formats(fmt: str) -> tuple:
+    """Map the --format choice to output formats, dropping Parquet without pyarrow."""
+    formats = FORMATS if fmt == "both" else (fmt,)
+    if "parquet" in formats and not have_pyarrow():
+        print("pyarrow is not installed; writing CSV only.")
+        formats = ("csv",)
+    return formats
+
+
+def run_pipeline(analyzers, input_dir: Path = INPUT_DIR, output_dir: Path = OUTPUT_DIR,
+                 workers: int = 1, incremental: bool = False, formats=("csv",)) -> int:
+    """
+    Read every raw record exactly once and hand it to each analyzer.
+    With workers > 1 the raw files are sharded across a process pool;
+    with incremental=True unchanged files are served from the feature cache.
+    `formats` selects CSV and/or partitioned Parquet output.
+    Returns the number of records processed.
+    """
+    for analyzer in analyzers:
+        analyzer.formats = tuple(formats)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if not Path(input_dir).exists():
+        raise FileNotFoundError(f"Input directory not found: {input_dir}")
+
+    # Unopened copies are what gets pickled to the workers
+    extractors = [copy.copy(a) for a in analyzers]
+    for analyzer in analyzers:
+        analyzer.open(output_dir)
+    quarantine = Quarantine()
+    n = 0
+    try:
+        if incremental:
+            n = _run_incremental(analyzers, extractors, input_dir, workers, quarantine)
+        elif workers > 1:
+            n = _run_sharded(analyzers, extractors, input_dir, workers, quarantine)
+        else:
+            for record in iter_records(input_dir, quarantine):
+                for analyzer in analyzers:
+                    analyzer.consume(record)
+                n += 1
+    finally:
+        quarantine.close()
+        for analyzer in analyzers:
+            analyzer.close()
+    print(f"Total records processed: {n}")
+    if current_stage() is not None:
+        current_stage().counters["quarantined"] = quarantine.count
+    if quarantine.count:
+        print(f"Quarantined {quarantine.count} malformed rows in {quarantine.directory}")
+    return n
+
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help=f"Worker processes for sharded execution (default: 1; this machine has {os.cpu_count()} cores).",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help=f"Only score new or changed raw files; reuse cached features from {CACHE_PATH}.",
+    )
+    parser.add_argument(
+        "--format", choices=("csv", "parquet", "both"), default="both",
+        help="Processed output format (default: both). Parquet goes to "
+             "results/processed/parquet/<name>/, partitioned by model and hypothesis.",
+    )
+    add_profile_argument(parser)
+
+
+def all_analyzers() -> list:
+    """Every analyzer run over results/raw (analyze_bias.py and validate_claims.py together)."""
+    # Imported here so either script can import this module without a cycle
+    from analyze_bias import H2PlayerAnalyzer, SentimentFocusAnalyzer
+    from near_duplicates import NearDuplicateAnalyzer
+    from validate_claims import ClaimValidationAnalyzer
+
+    return [H2PlayerAnalyzer(), SentimentFocusAnalyzer(), ClaimValidationAnalyzer(), NearDuplicateAnalyzer()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all analyzers in one pass over results/raw.")
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+
+    analyzers = all_analyzers()
+    formats = resolve_formats(args.format)
+    with stage("record_pipeline", profile=args.profile) as s:
+        s.records = run_pipeline(analyzers, workers=args.workers, incremental=args.incremental,
+                                 formats=formats)
+    for analyzer in analyzers:
+        if "csv" in formats:
+            print(f"Saved {analyzer.out_path}")
+        if "parquet" in formats:
+            print(f"Saved {analyzer.parquet_path}")
+
+
+if __name__ == "__main__":
+    main()
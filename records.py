@@ -0,0 +1,240 @@
+from pathlib import Path
+import json
+import os
+import re
+
+try:
+    import orjson
+except ImportError:  # plain json works, just slower
+    orjson = None
+
+# Bump when decoding/validation rules change; part of every analyzer's cache version
+SCHEMA_VERSION = 1
+
+# Rows that fail validation are written here, one file per raw file
+QUARANTINE_DIR = Path("results/quarantine")
+
+# Raw files are JSONL, optionally zstd-compressed (see raw_compression.py)
+RAW_SUFFIX = ".jsonl"
+COMPRESSED_SUFFIX = ".jsonl.zst"
+
+# Short identifiers only: a sentence in `model` means the row was mis-logged
+MODEL_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._:/+-]{0,63}$")
+HYPOTHESIS_PATTERN = re.compile(r"^H\d+$")
+CONDITION_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9_+\-]{0,63}$")
+
+
+class RecordError(ValueError):
+    """Raised when a raw line is not a valid response record."""
+
+
+class ResponseRecord:
+    """One raw LLM response, as logged by run_experiment.py."""
+
+    __slots__ = (
+        "hypothesis", "condition", "model", "run_id",
+        "response_text", "prompt_text", "timestamp",
+    )
+
+    def __init__(self, hypothesis: str, condition: str, model: str, run_id: int,
+                 response_text: str, prompt_text: str = "", timestamp: str = ""):
+        self.hypothesis = hypothesis
+        self.condition = condition
+        self.model = model
+        self.run_id = run_id
+        self.response_text = response_text
+        self.prompt_text = prompt_text
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return (f"ResponseRecord({self.hypothesis}/{self.condition}, model={self.model!r}, "
+                f"run_id={self.run_id})")
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def loads(line):
+    """Parse one JSON line (bytes or str) with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+# Label values that already passed their pattern; the same few strings repeat
+# on every row, so this skips the regex for all but the first occurrence.
+_VALID_LABELS = {"hypothesis": set(), "condition": set(), "model": set()}
+_LABEL_PATTERNS = {
+    "hypothesis": HYPOTHESIS_PATTERN,
+    "condition": CONDITION_PATTERN,
+    "model": MODEL_PATTERN,
+}
+_MAX_CACHED_LABELS = 10_000
+
+
+def _label(obj: dict, field: str) -> str:
+    value = obj.get(field)
+    if type(value) is not str:
+        raise RecordError(f"{field}: expected string, got {type(value).__name__}")
+    if value in _VALID_LABELS[field]:
+        return value
+    stripped = value.strip()
+    if not stripped:
+        raise RecordError(f"{field}: empty")
+    if not _LABEL_PATTERNS[field].match(stripped):
+        raise RecordError(f"{field}: invalid value {stripped[:60]!r}")
+    if stripped == value and len(_VALID_LABELS[field]) < _MAX_CACHED_LABELS:
+        _VALID_LABELS[field].add(value)
+    return stripped
+
+
+def raw_files(directory: Path) -> list:
+    """Plain and compressed raw files of a folder, in the sorted order every reader uses."""
+    directory = Path(directory)
+    return sorted([*directory.glob("*" + RAW_SUFFIX), *directory.glob("*" + COMPRESSED_SUFFIX)])
+
+
+def decode_record(line, prompts: dict = None) -> ResponseRecord:
+    """
+    Parse and validate one raw JSONL line, raising RecordError if it is
+    malformed. `prompts` (prompt_id -> text) resolves the prompt references
+    of compressed files.
+    """
+    try:
+        obj = loads(line)
+    except ValueError as exc:
+        raise RecordError(f"invalid JSON: {exc}") from None
+    if type(obj) is not dict:
+        raise RecordError("expected a JSON object")
+    if prompts is not None and "prompt_id" in obj and "prompt_text" not in obj:
+        obj["prompt_text"] = prompts.get(obj["prompt_id"])
+
+    run_id = obj.get("run_id")
+    if type(run_id) is not int:
+        if isinstance(run_id, str) and run_id.strip().isdigit():
+            run_id = int(run_id)
+        else:
+            raise RecordError(f"run_id: expected integer, got {run_id!r}")
+
+    response_text = obj.get("response_text")
+    if not isinstance(response_text, str) or not response_text.strip():
+        raise RecordError("response_text: missing or empty")
+    prompt_text = obj.get("prompt_text")
+    if not isinstance(prompt_text, str) or not prompt_text.strip():
+        raise RecordError("prompt_text: missing or empty")
+
+    return ResponseRecord(
+        _label(obj, "hypothesis"),
+        _label(obj, "condition"),
+        _label(obj, "model"),
+        run_id,
+        response_text,
+        prompt_text,
+        obj.get("timestamp") or "",
+    )
+
+
+def iter_file_records(path, start: int = 0, end: int = None, on_error=None):
+    """
+    Decode the lines that *start* inside [start, end) of a raw file.
+
+    A line straddling `start` belongs to the previous range. Malformed
+    lines are skipped and reported as on_error(offset, reason, raw_line).
+    Compressed files are always read whole; offsets are then positions in
+    the decompressed stream.
+    """
+    if str(path).endswith(COMPRESSED_SUFFIX):
+        yield from _iter_compressed_records(Path(path), on_error)
+        return
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            # Unless the previous byte ended a line, skip the partial line
+            if f.read(1) != b"\n":
+                f.readline()
+        offset = f.tell()
+        for raw in f:
+            if end is not None and offset >= end:
+                break
+            line_offset = offset
+            offset += len(raw)
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                yield decode_record(line)
+            except RecordError as exc:
+                if on_error is not None:
+                    on_error(line_offset, str(exc), line)
+
+
+def _iter_compressed_records(path: Path, on_error=None):
+    # Imported here: raw_compression builds on this module
+    from raw_compression import iter_file_lines, prompt_table
+
+    prompts = prompt_table(path.parent)
+    offset = 0
+    for raw in iter_file_lines(path):
+        line_offset = offset
+        offset += len(raw)
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            yield decode_record(line, prompts)
+        except RecordError as exc:
+            if on_error is not None:
+                on_error(line_offset, str(exc), line)
+
+
+class Quarantine:
+    """
+    Writes rejected rows to QUARANTINE_DIR/<raw file name>, one JSON
+    object per row with the byte offset, the reason and the raw line.
+    A raw file's quarantine is replaced every time that file is parsed;
+    rows go to a per-process temp file that is moved into place on close,
+    so two scripts parsing the same raw file never interleave.
+    """
+
+    def __init__(self, directory: Path = QUARANTINE_DIR):
+        self.directory = Path(directory)
+        self.count = 0
+        self._open_name = None
+        self._file = None
+
+    def start(self, file_name: str):
+        """Forget earlier rejects for a raw file that is about to be re-parsed."""
+        self.close()
+        stale = self.directory / file_name
+        if stale.exists():
+            stale.unlink()
+
+    def add(self, file_name: str, offset: int, reason: str, raw: bytes):
+        if self._open_name != file_name:
+            self.close()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._file = (self.directory / f"{file_name}.{os.getpid()}.tmp").open("a", encoding="utf-8")
+            self._open_name = file_name
+        entry = {
+            "offset": offset,
+            "reason": reason,
+            "raw": raw.decode("utf-8", errors="replace"),
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def prune(self, existing_names):
+        """Drop quarantine files whose raw file no longer exists."""
+        if not self.directory.exists():
+            return
+        existing = set(existing_names)
+        for path in raw_files(self.directory):
+            if path.name not in existing:
+                path.unlink()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            os.replace(self._file.name, self.directory / self._open_name)
+        self._file = None
+        self._open_name = None
@@ -0,0 +1,153 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Default resamples per test
+N_RESAMPLES = 100_000
+
+# Cap on resample-matrix size (elements) held in memory at once
+CHUNK_ELEMENTS = 20_000_000
+
+
+def _chunks(n_resamples: int, n: int):
+    """Split n_resamples into chunk sizes so each (chunk × n) matrix fits the cap."""
+    per_chunk = max(1, CHUNK_ELEMENTS // max(n, 1))
+    done = 0
+    while done < n_resamples:
+        size = min(per_chunk, n_resamples - done)
+        yield size
+        done += size
+
+
+def _permuted_indices(rng, size: int, n: int) -> np.ndarray:
+    """(size × n) matrix whose rows are independent permutations of range(n)."""
+    return rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1)
+
+
+def mean_diff(a, b) -> float:
+    return float(np.mean(a) - np.mean(b))
+
+
+def permutation_test_mean_diff(a, b, n_resamples: int = N_RESAMPLES, rng=None) -> dict:
+    """
+    Two-sided permutation test for mean(a) - mean(b). All group
+    relabelings are drawn at once as an index matrix over the pooled
+    sample, so the test statistic is one vectorized mean per row.
+    """
+    rng = rng or np.random.default_rng()
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    pooled = np.concatenate([a, b])
+    n, n_a = len(pooled), len(a)
+    observed = mean_diff(a, b)
+
+    extreme = 0
+    for size in _chunks(n_resamples, n):
+        shuffled = pooled[_permuted_indices(rng, size, n)]
+        diffs = shuffled[:, :n_a].mean(axis=1) - shuffled[:, n_a:].mean(axis=1)
+        extreme += int(np.count_nonzero(np.abs(diffs) >= abs(observed) - 1e-12))
+
+    return {
+        "statistic": observed,
+        # +1 correction: the observed labelling is one of the permutations
+        "p_value": (extreme + 1) / (n_resamples + 1),
+        "n_resamples": n_resamples,
+    }
+
+
+def bootstrap_ci(values, n_resamples: int = N_RESAMPLES, alpha: float = 0.05, rng=None) -> dict:
+    """Percentile bootstrap CI for the mean of `values`."""
+    rng = rng or np.random.default_rng()
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    means = np.concatenate([
+        values[rng.integers(0, n, size=(size, n))].mean(axis=1)
+        for size in _chunks(n_resamples, n)
+    ])
+    low, high = np.quantile(means, [alpha / 2, 1 - alpha / 2])
+    return {"estimate": float(values.mean()), "ci_low": float(low), "ci_high": float(high),
+            "n_resamples": n_resamples}
+
+
+def bootstrap_diff_ci(a, b, n_resamples: int = N_RESAMPLES, alpha: float = 0.05, rng=None) -> dict:
+    """Percentile bootstrap CI for mean(a) - mean(b), resampling each group separately."""
+    rng = rng or np.random.default_rng()
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    diffs = []
+    for size in _chunks(n_resamples, len(a) + len(b)):
+        ia = rng.integers(0, len(a), size=(size, len(a)))
+        ib = rng.integers(0, len(b), size=(size, len(b)))
+        diffs.append(a[ia].mean(axis=1) - b[ib].mean(axis=1))
+    diffs = np.concatenate(diffs)
+    low, high = np.quantile(diffs, [alpha / 2, 1 - alpha / 2])
+    return {"estimate": mean_diff(a, b), "ci_low": float(low), "ci_high": float(high),
+            "n_resamples": n_resamples}
+
+
+def total_variation(codes_a, codes_b, n_categories: int) -> float:
+    """Total variation distance between two categorical samples."""
+    pa = np.bincount(codes_a, minlength=n_categories) / len(codes_a)
+    pb = np.bincount(codes_b, minlength=n_categories) / len(codes_b)
+    return float(0.5 * np.abs(pa - pb).sum())
+
+
+def permutation_test_distribution_shift(codes_a, codes_b, n_resamples: int = N_RESAMPLES,
+                                        rng=None) -> dict:
+    """
+    Permutation test for a shift in a categorical distribution (e.g. which
+    player is recommended) between two conditions, using total variation
+    distance. Category counts for every permutation come from one
+    vectorized one-hot sum instead of a bincount per resample.
+    """
+    rng = rng or np.random.default_rng()
+    codes_a = np.asarray(codes_a, dtype=int)
+    codes_b = np.asarray(codes_b, dtype=int)
+    pooled = np.concatenate([codes_a, codes_b])
+    n, n_a = len(pooled), len(codes_a)
+    k = int(pooled.max()) + 1 if n else 1
+    observed = total_variation(codes_a, codes_b, k)
+
+    extreme = 0
+    for size in _chunks(n_resamples, n * k):
+        shuffled = pooled[_permuted_indices(rng, size, n)]
+        in_a = np.zeros((size, n), dtype=bool)
+        in_a[:, :n_a] = True
+        one_hot = shuffled[:, :, None] == np.arange(k)
+        counts_a = (one_hot & in_a[:, :, None]).sum(axis=1)
+        counts_b = one_hot.sum(axis=1) - counts_a
+        tvd = 0.5 * np.abs(counts_a / n_a - counts_b / (n - n_a)).sum(axis=1)
+        extreme += int(np.count_nonzero(tvd >= observed - 1e-12))
+
+    return {
+        "statistic": observed,
+        "p_value": (extreme + 1) / (n_resamples + 1),
+        "n_resamples": n_resamples,
+    }
+
+
+TEST_KINDS = {
+    "permutation_mean_diff": permutation_test_mean_diff,
+    "bootstrap_ci": bootstrap_ci,
+    "bootstrap_diff_ci": bootstrap_diff_ci,
+    "permutation_distribution_shift": permutation_test_distribution_shift,
+}
+
+
+def _run_one(task):
+    kind, args, n_resamples, seed = task
+    rng = np.random.default_rng(seed)
+    return TEST_KINDS[kind](*args, n_resamples=n_resamples, rng=rng)
+
+
+def run_tests(specs, n_resamples: int = N_RESAMPLES, seed: int = 0, workers: int = 1):
+    """
+    Run a list of (kind, args) resampling tests, in parallel across a
+    process pool when workers > 1. Every test gets its own child seed, so
+    results are reproducible and do not depend on scheduling.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(specs))
+    tasks = [(kind, args, n_resamples, s) for (kind, args), s in zip(specs, seeds)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_run_one, tasks))
+    return [_run_one(task) for task in tasks]
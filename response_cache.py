@@ -0,0 +1,117 @@
+from pathlib import Path
+import hashlib
+import sqlite3
+import time
+
+# Shared with the feature cache folder (ignored by git)
+CACHE_PATH = Path("results/cache/responses.sqlite")
+
+# Least recently used responses are evicted above this size
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Eviction frees down to this fraction of the limit, so it does not run on every put
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    temperature TEXT NOT NULL,
+    seed TEXT NOT NULL,
+    sample_index INTEGER NOT NULL,
+    response_text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (model, prompt_hash, temperature, seed, sample_index)
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def prompt_hash(prompt_text: str) -> str:
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()
+
+
+def _param(value) -> str:
+    """Sampling parameters as key text; None (the provider default) is ''."""
+    return "" if value is None else repr(value)
+
+
+class ResponseCache:
+    """
+    Content-addressed store of model responses in SQLite.
+
+    Keyed by (model, prompt hash, temperature, seed, sample index), so the
+    same prompt asked again with the same sampling parameters is answered
+    locally. `hits` / `misses` count lookups made through this instance.
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(SCHEMA)
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def key(model: str, prompt_text: str, temperature=None, seed=None, sample_index: int = 0):
+        return model, prompt_hash(prompt_text), _param(temperature), _param(seed), sample_index
+
+    def get(self, key):
+        """Stored response for `key`, or None. A hit marks the entry as recently used."""
+        row = self.conn.execute(
+            "SELECT response_text FROM responses WHERE model=? AND prompt_hash=? AND temperature=? "
+            "AND seed=? AND sample_index=?",
+            key,
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.conn:
+            self.conn.execute(
+                "UPDATE responses SET last_used=? WHERE model=? AND prompt_hash=? AND temperature=? "
+                "AND seed=? AND sample_index=?",
+                (time.time_ns(), *key),
+            )
+        return row[0]
+
+    def put(self, key, response_text: str):
+        size = len(response_text.encode("utf-8"))
+        with self.conn:
+            old = self.conn.execute(
+                "SELECT size FROM responses WHERE model=? AND prompt_hash=? AND temperature=? "
+                "AND seed=? AND sample_index=?",
+                key,
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (model, prompt_hash, temperature, seed, sample_index, "
+                "response_text, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, response_text, size, time.time_ns()),
+            )
+        self.size += size - (old[0] if old else 0)
+        if self.size > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def evict(self, target_bytes: int):
+        """Drop least recently used responses until the cache is at most `target_bytes`."""
+        rows = self.conn.execute("SELECT rowid, size FROM responses ORDER BY last_used").fetchall()
+        doomed = []
+        for rowid, size in rows:
+            if self.size <= target_bytes:
+                break
+            doomed.append((rowid,))
+            self.size -= size
+        with self.conn:
+            self.conn.executemany("DELETE FROM responses WHERE rowid=?", doomed)
+        return len(doomed)
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
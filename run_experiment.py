@@ -1,10 +1,21 @@
+import argparse
 import json
 from pathlib import Path
 from datetime import datetime, timezone
 
+from adaptive_sampler import (
+    FABRICATION_WIDTH, MAX_RUNS, MIN_RUNS, QUERY_BUDGET, SENTIMENT_WIDTH, AdaptiveSampler, print_summary,
+    REPORT_PATH as ADAPTIVE_REPORT_PATH,
+)
+from collection import collect, output_path_for
+from instrumentation import add_profile_argument, stage
+from llm_providers import StubProvider, build_provider
+from response_cache import CACHE_PATH, MAX_CACHE_BYTES, ResponseCache
+from run_ledger import RunLedger, record_key
+
 PROMPTS_PATH = Path("prompts/prompts.jsonl")
-OUTPUT_PATH = Path("results/raw/llm_responses.jsonl")
-OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+OUTPUT_DIR = Path("results/raw")
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def iter_prompts():
@@ -14,12 +25,13 @@ def iter_prompts():
                 yield json.loads(line)
 
 
-def main():
+def run_manual():
     print("=== LLM Bias Experiment Runner (manual logging) ===\n")
     print(f"Reading prompts from: {PROMPTS_PATH}")
-    print(f"Appending responses to: {OUTPUT_PATH}\n")
+    print(f"Appending responses to: {OUTPUT_DIR}/llm_responses_<model>_run<N>.jsonl\n")
 
     prompts = list(iter_prompts())
+    ledger = RunLedger(OUTPUT_DIR)
 
     for i, p in enumerate(prompts, start=1):
         print("=" * 60)
@@ -36,6 +48,11 @@ def main():
         except ValueError:
             run_id = 1
 
+        key = record_key(p["prompt_text"], model, run_id)
+        if key in ledger:
+            print(f"Already collected for {model} run {run_id}, skipping.\n")
+            continue
+
         print("\nPaste the LLM's response below. End with a blank line:")
         lines = []
         while True:
@@ -59,13 +76,141 @@ def main():
             "response_text": response_text,
         }
 
-        with OUTPUT_PATH.open("a", encoding="utf-8") as f:
+        out_path = output_path_for(model, run_id, OUTPUT_DIR)
+        with out_path.open("a", encoding="utf-8") as f:
             f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            end = f.tell()
+        ledger.add(key, out_path.name, end)
 
         print("Saved response.\n")
 
     print("All prompts processed. You can re-run this script for more runs or models.")
 
 
+def build_providers(model_specs, temperature=None, seed=None, stub_rates=None):
+    providers = [build_provider(spec) for spec in model_specs]
+    for provider in providers:
+        provider.temperature = temperature
+        provider.seed = seed
+        if stub_rates and isinstance(provider, StubProvider):
+            provider.fabrication_rates = stub_rates
+    return providers
+
+
+def run_auto(model_specs, runs, temperature=None, seed=None, cache_path=CACHE_PATH,
+             cache_max_bytes=MAX_CACHE_BYTES, stub_rates=None, compress=False):
+    """Query every prompt against every model concurrently, no interaction needed."""
+    print("=== LLM Bias Experiment Runner (automatic collection) ===\n")
+    print(f"Reading prompts from: {PROMPTS_PATH}")
+    print(f"Writing responses to: {OUTPUT_DIR}\n")
+
+    prompts = list(iter_prompts())
+    providers = build_providers(model_specs, temperature, seed, stub_rates)
+    run_ids = range(1, runs + 1)
+
+    cache = ResponseCache(cache_path, cache_max_bytes) if cache_path else None
+    try:
+        stats = collect(prompts, providers, run_ids, output_dir=OUTPUT_DIR, cache=cache, compress=compress)
+    finally:
+        if cache is not None:
+            cache.close()
+    print(f"Saved {stats['written']} responses "
+          f"({stats['skipped']} already collected, {stats['failed']} failed, "
+          f"{stats['retries']} retries).")
+    if cache is not None:
+        print(f"Response cache: {cache.hits} hits / {cache.hits + cache.misses} lookups "
+              f"({cache.hit_rate():.1%} hit rate).")
+    return stats
+
+
+def run_adaptive(model_specs, temperature=None, seed=None, cache_path=CACHE_PATH,
+                 cache_max_bytes=MAX_CACHE_BYTES, stub_rates=None, compress=False, **sampler_options):
+    """Collect until every cell's intervals reach the target widths or the budget is spent."""
+    print("=== LLM Bias Experiment Runner (adaptive collection) ===\n")
+    print(f"Reading prompts from: {PROMPTS_PATH}")
+    print(f"Writing responses to: {OUTPUT_DIR}\n")
+
+    providers = build_providers(model_specs, temperature, seed, stub_rates)
+    cache = ResponseCache(cache_path, cache_max_bytes) if cache_path else None
+    try:
+        sampler = AdaptiveSampler(providers, list(iter_prompts()), output_dir=OUTPUT_DIR, cache=cache,
+                                  compress=compress, **sampler_options)
+        stats = sampler.run()
+    finally:
+        if cache is not None:
+            cache.close()
+    rows = sampler.write_report(ADAPTIVE_REPORT_PATH)
+    print_summary(sampler, rows)
+    print(f"Saved {stats['written']} responses ({stats['failed']} failed); "
+          f"per-cell estimates in {ADAPTIVE_REPORT_PATH}.")
+    return dict(stats, queries=sampler.queries, rounds=sampler.rounds)
+
+
+def parse_stub_rates(items) -> dict:
+    """["PRIMED=0.4", "0.1"] -> {"PRIMED": 0.4, "*": 0.1}"""
+    rates = {}
+    for item in items:
+        condition, _, rate = item.rpartition("=")
+        rates[condition or "*"] = float(rate)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect LLM responses for the bias experiment.")
+    parser.add_argument(
+        "--auto", action="store_true",
+        help="Query the models directly instead of pasting responses by hand.",
+    )
+    parser.add_argument(
+        "--model", action="append", dest="models", default=None,
+        help="Provider spec for --auto, e.g. openai:gpt-4o, anthropic:claude-3.5, "
+             "gemini:gemini-1.5 or stub (repeatable, default: stub).",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Runs per prompt and model (default: 3).")
+    parser.add_argument("--temperature", type=float, default=None,
+                        help="Sampling temperature for --auto (default: each API's own).")
+    parser.add_argument("--seed", type=int, default=None, help="Sampling seed for --auto, where supported.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always query the models instead of reusing cached responses.")
+    parser.add_argument("--cache-max-mb", type=int, default=MAX_CACHE_BYTES // (1024 * 1024),
+                        help="Evict least recently used cached responses above this size.")
+    parser.add_argument("--stub-rate", action="append", default=[], metavar="[CONDITION=]RATE",
+                        help="Fabrication rate of the stub provider, overall or per condition (repeatable).")
+    parser.add_argument("--compress", action="store_true",
+                        help="Write zstd-compressed raw files (*.jsonl.zst, see raw_compression.py).")
+
+    adaptive = parser.add_argument_group("adaptive collection (--auto --adaptive)")
+    adaptive.add_argument("--adaptive", action="store_true",
+                          help="Sample cells until their 95%% intervals are narrow enough, instead of --runs each.")
+    adaptive.add_argument("--budget", type=int, default=QUERY_BUDGET,
+                          help="Total provider queries allowed (cache hits are free).")
+    adaptive.add_argument("--target-width", type=float, default=FABRICATION_WIDTH,
+                          help="Target width of each cell's fabrication-rate interval.")
+    adaptive.add_argument("--sentiment-width", type=float, default=SENTIMENT_WIDTH,
+                          help="Target width of each H1/H3 cell's mean-sentiment interval.")
+    adaptive.add_argument("--min-runs", type=int, default=MIN_RUNS, help="Samples every cell gets first.")
+    adaptive.add_argument("--max-runs", type=int, default=MAX_RUNS, help="Samples no cell goes beyond.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    if args.auto:
+        common = dict(temperature=args.temperature, seed=args.seed,
+                      cache_path=None if args.no_cache else CACHE_PATH,
+                      cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+                      stub_rates=parse_stub_rates(args.stub_rate), compress=args.compress)
+        with stage("run_experiment", profile=args.profile) as s:
+            if args.adaptive:
+                stats = run_adaptive(args.models or ["stub"], budget=args.budget,
+                                     fabrication_width=args.target_width,
+                                     sentiment_width=args.sentiment_width,
+                                     min_runs=args.min_runs, max_runs=args.max_runs, **common)
+            else:
+                stats = run_auto(args.models or ["stub"], args.runs, **common)
+            s.records = stats["written"]
+            s.counters.update(stats)
+    else:
+        run_manual()
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,131 @@
+import hashlib
+from pathlib import Path
+
+from raw_compression import iter_frames, prompt_table
+from records import COMPRESSED_SUFFIX, RecordError, decode_record, raw_files
+
+# Folder with all jsonl logs
+RAW_DIR = Path("results/raw")
+
+# Sidecar index; deliberately not *.jsonl so the analysis globs skip it
+LEDGER_PATH = RAW_DIR / "ledger.idx"
+
+
+def record_key(prompt_text: str, model: str, run_id) -> str:
+    """Content hash identifying one (prompt, model, run_id) cell."""
+    h = hashlib.sha256()
+    h.update(prompt_text.encode("utf-8"))
+    h.update(b"\x1f")
+    h.update(model.strip().encode("utf-8"))
+    h.update(b"\x1f")
+    h.update(str(run_id).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def _iter_lines_with_offsets(path: Path, start: int = 0):
+    """
+    Yield (line, end_offset) for every line after byte offset `start`.
+    In a compressed file each record is one frame, so the offsets are
+    frame boundaries and the lines are the decompressed (compact) records.
+    """
+    if path.name.endswith(COMPRESSED_SUFFIX):
+        for line, _, end in iter_frames(path, start):
+            yield line, end
+        return
+    with path.open("rb") as f:
+        f.seek(start)
+        offset = start
+        for raw in f:
+            offset += len(raw)
+            # A trailing line without newline may still be mid-write
+            if not raw.endswith(b"\n"):
+                break
+            yield raw, offset
+
+
+class RunLedger:
+    """
+    Index of every collected cell in results/raw.
+
+    Each ledger line is "<key>\\t<file name>\\t<end byte offset>". On open,
+    any raw file that grew past its last indexed offset (a crash between
+    writing the record and the ledger line, or a hand-edited file) has only
+    its new tail scanned, so the ledger never drifts from the raw data. If
+    a raw file was deleted or shrank, the ledger is rebuilt from scratch.
+    """
+
+    def __init__(self, raw_dir: Path = RAW_DIR, path: Path = None):
+        self.raw_dir = Path(raw_dir)
+        self.path = Path(path) if path else self.raw_dir / LEDGER_PATH.name
+        self._keys = {}
+        self._indexed_to = {}
+        self._load()
+        self.sync()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 3:
+                    continue
+                key, file_name, end = parts
+                self._keys.setdefault(key, file_name)
+                self._indexed_to[file_name] = max(self._indexed_to.get(file_name, 0), int(end))
+
+    def sync(self):
+        """Index records appended to raw files since the ledger was last written."""
+        files = raw_files(self.raw_dir) if self.raw_dir.exists() else []
+        sizes = {file.name: file.stat().st_size for file in files}
+        if any(sizes.get(name, -1) < end for name, end in self._indexed_to.items()):
+            # Indexed records are gone: forget them so those cells get collected again
+            self._keys = {}
+            self._indexed_to = {}
+            if self.path.exists():
+                self.path.unlink()
+        for file in files:
+            start = self._indexed_to.get(file.name, 0)
+            if sizes[file.name] <= start:
+                continue
+            entries = []
+            end = start
+            prompts = prompt_table(self.raw_dir) if file.name.endswith(COMPRESSED_SUFFIX) else None
+            for raw, end in _iter_lines_with_offsets(file, start):
+                key = self._key_of_line(raw, prompts)
+                if key is not None and key not in self._keys:
+                    self._keys[key] = file.name
+                    entries.append((key, file.name, end))
+            # Blank or malformed lines still advance the in-memory offset
+            self._indexed_to[file.name] = max(self._indexed_to.get(file.name, 0), end)
+            self._append(entries)
+
+    @staticmethod
+    def _key_of_line(raw: bytes, prompts: dict = None):
+        line = raw.strip()
+        if not line:
+            return None
+        try:
+            record = decode_record(line, prompts)
+        except RecordError:
+            return None
+        return record_key(record.prompt_text, record.model, record.run_id)
+
+    def _append(self, entries):
+        if not entries:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.writelines(f"{key}\t{file_name}\t{end}\n" for key, file_name, end in entries)
+
+    def add(self, key: str, file_name: str, end: int):
+        """Mark a cell as collected in `file_name`, ending at byte offset `end`."""
+        self._keys.setdefault(key, file_name)
+        self._indexed_to[file_name] = max(self._indexed_to.get(file_name, 0), end)
+        self._append([(key, file_name, end)])
@@ -0,0 +1,308 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+import argparse
+import ast
+import fnmatch
+import json
+import os
+import subprocess
+import sys
+import time
+
+from feature_cache import file_sha256, fingerprint
+
+ROOT = Path(__file__).resolve().parent
+
+# Input hashes of the last successful run of every stage, plus a
+# (size, mtime) -> sha256 memo so unchanged files are not re-hashed
+STATE_PATH = Path("results/cache/pipeline_state.json")
+
+PROCESSED_DIR = "results/processed"
+
+# Plain and zstd-compressed raw files (raw_compression.py)
+RAW_FILES = ["results/raw/*.jsonl", "results/raw/*.jsonl.zst"]
+
+
+def processed(name: str, formats) -> list:
+    """Declared outputs of one processed table in the chosen formats."""
+    paths = []
+    if "csv" in formats:
+        paths.append(f"{PROCESSED_DIR}/{name}.csv")
+    if "parquet" in formats:
+        paths.append(f"{PROCESSED_DIR}/parquet/{name}")
+    return paths
+
+
+def build_stages(args) -> dict:
+    """
+    The pipeline as stages with declared inputs and outputs (paths or globs,
+    relative to the repo). Edges come from these: a stage depends on every
+    stage that writes one of its inputs.
+    """
+    py = sys.executable
+    formats = ("csv", "parquet") if args.format == "both" else (args.format,)
+    scoring = ["--format", args.format, "--workers", str(args.workers)]
+    if not args.full:
+        scoring.append("--incremental")
+
+    stages = {
+        "experiment_design": {
+            "command": [py, "experiment_design.py"],
+            "inputs": [],
+            "outputs": ["prompts/prompts.jsonl"],
+        },
+    }
+    if args.collect:
+        stages["run_experiment"] = {
+            "command": [py, "run_experiment.py", "--auto", "--runs", str(args.runs),
+                        *(a for spec in args.collect for a in ("--model", spec))],
+            "inputs": ["prompts/prompts.jsonl"],
+            "outputs": list(RAW_FILES),
+        }
+    stages["record_index"] = {
+        "command": [py, "record_index.py", "build"],
+        "inputs": list(RAW_FILES),
+        "outputs": ["results/raw/offsets.idx"],
+    }
+    stages["analyze_bias"] = {
+        "command": [py, "analyze_bias.py", *scoring],
+        "inputs": list(RAW_FILES),
+        "outputs": processed("h2_player_recommendations", formats)
+                   + processed("h1_h3_sentiment_focus", formats)
+                   + processed("response_diversity", formats)
+                   + processed("near_duplicate_clusters", formats),
+    }
+    stages["validate_claims"] = {
+        "command": [py, "validate_claims.py", *scoring],
+        "inputs": list(RAW_FILES),
+        "outputs": processed("claim_validation_flags", formats),
+    }
+    if args.model_dir:
+        stages["semantic_scorer"] = {
+            "command": [py, "semantic_scorer.py", "--model-dir", str(args.model_dir),
+                        "--format", args.format],
+            "inputs": [*RAW_FILES, str(args.model_dir)],
+            "outputs": processed("semantic_sentiment", formats),
+        }
+    stages["aggregate_cube"] = {
+        "command": [py, "aggregate_cube.py", "update"],
+        "inputs": processed("claim_validation_flags", formats) + processed("h1_h3_sentiment_focus", formats),
+        "outputs": ["results/cache/cube.sqlite"],
+    }
+    stages["analysis_statisticaltest"] = {
+        "command": [py, "analysis_statisticaltest.py", "--workers", str(args.workers)],
+        "inputs": processed("claim_validation_flags", formats)
+                  + processed("h1_h3_sentiment_focus", formats)
+                  + processed("h2_player_recommendations", formats),
+        "outputs": ["analysis/stat_tests.txt", "analysis/stat_tests.csv", "analysis/all_pairs_tests.csv"],
+    }
+    stages["analysis_visualizations"] = {
+        "command": [py, "analysis_visualizations.py", "--workers", str(args.workers)],
+        "inputs": processed("claim_validation_flags", formats),
+        "outputs": ["analysis/fabrication_rate_by_model.png", "analysis/fabrication_rate_by_condition.png",
+                    "analysis/fabrication_heatmap.png"],
+    }
+    return stages
+
+
+def dependencies(stages: dict) -> dict:
+    """stage -> stages that write one of its inputs."""
+    deps = {}
+    for name, spec in stages.items():
+        deps[name] = {
+            other for other, other_spec in stages.items()
+            if other != name and any(
+                out == inp or fnmatch.fnmatch(out, inp) or fnmatch.fnmatch(inp, out)
+                for out in other_spec["outputs"] for inp in spec["inputs"]
+            )
+        }
+    return deps
+
+
+def local_modules(script: str) -> list:
+    """The script and every repo module it imports, transitively."""
+    found, todo = set(), [script]
+    while todo:
+        path = ROOT / todo.pop()
+        if path.name in found or not path.exists():
+            continue
+        found.add(path.name)
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if isinstance(node, ast.Import):
+                todo += [f"{a.name.split('.')[0]}.py" for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                todo.append(f"{node.module.split('.')[0]}.py")
+    return sorted(found)
+
+
+class FileHasher:
+    """Content hashes of files, memoised on (size, mtime) across runs."""
+
+    def __init__(self, memo: dict):
+        self.memo = memo
+
+    def __call__(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path)
+        cached = self.memo.get(key)
+        if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+            return cached[2]
+        digest = file_sha256(path)
+        self.memo[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+
+def expand(pattern: str) -> list:
+    """Files behind a declared path, glob or directory, in a stable order."""
+    matches = sorted(Path().glob(pattern)) if any(c in pattern for c in "*?[") else [Path(pattern)]
+    files = []
+    for match in matches:
+        if match.is_dir():
+            files += sorted(p for p in match.rglob("*") if p.is_file())
+        elif match.exists():
+            files.append(match)
+    return files
+
+
+def stage_hash(spec: dict, hasher: FileHasher) -> str:
+    """Fingerprint of a stage's command, code and current input contents."""
+    parts = [spec["command"][1:]]
+    parts += [(m, hasher(ROOT / m)) for m in local_modules(spec["command"][1])]
+    for pattern in spec["inputs"]:
+        parts += [(str(f), hasher(f)) for f in expand(pattern)]
+    return fingerprint(*parts)
+
+
+def outputs_exist(spec: dict) -> bool:
+    return all(expand(pattern) for pattern in spec["outputs"])
+
+
+def log(message: str):
+    """One write per line, so messages from the pool threads do not interleave mid-line."""
+    sys.stdout.write(message + "\n")
+    sys.stdout.flush()
+
+
+def run_stage(name: str, spec: dict):
+    # Logged from the pool thread, i.e. when the process starts rather than when it is queued
+    log(f"[{name}] running: {' '.join(spec['command'][1:])}")
+    t0 = time.perf_counter()
+    proc = subprocess.run(spec["command"], capture_output=True, text=True)
+    return proc.returncode, proc.stdout + proc.stderr, time.perf_counter() - t0
+
+
+def load_state(path: Path) -> dict:
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            pass
+    return {"stages": {}, "files": {}}
+
+
+def save_state(path: Path, state: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def run_dag(stages: dict, jobs: int = 2, force: bool = False, dry_run: bool = False,
+            verbose: bool = False, state_path: Path = STATE_PATH) -> dict:
+    """
+    Run stages as soon as their dependencies finish, up to `jobs` at a time.
+    A stage whose command, code and inputs hash like its last successful run
+    (and whose outputs exist) is skipped; dependents of a failed stage are
+    not run. Returns stage -> "ran" / "up to date" / "failed" / "blocked".
+    """
+    deps = dependencies(stages)
+    state = load_state(state_path)
+    hasher = FileHasher(state["files"])
+    status, digests = {}, {}
+    pending = list(stages)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            for name in list(pending):
+                if any(d in running.values() or d in pending for d in deps[name]):
+                    continue
+                pending.remove(name)
+                if any(status[d] in ("failed", "blocked") for d in deps[name]):
+                    status[name] = "blocked"
+                    log(f"[{name}] blocked by a failed dependency")
+                    continue
+                digest = stage_hash(stages[name], hasher)
+                if not force and state["stages"].get(name) == digest and outputs_exist(stages[name]):
+                    status[name] = "up to date"
+                    log(f"[{name}] up to date")
+                    continue
+                if dry_run:
+                    # Pretend it ran; its dependents are then shown as would-run too
+                    status[name] = "would run"
+                    log(f"[{name}] would run: {' '.join(stages[name]['command'][1:])}")
+                    continue
+                running[pool.submit(run_stage, name, stages[name])] = name
+                digests[name] = digest
+                state["stages"].pop(name, None)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                code, output, seconds = future.result()
+                if code == 0:
+                    status[name] = "ran"
+                    state["stages"][name] = digests[name]
+                    log(f"[{name}] done in {seconds:.1f}s")
+                    if verbose:
+                        log(output)
+                else:
+                    status[name] = "failed"
+                    log(f"[{name}] FAILED (exit {code}) after {seconds:.1f}s:\n{output}")
+                if not dry_run:
+                    save_state(state_path, state)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the whole pipeline as a DAG, skipping stages whose inputs are unchanged."
+    )
+    parser.add_argument("--jobs", type=int, default=2, help="Stages run at the same time (default: 2).")
+    parser.add_argument("--workers", type=int, default=1, help="--workers passed to each stage.")
+    parser.add_argument("--format", choices=("csv", "parquet", "both"), default="both")
+    parser.add_argument("--full", action="store_true",
+                        help="Rescore every raw file instead of running the scoring stages --incremental.")
+    parser.add_argument("--collect", action="append", default=[], metavar="SPEC",
+                        help="Also collect responses for this model (run_experiment --auto --model SPEC).")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per prompt and model for --collect.")
+    parser.add_argument("--model-dir", type=Path, default=None,
+                        help="Also run semantic_scorer.py with this local embedding model.")
+    parser.add_argument("--only", action="append", default=[], metavar="STAGE",
+                        help="Only consider these stages (repeatable).")
+    parser.add_argument("--force", action="store_true", help="Run stages even if they are up to date.")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would run.")
+    parser.add_argument("--verbose", action="store_true", help="Print each stage's output.")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    stages = build_stages(args)
+    if args.only:
+        unknown = set(args.only) - set(stages)
+        if unknown:
+            raise SystemExit(f"Unknown stage(s): {', '.join(sorted(unknown))} (have: {', '.join(stages)})")
+        stages = {name: spec for name, spec in stages.items() if name in args.only}
+
+    t0 = time.perf_counter()
+    status = run_dag(stages, jobs=args.jobs, force=args.force, dry_run=args.dry_run, verbose=args.verbose)
+    counts = {s: list(status.values()).count(s) for s in dict.fromkeys(status.values())}
+    print(f"\nPipeline finished in {time.perf_counter() - t0:.1f}s: "
+          + ", ".join(f"{n} {s}" for s, n in counts.items()))
+    if any(s in ("failed", "blocked") for s in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
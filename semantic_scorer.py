@@ -0,0 +1,354 @@
+from pathlib import Path
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+from feature_cache import fingerprint
+from instrumentation import add_profile_argument, current_stage, stage
+from processed_store import ParquetSink, dataset_path
+from record_pipeline import INPUT_DIR, OUTPUT_DIR, iter_records, resolve_formats
+from run_ledger import record_key
+
+# Embeddings of every response scored so far, keyed by response hash
+EMBEDDING_CACHE_DIR = Path("results/cache/embeddings")
+
+OUTPUT_NAME = "semantic_sentiment.csv"
+
+# Responses per encoder call, and per lookup/score/write chunk
+ENCODE_BATCH = 64
+CHUNK_SIZE = 10_000
+
+# Rows the memmap grows by at least, so appends do not resize every batch
+GROW_ROWS = 4096
+
+# Anchor sentences: the score is the projection onto (positive - negative)
+POSITIVE_ANCHORS = [
+    "The team has real strengths and clear opportunities to improve next season.",
+    "There is a solid foundation and strong potential for growth.",
+    "The results show promise, and the team can build on its success.",
+]
+NEGATIVE_ANCHORS = [
+    "The season was a failure marked by serious weaknesses and problems.",
+    "The team collapsed and struggled badly, with poor and inconsistent play.",
+    "The results expose breakdowns and underperformance across the board.",
+]
+
+FIELDNAMES = [
+    "hypothesis", "condition", "model", "run_id",
+    "positive_similarity", "negative_similarity", "semantic_score", "record_key",
+]
+COLUMN_TYPES = {
+    "hypothesis": "string", "condition": "string", "model": "string", "run_id": "int32",
+    "positive_similarity": "float64", "negative_similarity": "float64", "semantic_score": "float64",
+    "record_key": "string",
+}
+PARTITION_BY = ("model", "hypothesis")
+
+
+class EncoderUnavailable(RuntimeError):
+    """Raised when no local model or runtime can be loaded."""
+
+
+def response_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+# ---------------------- Encoders (local, CPU only) ----------------------
+
+class OnnxEncoder:
+    """
+    Sentence embeddings from an exported ONNX model: model_dir holds
+    model.onnx (or onnx/model.onnx) and tokenizer.json. Mean-pooled over
+    the attention mask and L2-normalised, like sentence-transformers.
+    """
+
+    max_length = 256
+
+    def __init__(self, model_dir: Path, threads: int = None):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as exc:
+            raise EncoderUnavailable(
+                "The 'onnxruntime' and 'tokenizers' packages are required for ONNX models."
+            ) from exc
+        model_path = next((p for p in (model_dir / "model.onnx", model_dir / "onnx" / "model.onnx")
+                           if p.exists()), None)
+        if model_path is None or not (model_dir / "tokenizer.json").exists():
+            raise EncoderUnavailable(f"No model.onnx + tokenizer.json in {model_dir}")
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_length)
+        self.tokenizer.enable_padding()
+        self.model_id = fingerprint("onnx", model_path.stat().st_size, model_path.stat().st_mtime_ns)
+
+    def encode(self, texts) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(texts))
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feeds)[0]
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return _normalise(pooled)
+
+
+class SentenceTransformerEncoder:
+    """A sentence-transformers model saved to disk (model.save(model_dir)), run on CPU."""
+
+    def __init__(self, model_dir: Path, threads: int = None):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as exc:
+            raise EncoderUnavailable(
+                "The 'sentence-transformers' package is required for this model directory."
+            ) from exc
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        # The hub reads the offline variables at import; local_files_only holds either way
+        self.model = SentenceTransformer(str(model_dir), device="cpu", local_files_only=True)
+        config = model_dir / "config.json"
+        self.model_id = fingerprint("st", str(model_dir.resolve()),
+                                    config.stat().st_mtime_ns if config.exists() else 0)
+
+    def encode(self, texts) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=ENCODE_BATCH, convert_to_numpy=True,
+                                    normalize_embeddings=True, show_progress_bar=False)
+        return vectors.astype(np.float32, copy=False)
+
+
+def load_encoder(model_dir: Path, threads: int = None):
+    """ONNX when the folder has an exported model, sentence-transformers otherwise."""
+    # Never reach for the Hugging Face hub: everything must come from model_dir.
+    # Set outright, so an inherited HF_HUB_OFFLINE=0 cannot re-enable downloads.
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    model_dir = Path(model_dir)
+    if not model_dir.is_dir():
+        raise EncoderUnavailable(f"Model directory not found: {model_dir}")
+    if (model_dir / "model.onnx").exists() or (model_dir / "onnx" / "model.onnx").exists():
+        return OnnxEncoder(model_dir, threads)
+    return SentenceTransformerEncoder(model_dir, threads)
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+# ---------------------- Embedding cache ----------------------
+
+class EmbeddingCache:
+    """
+    Response-hash -> embedding, as a float32 memmap (vectors.f32) plus an
+    append-only "<hash>\\t<row>" index (keys.idx). Vectors are flushed
+    before their index lines are written, so a crash only loses work.
+    The cache is cleared when the encoder or embedding size changes.
+    """
+
+    def __init__(self, directory: Path, dim: int, model_id: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.vectors_path = self.directory / "vectors.f32"
+        self.keys_path = self.directory / "keys.idx"
+        meta_path = self.directory / "meta.json"
+        meta = {"dim": dim, "model_id": model_id}
+        if not meta_path.exists() or json.loads(meta_path.read_text(encoding="utf-8")) != meta:
+            for path in (self.vectors_path, self.keys_path):
+                if path.exists():
+                    path.unlink()
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+        self.rows = {}
+        if self.keys_path.exists():
+            data = self.keys_path.read_bytes()
+            if data and not data.endswith(b"\n"):
+                # Torn last line from an interrupted run: drop it, the response is re-embedded
+                data = data[:data.rfind(b"\n") + 1]
+                with self.keys_path.open("r+b") as f:
+                    f.truncate(len(data))
+            for line in data.decode("utf-8").splitlines():
+                key, _, row = line.partition("\t")
+                self.rows[key] = int(row)
+        self.count = max(self.rows.values(), default=-1) + 1
+        self._map = None
+        self._open(self.vectors_path.stat().st_size // (4 * dim) if self.vectors_path.exists() else 0)
+
+    def _open(self, capacity: int):
+        self.capacity = capacity
+        self._map = None
+        if capacity:
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dim))
+
+    def _grow(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2, GROW_ROWS)
+        if self._map is not None:
+            self._map.flush()
+        self._map = None
+        with self.vectors_path.open("ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._open(capacity)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def lookup(self, keys):
+        """Row per key (-1 where missing)."""
+        return np.array([self.rows.get(k, -1) for k in keys], dtype=np.int64)
+
+    def add(self, keys, vectors: np.ndarray) -> np.ndarray:
+        """Store vectors for new keys and return their rows."""
+        start = self.count
+        self._grow(start + len(keys))
+        self._map[start:start + len(keys)] = vectors
+        self._map.flush()
+        rows = np.arange(start, start + len(keys))
+        with self.keys_path.open("a", encoding="utf-8") as f:
+            f.writelines(f"{k}\t{r}\n" for k, r in zip(keys, rows))
+        self.rows.update(zip(keys, rows.tolist()))
+        self.count += len(keys)
+        return rows
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self._map[rows])
+
+
+# ---------------------- Scoring ----------------------
+
+class SemanticScorer:
+    """
+    Embeds responses (through the cache) and scores them as projections
+    onto the positive and negative anchor centroids.
+    """
+
+    def __init__(self, encoder, cache_dir: Path = EMBEDDING_CACHE_DIR,
+                 positive=POSITIVE_ANCHORS, negative=NEGATIVE_ANCHORS):
+        self.encoder = encoder
+        pos = encoder.encode(positive)
+        neg = encoder.encode(negative)
+        self.anchors = _normalise(np.stack([pos.mean(axis=0), neg.mean(axis=0)]))
+        self.cache = EmbeddingCache(cache_dir, pos.shape[1], encoder.model_id)
+        self.encoded = 0
+
+    def embed(self, texts) -> np.ndarray:
+        """Embeddings for texts, encoding only the ones not cached yet."""
+        keys = [response_hash(t) for t in texts]
+        rows = self.cache.lookup(keys)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing):
+            # Identical responses in one chunk are encoded once
+            new = {}
+            for i in missing:
+                new.setdefault(keys[i], texts[i])
+            new_keys = list(new)
+            vectors = np.concatenate([
+                self.encoder.encode([new[k] for k in new_keys[i:i + ENCODE_BATCH]])
+                for i in range(0, len(new_keys), ENCODE_BATCH)
+            ])
+            self.cache.add(new_keys, vectors)
+            self.encoded += len(new_keys)
+            rows = self.cache.lookup(keys)
+        return self.cache.get(rows)
+
+    def score(self, texts):
+        """(positive similarity, negative similarity, score) arrays for texts."""
+        sims = self.embed(texts) @ self.anchors.T
+        return sims[:, 0], sims[:, 1], sims[:, 0] - sims[:, 1]
+
+
+def run(model_dir: Path, input_dir: Path = INPUT_DIR, output_dir: Path = OUTPUT_DIR,
+        cache_dir: Path = EMBEDDING_CACHE_DIR, formats=("csv",), threads: int = None):
+    """Score every raw record and write semantic_sentiment.csv/.parquet."""
+    import pandas as pd
+
+    scorer = SemanticScorer(load_encoder(model_dir, threads), cache_dir)
+    out_path = Path(output_dir) / OUTPUT_NAME
+    parquet = None
+    if "parquet" in formats:
+        parquet = ParquetSink(dataset_path(out_path.stem, output_dir), COLUMN_TYPES, PARTITION_BY)
+
+    records = iter_records(input_dir)
+    start = time.perf_counter()
+    n = 0
+    first = True
+    while True:
+        chunk = list(itertools.islice(records, CHUNK_SIZE))
+        if not chunk and not first:
+            break
+        pos, neg, score = scorer.score([r.response_text for r in chunk]) if chunk else ([], [], [])
+        rows = pd.DataFrame({
+            "hypothesis": [r.hypothesis for r in chunk],
+            "condition": [r.condition for r in chunk],
+            "model": [r.model for r in chunk],
+            "run_id": [r.run_id for r in chunk],
+            "positive_similarity": pos,
+            "negative_similarity": neg,
+            "semantic_score": score,
+            "record_key": [record_key(r.prompt_text, r.model, r.run_id) for r in chunk],
+        }, columns=FIELDNAMES)
+        if "csv" in formats:
+            rows.to_csv(out_path, mode="w" if first else "a", header=first, index=False,
+                        lineterminator="\r\n", float_format="%.6f")
+        if parquet is not None and len(rows):
+            parquet.write_frame(rows)
+        n += len(chunk)
+        first = False
+    if parquet is not None:
+        parquet.close()
+
+    elapsed = time.perf_counter() - start
+    if current_stage() is not None:
+        current_stage().counters.update(embedded=scorer.encoded, cached=n - scorer.encoded)
+    print(f"Total records processed: {n} ({scorer.encoded} embedded, "
+          f"{n - scorer.encoded} from the embedding cache) "
+          f"in {elapsed:.1f}s, {n / max(elapsed, 1e-9):,.0f} records/s")
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Embedding-based sentiment scores from a local CPU model (no network)."
+    )
+    parser.add_argument("--model-dir", type=Path, required=True,
+                        help="Folder with an exported ONNX model (model.onnx + tokenizer.json) "
+                             "or a saved sentence-transformers model.")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads for inference.")
+    parser.add_argument("--format", choices=["csv", "parquet", "both"], default="both",
+                        help="Output format(s) for the processed table (default: both).")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    formats = resolve_formats(args.format)
+    try:
+        with stage("semantic_scorer", profile=args.profile) as s:
+            out_path = run(args.model_dir, formats=formats, threads=args.threads)
+            s.records = sum(e["records"] for e in s.files.values())
+    except EncoderUnavailable as exc:
+        raise SystemExit(f"Semantic scoring unavailable: {exc}")
+    if "csv" in formats:
+        print(f"Saved semantic sentiment scores to {out_path}")
+    if "parquet" in formats:
+        print(f"Saved semantic sentiment scores to {dataset_path(out_path.stem, OUTPUT_DIR)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+from pathlib import Path
+import shutil
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic_corpus import FLAG_SENTENCES, write_corpus  # noqa: E402
+
+
+@pytest.fixture(params=["committed", "synthetic"])
+def raw_dir(request, tmp_path, monkeypatch):
+    """
+    results/raw in a scratch working directory: a copy of the committed
+    data, or a synthetic corpus in which every flag and malformed rows occur.
+    """
+    raw = tmp_path / "results" / "raw"
+    if request.param == "committed":
+        # Only the raw files: the ledger and offset indexes are rebuilt as needed
+        shutil.copytree(ROOT / "results" / "raw", raw, ignore=shutil.ignore_patterns("ledger.idx", "offsets.*"))
+    else:
+        write_corpus(raw, 600, files_per_model=2, flag_rates={flag: 0.2 for flag in FLAG_SENTENCES},
+                     malformed_rate=0.02, seed=0)
+    monkeypatch.chdir(tmp_path)
+    return Path("results/raw")
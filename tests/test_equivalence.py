@@ -0,0 +1,46 @@
+"""
+Every execution mode must write the same processed files as the serial
+one-record-at-a-time pass, on the committed raw data.
+"""
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+import record_pipeline
+import validate_claims
+from record_pipeline import all_analyzers, run_pipeline
+from validate_claims import ClaimValidationAnalyzer
+
+
+def run(raw_dir, output_dir, **options) -> dict:
+    """Run all analyzers into output_dir; returns {file name: bytes} of the CSVs written."""
+    run_pipeline(all_analyzers(), raw_dir, output_dir, **options)
+    return {p.name: p.read_bytes() for p in sorted(Path(output_dir).glob("*.csv"))}
+
+
+def test_batch_claims_match_per_record(raw_dir, monkeypatch):
+    # Several chunks, so chunk boundaries are covered as well
+    monkeypatch.setattr(validate_claims, "BATCH_SIZE", 7)
+    # verify=True compares every chunk with ClaimValidationAnalyzer.row()
+    batch_path = validate_claims.run_batch(verify=True)
+
+    analyzer = ClaimValidationAnalyzer()
+    run_pipeline([analyzer], raw_dir, "serial")
+    assert batch_path.read_bytes() == analyzer.out_path.read_bytes()
+
+
+@pytest.mark.parametrize("options", [
+    {"workers": 2},
+    {"incremental": True},
+    {"incremental": True, "workers": 2},
+], ids=["workers", "incremental", "incremental-workers"])
+def test_modes_match_serial(raw_dir, monkeypatch, options):
+    # Small shards, so files are also split by byte range
+    monkeypatch.setattr(record_pipeline, "iter_shards", partial(record_pipeline.iter_shards, shard_bytes=4096))
+    serial = run(raw_dir, "serial")
+    assert serial
+
+    assert run(raw_dir, "first", **options) == serial
+    # A second incremental run serves every file from the feature cache
+    assert run(raw_dir, "second", **options) == serial
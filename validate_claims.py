@@ -1,7 +1,16 @@
 from pathlib import Path
-import json
+import argparse
+import itertools
 import re
-import csv
+
+from ground_truth import GROUND_TRUTH
+from instrumentation import stage
+from processed_store import ParquetSink, dataset_path
+from records import ResponseRecord
+from record_pipeline import (
+    CsvRowAnalyzer, add_pipeline_arguments, iter_records, resolve_formats, run_pipeline,
+)
+from run_ledger import record_key
 
 # Folder with all jsonl logs
 INPUT_DIR = Path("results/raw")
@@ -10,15 +19,9 @@ INPUT_DIR = Path("results/raw")
 OUTPUT_DIR = Path("results/processed")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# Game scores and record that actually appear in your prompts
-VALID_SCORES = {
-    # game scores in en-dash form
-    "21–9", "15–9", "18–10",
-    "8–16", "2–17",
-    "13–14", "14–13",
-    # season record
-    "10–9",
-}
+# Game scores (either order) and record that actually appear in your prompts,
+# in en-dash form; built from the experiment_design data blocks
+VALID_SCORES = GROUND_TRUTH.score_strings()
 
 # Same scores with plain ASCII hyphen
 VALID_SCORES_ASCII = {s.replace("–", "-") for s in VALID_SCORES}
@@ -28,7 +31,7 @@ SCORE_PATTERN = re.compile(r"\b(\d{1,2}\s*[–-]\s*\d{1,2})\b")
 
 # External context we know was NOT in the prompts
 EXTERNAL_TEAM_PATTERN = re.compile(
-    r"\b(Boston College|BC Eagles|No\.?\s*\d+|Top-?\s*\d+)\b",
+    r"\b(?:Boston College|BC Eagles|No\.?\s*\d+|Top-?\s*\d+)\b",
     re.IGNORECASE,
 )
 
@@ -42,23 +45,13 @@ OVERCONFIDENT_PHRASES = [
     "undeniable proof",
 ]
 
+# Records per DataFrame in --batch mode
+BATCH_SIZE = 100_000
+
 
 def load_records():
-    """Load all JSONL records from INPUT_DIR into a list of dicts."""
-    if not INPUT_DIR.exists():
-        raise FileNotFoundError(f"Input directory not found: {INPUT_DIR}")
-
-    records = []
-    for file in INPUT_DIR.glob("*.jsonl"):
-        print(f"Loading {file} ...")
-        with file.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                records.append(json.loads(line))
-    print(f"Total records loaded: {len(records)}")
-    return records
+    """Stream all complete, unique JSONL records from INPUT_DIR."""
+    return iter_records(INPUT_DIR)
 
 
 def contains_external_team(text: str) -> bool:
@@ -80,6 +73,15 @@ def contains_invalid_scores(text: str) -> bool:
     return False
 
 
+def contains_invalid_stats(text: str) -> bool:
+    """
+    Return True if response attributes a number to a player stat or the
+    season record that the prompts do not support (e.g. "Player A scored
+    40 goals", "11 wins and 8 losses").
+    """
+    return GROUND_TRUTH.has_invalid_claims(text)
+
+
 def overconfident_single_cause(text: str) -> bool:
     """
     Return True if response uses very strong language that suggests
@@ -89,44 +91,203 @@ def overconfident_single_cause(text: str) -> bool:
     return any(phrase in t for phrase in OVERCONFIDENT_PHRASES)
 
 
-def main():
-    records = load_records()
+class ClaimValidationAnalyzer(CsvRowAnalyzer):
+    """Fabrication / overclaim flags for every response."""
+
+    output_name = "claim_validation_flags.csv"
+    fieldnames = [
+        "hypothesis", "condition", "model", "run_id",
+        "external_team_mentioned",
+        "invalid_scores_mentioned",
+        "invalid_stats_mentioned",
+        "overconfident_single_cause_language",
+        "any_flag",
+        "record_key",
+    ]
+    column_types = {
+        "hypothesis": "string", "condition": "string", "model": "string", "run_id": "int32",
+        "external_team_mentioned": "int8",
+        "invalid_scores_mentioned": "int8",
+        "invalid_stats_mentioned": "int8",
+        "overconfident_single_cause_language": "int8",
+        "any_flag": "int8",
+        "record_key": "string",
+    }
 
-    rows = []
-    for r in records:
-        response = r.get("response_text", "") or ""
+    def version_parts(self):
+        return (
+            self.fieldnames, VALID_SCORES, SCORE_PATTERN.pattern,
+            EXTERNAL_TEAM_PATTERN.pattern, OVERCONFIDENT_PHRASES,
+            GROUND_TRUTH.player_stats, GROUND_TRUTH.record, GROUND_TRUTH.claim_pattern.pattern,
+            GROUND_TRUTH.owner_pattern.pattern,
+        )
+
+    def row(self, r):
+        response = r.response_text
 
         ext_team = contains_external_team(response)
         bad_scores = contains_invalid_scores(response)
+        bad_stats = contains_invalid_stats(response)
         overconfident = overconfident_single_cause(response)
 
-        rows.append({
-            "hypothesis": r.get("hypothesis"),
-            "condition": r.get("condition"),
-            "model": (r.get("model") or "").strip(),
-            "run_id": r.get("run_id"),
+        return {
+            "hypothesis": r.hypothesis,
+            "condition": r.condition,
+            "model": r.model,
+            "run_id": r.run_id,
             "external_team_mentioned": int(ext_team),
             "invalid_scores_mentioned": int(bad_scores),
+            "invalid_stats_mentioned": int(bad_stats),
             "overconfident_single_cause_language": int(overconfident),
-            "any_flag": int(ext_team or bad_scores or overconfident),
-        })
-
-    out_path = OUTPUT_DIR / "claim_validation_flags.csv"
-    with out_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "hypothesis", "condition", "model", "run_id",
-                "external_team_mentioned",
-                "invalid_scores_mentioned",
-                "overconfident_single_cause_language",
-                "any_flag",
-            ],
+            "any_flag": int(ext_team or bad_scores or bad_stats or overconfident),
+            "record_key": record_key(r.prompt_text, r.model, r.run_id),
+        }
+
+
+# ---------------------- Batch (vectorized) scoring ----------------------
+
+# Marks each score match as "\x1f<score>\x1f" so valid ones can be removed in one pass
+SCORE_MARK = "\x1f"
+VALID_SCORE_MARKED_PATTERN = (
+    SCORE_MARK
+    + "(?:" + "|".join(re.escape(s) for s in sorted(VALID_SCORES | VALID_SCORES_ASCII)) + ")"
+    + SCORE_MARK
+)
+
+
+def _string_dtype():
+    """Arrow-backed strings run the regexes in pyarrow compute when available."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return object
+    return "string[pyarrow]"
+
+
+def score_frame(df):
+    """
+    Vectorized version of ClaimValidationAnalyzer.row() over a DataFrame
+    of raw records. Each check is one column-wide string operation
+    instead of a Python call per response.
+    """
+    import pandas as pd
+
+    text = df["response_text"].fillna("").astype(str).astype(_string_dtype())
+
+    ext_team = text.str.contains("(?i)" + EXTERNAL_TEAM_PATTERN.pattern, regex=True)
+
+    # Same left-to-right scan as SCORE_PATTERN.findall(): wrap every match,
+    # drop the wrapped valid ones, and anything still wrapped is invalid.
+    compact = text.str.replace(" ", "", regex=False)
+    marked = compact.str.replace(SCORE_PATTERN.pattern, SCORE_MARK + r"\1" + SCORE_MARK, regex=True)
+    remaining = marked.str.replace(VALID_SCORE_MARKED_PATTERN, "", regex=True)
+    bad_scores = remaining.str.contains(SCORE_MARK, regex=False)
+
+    # Stat claims need the clause-level scan; only rows with a candidate number get it
+    bad_stats = text.str.contains(GROUND_TRUTH.candidate_pattern, regex=True).astype(bool).to_numpy(copy=True)
+    if bad_stats.any():
+        bad_stats[bad_stats] = [
+            GROUND_TRUTH.has_invalid_claims(t) for t in text[bad_stats].tolist()
+        ]
+
+    overconfident_pattern = "|".join(re.escape(p) for p in OVERCONFIDENT_PHRASES)
+    overconfident = text.str.lower().str.contains(overconfident_pattern, regex=True)
+
+    ext_team = ext_team.astype(bool).to_numpy()
+    bad_scores = bad_scores.astype(bool).to_numpy()
+    overconfident = overconfident.astype(bool).to_numpy()
+
+    return pd.DataFrame({
+        "hypothesis": df["hypothesis"],
+        "condition": df["condition"],
+        "model": df["model"].fillna("").astype(str).str.strip(),
+        "run_id": df["run_id"],
+        "external_team_mentioned": ext_team.astype(int),
+        "invalid_scores_mentioned": bad_scores.astype(int),
+        "invalid_stats_mentioned": bad_stats.astype(int),
+        "overconfident_single_cause_language": overconfident.astype(int),
+        "any_flag": (ext_team | bad_scores | bad_stats | overconfident).astype(int),
+        "record_key": [record_key(p, m, r) for p, m, r in
+                       zip(df["prompt_text"].tolist(), df["model"].tolist(), df["run_id"].tolist())],
+    }, columns=ClaimValidationAnalyzer.fieldnames, index=df.index)
+
+
+def verify_batch_equivalence(df, batch_rows):
+    """Check score_frame() output against the per-record row() function."""
+    analyzer = ClaimValidationAnalyzer()
+    expected = [analyzer.row(ResponseRecord(**r)) for r in df.to_dict("records")]
+    actual = batch_rows.to_dict("records")
+    for i, (exp, act) in enumerate(zip(expected, actual)):
+        if exp != act:
+            raise AssertionError(f"Batch scoring differs at row {i}: {act} != {exp}")
+
+
+def run_batch(verify: bool = False, formats=("csv",)):
+    """Score records in DataFrame chunks and write claim_validation_flags.csv/.parquet."""
+    import pandas as pd
+
+    out_path = OUTPUT_DIR / ClaimValidationAnalyzer.output_name
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    parquet = None
+    if "parquet" in formats:
+        parquet = ParquetSink(
+            dataset_path(out_path.stem, OUTPUT_DIR),
+            ClaimValidationAnalyzer.column_types, ClaimValidationAnalyzer.partition_by,
+        )
+    records = load_records()
+    n = 0
+    first = True
+    while True:
+        chunk = list(itertools.islice(records, BATCH_SIZE))
+        if not chunk and not first:
+            break
+        df = pd.DataFrame.from_records(
+            [(r.hypothesis, r.condition, r.model, r.run_id, r.response_text, r.prompt_text) for r in chunk],
+            columns=["hypothesis", "condition", "model", "run_id", "response_text", "prompt_text"],
         )
-        writer.writeheader()
-        writer.writerows(rows)
+        rows = score_frame(df)
+        if verify:
+            verify_batch_equivalence(df, rows)
+        if "csv" in formats:
+            # csv.DictWriter line endings, so both modes write identical files
+            rows.to_csv(out_path, mode="w" if first else "a", header=first,
+                        index=False, lineterminator="\r\n")
+        if parquet is not None and len(rows):
+            parquet.write_frame(rows)
+        n += len(df)
+        first = False
+    print(f"Total records processed: {n}")
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag fabricated or overconfident claims.")
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Score records as vectorized pandas columns instead of one at a time.",
+    )
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="With --batch, check every chunk against the per-record functions.",
+    )
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+
+    formats = resolve_formats(args.format)
+    with stage("validate_claims", profile=args.profile) as s:
+        if args.batch:
+            out_path = run_batch(verify=args.verify, formats=formats)
+        else:
+            analyzer = ClaimValidationAnalyzer()
+            run_pipeline([analyzer], INPUT_DIR, OUTPUT_DIR, workers=args.workers,
+                         incremental=args.incremental, formats=formats)
+            out_path = analyzer.out_path
+        s.records = sum(e["records"] for e in s.files.values())
 
-    print(f"Saved claim validation flags to {out_path}")
+    if "csv" in formats:
+        print(f"Saved claim validation flags to {out_path}")
+    if "parquet" in formats:
+        print(f"Saved claim validation flags to {dataset_path(out_path.stem, OUTPUT_DIR)}")
     print("You can now compute fabrication/overclaim rates per "
           "hypothesis/condition/model in Excel or pandas.")
 
@@ -0,0 +1,211 @@
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import os
+import signal
+import time
+
+from adaptive_sampler import RunningStat, wilson_interval
+from analyze_bias import H2PlayerAnalyzer, SentimentFocusAnalyzer
+from instrumentation import add_profile_argument, stage, track_file
+from raw_compression import prompt_table
+from records import COMPRESSED_SUFFIX, RecordError, decode_record, raw_files
+from run_ledger import RAW_DIR, _iter_lines_with_offsets, record_key
+from validate_claims import ClaimValidationAnalyzer
+
+# Live state, rewritten after every poll that saw new records
+SUMMARY_PATH = Path("analysis/live_summary.json")
+
+# Seconds between polls of results/raw
+POLL_INTERVAL = 10.0
+
+# Fabrication (any_flag) is tested against each of these, like analysis_statisticaltest.py
+FACTORS = ("model", "hypothesis", "condition")
+
+
+def chi_square(table: Counter):
+    """chi2_contingency on a {(row, column): count} table; None if it is degenerate."""
+    rows = sorted({r for r, _ in table})
+    cols = sorted({c for _, c in table})
+    if len(rows) < 2 or len(cols) < 2:
+        return None
+    try:
+        from scipy.stats import chi2_contingency
+    except ImportError:
+        return None
+    matrix = [[table.get((r, c), 0) for c in cols] for r in rows]
+    chi2, p, dof, _ = chi2_contingency(matrix)
+    return {"chi2": float(chi2), "p_value": float(p), "dof": int(dof)}
+
+
+class LiveStats:
+    """
+    Running aggregates over results/raw, fed only the lines appended since
+    the last poll: per (model, hypothesis, condition) cell counts, the
+    fabrication (any_flag) count, a Welford mean/variance of
+    sentiment_score, and the contingency tables the chi-square tests in
+    analysis_statisticaltest.py are built from. Records are scored with
+    the same analyzers as the batch scripts and deduplicated by record_key.
+    """
+
+    def __init__(self, raw_dir: Path = RAW_DIR):
+        self.raw_dir = Path(raw_dir)
+        self.reset()
+        self.claims = ClaimValidationAnalyzer()
+        self.sentiment = SentimentFocusAnalyzer()
+        self.players = H2PlayerAnalyzer()
+
+    def reset(self):
+        self.offsets = {}
+        self.seen = set()
+        self.records = 0
+        self.malformed = 0
+        self.duplicates = 0
+        self.cells = {}
+        self.fabrication = {factor: Counter() for factor in FACTORS}
+        self.h2_players = Counter()
+
+    def poll(self) -> int:
+        """Score the lines appended since the last poll; returns how many records were new."""
+        files = raw_files(self.raw_dir) if self.raw_dir.exists() else []
+        sizes = {file.name: file.stat().st_size for file in files}
+        if any(sizes.get(name, -1) < end for name, end in self.offsets.items()):
+            # A file was rewritten or removed: what was counted may be gone
+            print("A raw file shrank or disappeared; recounting from scratch.")
+            self.reset()
+        before = self.records
+        for file in files:
+            start = self.offsets.get(file.name, 0)
+            if sizes[file.name] <= start:
+                continue
+            end = start
+            prompts = prompt_table(self.raw_dir) if file.name.endswith(COMPRESSED_SUFFIX) else None
+            with track_file(file, sizes[file.name] - start) as metrics:
+                for raw, end in _iter_lines_with_offsets(file, start):
+                    metrics["records"] += self._add_line(raw, prompts)
+            self.offsets[file.name] = end
+        return self.records - before
+
+    def _add_line(self, raw: bytes, prompts: dict = None) -> int:
+        """Fold one raw line into the aggregates; returns 1 if it was a new record."""
+        if not raw.strip():
+            return 0
+        try:
+            r = decode_record(raw.strip(), prompts)
+        except RecordError:
+            self.malformed += 1
+            return 0
+        key = record_key(r.prompt_text, r.model, r.run_id)
+        if key in self.seen:
+            self.duplicates += 1
+            return 0
+        self.seen.add(key)
+        self.records += 1
+
+        flag = self.claims.row(r)["any_flag"]
+        cell = self.cells.get((r.model, r.hypothesis, r.condition))
+        if cell is None:
+            cell = self.cells[(r.model, r.hypothesis, r.condition)] = {
+                "n": 0, "flags": 0, "sentiment": RunningStat(),
+            }
+        cell["n"] += 1
+        cell["flags"] += flag
+        for factor, level in zip(FACTORS, (r.model, r.hypothesis, r.condition)):
+            self.fabrication[factor][(level, flag)] += 1
+
+        focus = self.sentiment.row(r)
+        if focus is not None:
+            cell["sentiment"].add(focus["sentiment_score"])
+        player = self.players.key(r)
+        if player is not None:
+            self.h2_players[(player[0], player[2])] += 1
+        return 1
+
+    def summary(self) -> dict:
+        """Current state as a JSON-ready dict; cost depends on the number of cells only."""
+        cells = []
+        for (model, hypothesis, condition), cell in sorted(self.cells.items()):
+            low, high = wilson_interval(cell["flags"], cell["n"])
+            stat = cell["sentiment"]
+            cells.append({
+                "model": model, "hypothesis": hypothesis, "condition": condition, "n": cell["n"],
+                "fabrication_rate": cell["flags"] / cell["n"],
+                "fabrication_ci": [low, high],
+                "sentiment_n": stat.n,
+                "sentiment_mean": stat.mean if stat.n else None,
+                "sentiment_var": stat.m2 / (stat.n - 1) if stat.n > 1 else None,
+            })
+        tests = {f"Fabrication ~ {factor.upper()}": chi_square(table)
+                 for factor, table in self.fabrication.items()}
+        tests["H2 player ~ CONDITION"] = chi_square(self.h2_players)
+        return {
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "records": self.records,
+            "malformed": self.malformed,
+            "duplicates": self.duplicates,
+            "files": dict(self.offsets),
+            "cells": cells,
+            "contingency": {
+                factor: [[level, flag, count] for (level, flag), count in sorted(table.items())]
+                for factor, table in self.fabrication.items()
+            },
+            "h2_players": [[condition, player, count]
+                           for (condition, player), count in sorted(self.h2_players.items())],
+            "chi_square": tests,
+        }
+
+
+def write_summary(summary: dict, path: Path = SUMMARY_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(summary, indent=1), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def status_line(summary: dict) -> str:
+    parts = [f"{summary['records']:,} records"]
+    for name, test in summary["chi_square"].items():
+        if test is not None:
+            parts.append(f"{name}: p={test['p_value']:.3g}")
+    return f"[{time.strftime('%H:%M:%S')}] " + " | ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tail results/raw and keep live bias statistics in analysis/live_summary.json."
+    )
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                        help=f"Seconds between polls (default: {POLL_INTERVAL:g}).")
+    parser.add_argument("--once", action="store_true", help="Poll once, write the summary and exit.")
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    parser.add_argument("--summary", type=Path, default=SUMMARY_PATH)
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    # Stop cleanly on `kill` as well as Ctrl-C, so the last summary and the run report get written
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    live = LiveStats(args.raw_dir)
+    with stage("watch_results", profile=args.profile) as s:
+        try:
+            first = True
+            while True:
+                t0 = time.perf_counter()
+                new = live.poll()
+                if new or first:
+                    summary = live.summary()
+                    write_summary(summary, args.summary)
+                    print(f"{status_line(summary)} (+{new:,} in {time.perf_counter() - t0:.2f}s)")
+                first = False
+                if args.once:
+                    break
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print(f"\nStopped; last summary in {args.summary}")
+        s.records = live.records
+        s.counters.update(malformed=live.malformed, duplicates=live.duplicates)
+
+
+if __name__ == "__main__":
+    main()